@@ -0,0 +1,158 @@
+# =====================================================
+# BENCHMARK — STEP 1 ADAPTIVE CROP / SCALE / TILES
+# =====================================================
+# For each page: full preprocessed page vs adaptive tiles
+# (crop + scale, then crop + scale + column tiles), reporting
+# - pixels sent to OCR (reduction vs full page)
+# - OCR time (same warm engine, sequential)
+# - text recall: share of reference words found by the adaptive
+#   OCR (synthetic pages: the rendered words; sample CVs: the
+#   full-page OCR words)
+# - boxes outside the page after mapping back (should be 0)
+#
+# Usage:
+#   python benchmarks/bench_adaptive_preprocess.py [engine] [cv.pdf|cv.png ...]
+#   engine: "paddle" (default) | "stub" (timing of the plumbing only)
+# =====================================================
+
+import re
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT))
+
+from step1_preprocess.step1_preprocess_pdf import adaptive_tiles, iter_pages, preprocess_array
+from step2_ocr.step2_ocr_engines import create_engine
+from step2_ocr.step2_ocr_paddle import map_blocks
+
+
+PAGE_SIZE = (2480, 3508)   # A4 @ 300 DPI, as rendered by Step 1
+SYNTHETIC_PAGES = 3
+MODES = {
+    "crop+scale": {"split_columns": False},
+    "crop+scale+columns": {"split_columns": True},
+}
+
+SIDEBAR = ["SKILLS", "Python", "SQL", "Docker", "Kubernetes", "LANGUAGES", "French native", "English fluent"]
+MAIN = [
+    "Data Engineer at Acme Corp 2019 - 2023",
+    "Built streaming pipelines with Kafka and Spark",
+    "Master in Computer Science 2018",
+    "Led a team of four engineers on the search platform",
+    "Reduced batch costs by forty percent with autoscaling",
+]
+
+
+# -------------------------------
+# Synthetic CV pages (sidebar + main column, wide margins)
+# -------------------------------
+def _font(size):
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:   # Pillow < 10.1: fixed-size bitmap font
+        return ImageFont.load_default()
+
+
+def make_page(page_num):
+    img = Image.new("L", PAGE_SIZE, 255)
+    draw = ImageDraw.Draw(img)
+    font = _font(42)
+    words = []
+
+    for i, line in enumerate(SIDEBAR):
+        draw.text((260, 500 + i * 90), line, fill=0, font=font)
+        words.extend(line.split())
+    for i, line in enumerate(MAIN * 4):
+        line = f"{line} p{page_num}"
+        draw.text((1000, 500 + i * 90), line, fill=0, font=font)
+        words.extend(line.split())
+    return np.asarray(img), words
+
+
+def load_samples(paths):
+    for path in paths:
+        for page_num, img in iter_pages(path):
+            yield f"{Path(path).name} p{page_num}", img, None
+
+
+# -------------------------------
+# Measurements
+# -------------------------------
+def _words(blocks):
+    return [w.lower() for b in blocks for w in re.findall(r"\w+", b["text"])]
+
+
+def recall(reference, found):
+    reference = [w.lower() for w in reference]
+    if not reference:
+        return 1.0
+    found = set(found)
+    return sum(w in found for w in reference) / len(reference)
+
+
+def ocr(engine, images):
+    t0 = time.perf_counter()
+    results = [engine.ocr_page(img) for img in images]
+    return results, time.perf_counter() - t0
+
+
+def outside_page(blocks, width, height, tolerance=2.0):
+    return sum(
+        1 for b in blocks if b.get("bbox") and any(
+            x < -tolerance or y < -tolerance or x > width + tolerance or y > height + tolerance
+            for x, y in b["bbox"]
+        )
+    )
+
+
+def run(engine_name, sample_paths):
+    engine = create_engine(engine_name)
+    engine.load()
+
+    pages = [(f"synthetic p{n}", *make_page(n)) for n in range(1, SYNTHETIC_PAGES + 1)]
+    pages += list(load_samples(sample_paths))
+
+    print(f"{'page':>22} {'mode':>19} {'Mpx':>6} {'pixels':>7} {'ocr s':>6} {'speedup':>7} "
+          f"{'recall':>6} {'outside':>7}")
+    totals = {mode: [0.0, 0.0, 0.0, 0.0] for mode in ["full", *MODES]}   # pixels, seconds, recall, pages
+
+    for name, img, reference in pages:
+        full = preprocess_array(img)
+        height, width = full.shape
+        (full_blocks,), full_time = ocr(engine, [full])
+        reference = reference or _words(full_blocks)
+
+        rows = [("full", full.size, full_time, recall(reference, _words(full_blocks)), 0)]
+        for mode, options in MODES.items():
+            tiles = adaptive_tiles(full, **options)
+            results, elapsed = ocr(engine, [tile for tile, _ in tiles])
+            blocks = [b for (_, transform), r in zip(tiles, results) for b in map_blocks(r, transform)]
+            rows.append((
+                mode, sum(tile.size for tile, _ in tiles), elapsed,
+                recall(reference, _words(blocks)), outside_page(blocks, width, height)
+            ))
+
+        for mode, pixels, elapsed, rec, outside in rows:
+            print(f"{name:>22} {mode:>19} {pixels / 1e6:>6.2f} {pixels / full.size:>6.0%} {elapsed:>6.2f} "
+                  f"{full_time / elapsed if elapsed else 0:>6.2f}x {rec:>6.0%} {outside:>7}")
+            t = totals[mode]
+            t[0] += pixels
+            t[1] += elapsed
+            t[2] += rec
+            t[3] += 1
+
+    print("\nTotals")
+    full_pixels, full_seconds = totals["full"][0], totals["full"][1]
+    for mode, (pixels, seconds, rec, n) in totals.items():
+        print(f"  {mode:>19}: {pixels / full_pixels:>5.0%} pixels, {seconds:6.2f}s OCR "
+              f"({full_seconds / seconds if seconds else 0:.2f}x), mean recall {rec / n:.0%}")
+
+
+if __name__ == "__main__":
+    engine_name = sys.argv[1] if len(sys.argv) > 1 else "paddle"
+    run(engine_name, sys.argv[2:])
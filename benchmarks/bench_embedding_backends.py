@@ -0,0 +1,86 @@
+# =====================================================
+# BENCHMARK — EMBEDDING BACKENDS ON CPU
+# =====================================================
+# Compares the embedding backends of embedding_provider.py:
+# - load time
+# - single-query latency (p50 / p95), as in Step 6
+# - batch throughput (blocks/s), as in Step 5
+#
+# Usage:
+#   python benchmarks/bench_embedding_backends.py [n_blocks] [backend ...]
+# =====================================================
+
+import statistics
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT))
+
+from step5_embeddings.embedding_provider import BACKENDS, encode_texts, get_embedding_model
+
+
+N_QUERIES = 50
+BATCH_SIZE = 64
+
+QUERIES = [
+    "Python experience",
+    "master degree in data science",
+    "Kubernetes and Docker",
+    "Quelle est l'expérience du candidat en data science ?",
+    "SAP FICO consultant",
+]
+
+
+def make_blocks(n):
+    words = ("python sql docker kubernetes master licence stage projet équipe "
+             "analyse données client gestion développement cloud azure").split()
+    return [
+        " ".join(words[(i + j) % len(words)] for j in range(80))
+        for i in range(n)
+    ]
+
+
+def bench_backend(backend, blocks):
+    t0 = time.perf_counter()
+    model = get_embedding_model(backend=backend, device="cpu")
+    load = time.perf_counter() - t0
+
+    encode_texts(QUERIES[:1], model=model)   # warmup
+
+    latencies = []
+    for i in range(N_QUERIES):
+        t0 = time.perf_counter()
+        encode_texts([QUERIES[i % len(QUERIES)]], model=model)
+        latencies.append((time.perf_counter() - t0) * 1000)
+
+    t0 = time.perf_counter()
+    encode_texts(blocks, model=model, batch_size=BATCH_SIZE)
+    throughput = len(blocks) / (time.perf_counter() - t0)
+
+    latencies.sort()
+    return {
+        "load_s": load,
+        "p50_ms": statistics.median(latencies),
+        "p95_ms": latencies[int(0.95 * (len(latencies) - 1))],
+        "blocks_per_s": throughput,
+    }
+
+
+if __name__ == "__main__":
+    n_blocks = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    backends = sys.argv[2:] or list(BACKENDS)
+    blocks = make_blocks(n_blocks)
+
+    print(f"{'backend':>10} {'load s':>7} {'p50 ms':>7} {'p95 ms':>7} {'blocks/s':>9}")
+    for backend in backends:
+        try:
+            r = bench_backend(backend, blocks)
+        except Exception as e:
+            print(f"{backend:>10} unavailable: {e}")
+            continue
+        print(
+            f"{backend:>10} {r['load_s']:>7.2f} {r['p50_ms']:>7.1f} "
+            f"{r['p95_ms']:>7.1f} {r['blocks_per_s']:>9.1f}"
+        )
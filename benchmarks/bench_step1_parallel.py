@@ -0,0 +1,85 @@
+# =====================================================
+# BENCHMARK — STEP 1 PARALLEL PAGE RENDERING
+# =====================================================
+# Measures Step 1 throughput (pages/s) for 1, 10 and 100-page PDFs
+# with 1..N workers, thread and process executors.
+#
+# Usage:
+#   python benchmarks/bench_step1_parallel.py [max_workers]
+# =====================================================
+
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from PIL import Image, ImageDraw
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT))
+
+from step1_preprocess.step1_preprocess_pdf import main as preprocess_file
+
+
+PAGE_COUNTS = [1, 10, 100]
+PAGE_SIZE = (1240, 1754)   # A4 @ 150 DPI, re-rendered at PDF_DPI by poppler
+
+
+# -------------------------------
+# Synthetic CV PDFs
+# -------------------------------
+def make_pdf(path, n_pages):
+    pages = []
+    for page_num in range(1, n_pages + 1):
+        img = Image.new("RGB", PAGE_SIZE, "white")
+        draw = ImageDraw.Draw(img)
+        for line in range(40):
+            draw.text(
+                (80, 80 + line * 38),
+                f"Page {page_num} line {line} — Python, SQL, Docker, Kubernetes",
+                fill="black"
+            )
+        pages.append(img)
+    pages[0].save(path, "PDF", save_all=True, append_images=pages[1:], resolution=150)
+
+
+def worker_counts(max_workers):
+    counts, n = [], 1
+    while n < max_workers:
+        counts.append(n)
+        n *= 2
+    return counts + [max_workers]
+
+
+# -------------------------------
+# Run
+# -------------------------------
+def run(max_workers):
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+
+        print(f"{'pages':>5} {'executor':>8} {'workers':>7} {'seconds':>8} {'pages/s':>8} {'speedup':>7}")
+        for n_pages in PAGE_COUNTS:
+            pdf_path = tmp / f"cv_{n_pages}.pdf"
+            make_pdf(pdf_path, n_pages)
+
+            for executor in ("thread", "process"):
+                baseline = None
+                for workers in worker_counts(max_workers):
+                    out_dir = tmp / f"out_{n_pages}_{executor}_{workers}"
+
+                    t0 = time.perf_counter()
+                    preprocess_file(pdf_path, out_dir, workers=workers, executor=executor)
+                    elapsed = time.perf_counter() - t0
+
+                    baseline = baseline or elapsed
+                    print(
+                        f"{n_pages:>5} {executor:>8} {workers:>7} {elapsed:>8.2f} "
+                        f"{n_pages / elapsed:>8.1f} {baseline / elapsed:>6.2f}x"
+                    )
+
+
+if __name__ == "__main__":
+    max_workers = int(sys.argv[1]) if len(sys.argv) > 1 else (os.cpu_count() or 1)
+    run(max_workers)
@@ -0,0 +1,165 @@
+# =====================================================
+# BENCHMARK — VECTOR BACKENDS (CHROMA VS FLAT MMAP)
+# =====================================================
+# Compares Chroma, flat float16 and flat int8 on synthetic
+# normalized 384-d block embeddings:
+# - build time
+# - recall@k against exact float32 search
+# - query latency (p50 / p95)
+# - peak RSS of the querying process (each run in a fresh process)
+#
+# Usage:
+#   python benchmarks/bench_vector_backends.py [n_blocks ...]
+#   (default: 10000 100000 1000000)
+# =====================================================
+
+import multiprocessing as mp
+import resource
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT))
+
+from step5_embeddings.vector_store import ChromaStore, FlatStore
+
+
+DIM = 384
+N_QUERIES = 100
+TOP_K = 10
+GEN_CHUNK = 50000
+ADD_CHUNK = 5000          # Chroma's max batch is ~5.4k rows
+N_DOCS = 2000             # Synthetic candidates (doc_id cardinality)
+
+BACKENDS = {
+    "chroma": lambda d: ChromaStore(d),
+    "flat-f16": lambda d: FlatStore(d, dtype="float16"),
+    "flat-int8": lambda d: FlatStore(d, dtype="int8"),
+}
+
+
+# -------------------------------
+# Deterministic synthetic data
+# -------------------------------
+def gen_chunks(n):
+    for start in range(0, n, GEN_CHUNK):
+        rng = np.random.default_rng(start)
+        x = rng.standard_normal((min(GEN_CHUNK, n - start), DIM)).astype(np.float32)
+        x /= np.linalg.norm(x, axis=1, keepdims=True)
+        yield start, x
+
+
+def make_queries(n):
+    rng = np.random.default_rng(12345)
+    rows = np.sort(rng.choice(n, N_QUERIES, replace=False))
+    picked = []
+    for start, x in gen_chunks(n):
+        hit = rows[(rows >= start) & (rows < start + len(x))]
+        picked.extend(x[hit - start])
+    q = np.asarray(picked) + 0.05 * rng.standard_normal((N_QUERIES, DIM)).astype(np.float32)
+    return (q / np.linalg.norm(q, axis=1, keepdims=True)).astype(np.float32)
+
+
+def ground_truth(n, queries):
+    best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+    best_rows = np.zeros((len(queries), 0), dtype=np.int64)
+    for start, x in gen_chunks(n):
+        scores = queries @ x.T
+        best_scores = np.concatenate([best_scores, scores], axis=1)
+        best_rows = np.concatenate([best_rows, np.arange(start, start + len(x))[None].repeat(len(queries), 0)], axis=1)
+        keep = np.argsort(-best_scores, axis=1)[:, :TOP_K]
+        best_scores = np.take_along_axis(best_scores, keep, axis=1)
+        best_rows = np.take_along_axis(best_rows, keep, axis=1)
+    return [{f"b{r}" for r in row} for row in best_rows]
+
+
+# -------------------------------
+# Per-process build + query
+# -------------------------------
+def build(backend, store_dir, n):
+    store = BACKENDS[backend](store_dir)
+    t0 = time.perf_counter()
+    for start, x in gen_chunks(n):
+        for s in range(0, len(x), ADD_CHUNK):
+            rows = range(start + s, start + min(s + ADD_CHUNK, len(x)))
+            store.add(
+                [f"b{r}" for r in rows],
+                x[s:s + ADD_CHUNK],
+                [f"block {r}" for r in rows],
+                [{"doc_id": f"cv{r % N_DOCS}", "page": 1, "block_id": r} for r in rows]
+            )
+    return time.perf_counter() - t0
+
+
+def query(backend, store_dir, queries):
+    store = BACKENDS[backend](store_dir)
+    store.query(queries[:1], TOP_K)   # warmup
+
+    latencies, hits = [], []
+    for q in queries:
+        t0 = time.perf_counter()
+        r = store.query(q[None], TOP_K)
+        latencies.append((time.perf_counter() - t0) * 1000)
+        hits.append(r["ids"][0])
+
+    return latencies, hits, peak_rss_mb()
+
+
+def peak_rss_mb():
+    """
+    VmHWM (reset on exec, unlike ru_maxrss which keeps the parent's peak).
+    """
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_isolated(fn, *args):
+    with ProcessPoolExecutor(max_workers=1, mp_context=mp.get_context("spawn")) as pool:
+        return pool.submit(fn, *args).result()
+
+
+# -------------------------------
+# Run
+# -------------------------------
+def run(sizes):
+    print(f"{'blocks':>8} {'backend':>10} {'build s':>8} {'recall':>7} {'p50 ms':>7} {'p95 ms':>7} {'RSS MB':>7}")
+    for n in sizes:
+        queries = make_queries(n)
+        truth = ground_truth(n, queries)
+
+        for backend in BACKENDS:
+            store_dir = Path(tempfile.mkdtemp(prefix=f"bench_{backend}_"))
+            try:
+                build_s = run_isolated(build, backend, str(store_dir), n)
+                latencies, hits, rss_mb = run_isolated(query, backend, str(store_dir), queries)
+            except Exception as e:
+                print(f"{n:>8} {backend:>10} failed: {e}")
+                continue
+            finally:
+                shutil.rmtree(store_dir, ignore_errors=True)
+
+            recall = statistics.mean(len(set(h) & t) / TOP_K for h, t in zip(hits, truth))
+            latencies.sort()
+            print(
+                f"{n:>8} {backend:>10} {build_s:>8.1f} {recall:>7.3f} "
+                f"{statistics.median(latencies):>7.2f} {latencies[int(0.95 * (len(latencies) - 1))]:>7.2f} "
+                f"{rss_mb:>7.0f}"
+            )
+
+
+if __name__ == "__main__":
+    sizes = [int(a) for a in sys.argv[1:]] or [10000, 100000, 1000000]
+    run(sizes)
@@ -0,0 +1,115 @@
+# =====================================================
+# BATCH MANIFEST — CONTENT-ADDRESSED INCREMENTAL BUILDS
+# =====================================================
+# Purpose:
+# - One JSON manifest per CV
+# - Record input hash + stage code version + stage parameters
+# - Re-run a stage only when its key changed (or outputs vanished)
+# - A killed batch resumes from the last completed stage
+# =====================================================
+# Stage keys are chained: each key includes the key of the stage
+# before it, so a change upstream invalidates everything downstream.
+# =====================================================
+
+import hashlib
+import json
+import os
+from pathlib import Path
+
+
+# -------------------------------
+# Hashing helpers
+# -------------------------------
+def file_sha256(path, chunk_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def stage_key(stage, version, params, upstream):
+    """
+    Deterministic key for one stage run.
+    upstream: input file hash (first stage) or the previous stage key.
+    """
+    payload = json.dumps(
+        {"stage": stage, "version": version, "params": params, "upstream": upstream},
+        sort_keys=True,
+        default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+# -------------------------------
+# Manifest I/O
+# -------------------------------
+def load_manifest(manifest_path):
+    manifest_path = Path(manifest_path)
+    if not manifest_path.exists():
+        return {"input": {}, "stages": {}}
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        # Corrupt manifest (e.g. killed mid-write on a non-atomic FS) → rebuild
+        return {"input": {}, "stages": {}}
+
+
+def save_manifest(manifest_path, manifest):
+    """
+    Atomic write: a killed batch never leaves a half-written manifest.
+    """
+    manifest_path = Path(manifest_path)
+    manifest_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = manifest_path.with_suffix(manifest_path.suffix + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, manifest_path)
+
+
+def input_hash(manifest_path, file_path):
+    """
+    sha256 of the input file. Re-uses the recorded hash when size and
+    mtime are unchanged, so unchanged corpora are not re-read.
+    """
+    file_path = Path(file_path)
+    stat = file_path.stat()
+    manifest = load_manifest(manifest_path)
+    recorded = manifest.get("input", {})
+
+    if recorded.get("size") == stat.st_size and recorded.get("mtime_ns") == stat.st_mtime_ns:
+        return recorded["sha256"]
+
+    digest = file_sha256(file_path)
+    manifest["input"] = {
+        "path": str(file_path),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "sha256": digest
+    }
+    save_manifest(manifest_path, manifest)
+    return digest
+
+
+# -------------------------------
+# Stage bookkeeping
+# -------------------------------
+def is_stage_fresh(manifest_path, stage, key):
+    """
+    True when the stage already ran with this exact key and its
+    recorded outputs still exist.
+    """
+    record = load_manifest(manifest_path).get("stages", {}).get(stage)
+    if not record or record.get("key") != key:
+        return False
+    return all(Path(p).exists() for p in record.get("outputs", []))
+
+
+def mark_stage_done(manifest_path, stage, key, outputs=()):
+    manifest = load_manifest(manifest_path)
+    manifest.setdefault("stages", {})[stage] = {
+        "key": key,
+        "outputs": [str(p) for p in outputs]
+    }
+    save_manifest(manifest_path, manifest)
@@ -0,0 +1,224 @@
+# =====================================================
+# BATCH SCHEDULER — CONCURRENT STAGED PIPELINE
+# =====================================================
+# Purpose:
+# - Run pipeline stages concurrently (stage N of CV k overlaps
+#   with stage N+1 of CV k-1)
+# - One bounded queue per stage → backpressure bounds memory
+# - Per-stage concurrency: thread workers, process pool workers,
+#   or a single batched writer
+# - Report per-stage throughput at the end
+# =====================================================
+
+import multiprocessing as mp
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+
+STAGE_QUEUE_SIZE = 4   # Tunable: max items waiting in front of each stage
+
+_STOP = object()
+
+
+# -------------------------------
+# Stage definition
+# -------------------------------
+class Stage:
+    """
+    fn(item) → item for the next stage (None = drop item).
+    Batched stages (batch_size set) receive fn(list_of_items) → list.
+
+    executor="thread" : fn runs in `workers` threads of this process
+    executor="process": fn runs in a process pool of `workers` processes
+                        (fn and items must be picklable)
+    """
+
+    def __init__(self, name, fn, workers=1, executor="thread",
+                 queue_size=STAGE_QUEUE_SIZE, batch_size=None, flush_interval=2.0):
+        if executor not in ("thread", "process"):
+            raise ValueError(f"Unknown executor: {executor}")
+
+        self.name = name
+        self.fn = fn
+        self.workers = 1 if batch_size else workers
+        self.executor = executor
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        # Stats
+        self.items_in = 0
+        self.items_out = 0
+        self.failed = 0
+        self.busy = 0.0
+        self.started = None
+        self.finished = None
+        self._lock = threading.Lock()
+
+    def _record(self, n_in, n_out, failed, elapsed):
+        with self._lock:
+            self.items_in += n_in
+            self.items_out += n_out
+            self.failed += failed
+            self.busy += elapsed
+
+    def report(self):
+        wall = (self.finished or time.perf_counter()) - (self.started or time.perf_counter())
+        rate = self.items_out / wall if wall > 0 else 0.0
+        return (
+            f"  {self.name:<12} in={self.items_in:<5} out={self.items_out:<5} "
+            f"failed={self.failed:<3} busy={self.busy:7.1f}s "
+            f"wall={wall:7.1f}s → {rate:.2f} items/s"
+        )
+
+
+# -------------------------------
+# Pipeline
+# -------------------------------
+class StagedPipeline:
+    def __init__(self, stages):
+        self.stages = list(stages)
+
+    # -------------------------------
+    # Worker loops
+    # -------------------------------
+    def _call(self, stage, pool, payload):
+        if pool is not None:
+            return pool.submit(stage.fn, payload).result()
+        return stage.fn(payload)
+
+    def _run_worker(self, stage, pool, in_q, out_q, done):
+        while True:
+            item = in_q.get()
+            if item is _STOP:
+                in_q.put(_STOP)   # let sibling workers see it too
+                break
+
+            t0 = time.perf_counter()
+            try:
+                result = self._call(stage, pool, item)
+            except Exception as e:
+                print(f"[ERROR] {stage.name} failed: {e}")
+                stage._record(1, 0, 1, time.perf_counter() - t0)
+                continue
+
+            stage._record(1, 0 if result is None else 1, 0, time.perf_counter() - t0)
+            if result is not None:
+                out_q.put(result)
+
+        done()
+
+    def _run_batch_writer(self, stage, pool, in_q, out_q, done):
+        finished = False
+        while not finished:
+            batch = []
+            deadline = None
+
+            while len(batch) < stage.batch_size:
+                timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+                try:
+                    item = in_q.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    finished = True
+                    break
+                batch.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + stage.flush_interval
+
+            if not batch:
+                continue
+
+            t0 = time.perf_counter()
+            try:
+                results = self._call(stage, pool, batch) or []
+            except Exception as e:
+                print(f"[ERROR] {stage.name} failed on batch of {len(batch)}: {e}")
+                stage._record(len(batch), 0, len(batch), time.perf_counter() - t0)
+                continue
+
+            stage._record(len(batch), len(results), 0, time.perf_counter() - t0)
+            for result in results:
+                out_q.put(result)
+
+        done()
+
+    # -------------------------------
+    # Run
+    # -------------------------------
+    def run(self, items):
+        """
+        Push items through every stage. Returns the outputs of the last
+        stage (order not guaranteed) after printing the throughput report.
+        """
+        queues = [queue.Queue(maxsize=s.queue_size) for s in self.stages]
+        sink = queue.Queue()
+        queues.append(sink)
+
+        pools = []
+        threads = []
+        t_start = time.perf_counter()
+
+        for idx, stage in enumerate(self.stages):
+            pool = None
+            if stage.executor == "process":
+                pool = ProcessPoolExecutor(
+                    max_workers=stage.workers,
+                    mp_context=mp.get_context("spawn")
+                )
+                pools.append(pool)
+
+            in_q, out_q = queues[idx], queues[idx + 1]
+            remaining = [stage.workers]
+            lock = threading.Lock()
+
+            def done(stage=stage, out_q=out_q, remaining=remaining, lock=lock):
+                # Last worker of a stage closes the next stage
+                with lock:
+                    remaining[0] -= 1
+                    last = remaining[0] == 0
+                if last:
+                    stage.finished = time.perf_counter()
+                    out_q.put(_STOP)
+
+            target = self._run_batch_writer if stage.batch_size else self._run_worker
+            stage.started = t_start
+
+            for n in range(stage.workers):
+                t = threading.Thread(
+                    target=target,
+                    args=(stage, pool, in_q, out_q, done),
+                    name=f"{stage.name}-{n}",
+                    daemon=True
+                )
+                t.start()
+                threads.append(t)
+
+        # Feed (blocks when the first stage is saturated)
+        for item in items:
+            queues[0].put(item)
+        queues[0].put(_STOP)
+
+        outputs = []
+        while True:
+            item = sink.get()
+            if item is _STOP:
+                break
+            outputs.append(item)
+
+        for t in threads:
+            t.join()
+        for pool in pools:
+            pool.shutdown()
+
+        self.print_report(time.perf_counter() - t_start)
+        return outputs
+
+    def print_report(self, total):
+        print("\n[BATCH] Stage throughput:")
+        for stage in self.stages:
+            print(stage.report())
+        print(f"[BATCH] Total wall time: {total:.1f}s")
@@ -1,4 +1,6 @@
+from functools import partial
 from pathlib import Path
+import os
 import sys
 
 # =====================================================
@@ -20,107 +22,219 @@ BASE_STEP2_OUT = ROOT / "caller_batch" / "step2_batch_output"
 BASE_STEP3_OUT = ROOT / "caller_batch" / "step3_batch_output"
 BASE_STEP4_OUT = ROOT / "caller_batch" / "step4_batch_output"
 BASE_STEP5_OUT = ROOT / "caller_batch" / "step5_batch_output"
+BASE_MANIFEST_DIR = ROOT / "caller_batch" / "manifests"
+
+# Per-stage concurrency (see batch_scheduler.py)
+STEP1_WORKERS = max(1, (os.cpu_count() or 2) // 2)   # process pool
+OCR_FEEDERS = 4                                       # threads feeding the warm OCR pool
+CLEAN_WORKERS = 2                                     # process pool (steps 3 + 4)
+EMBED_BATCH_SIZE = 16                                 # CVs per step 5 flush
 
 
 # =====================================================
 # IMPORTS (package-based)
 # =====================================================
+from step1_preprocess import step1_preprocess_pdf as step1
 from step1_preprocess.step1_preprocess_pdf import main as preprocess_file
-from step2_ocr.step2_ocr_paddle import run_ocr
+from step2_ocr import step2_ocr_paddle as step2
+from step2_ocr.step2_ocr_paddle import run_ocr, get_default_pool, raw_output_path
+from step2_ocr.step2_page_format import PAGE_FORMAT, with_format
+from step3_lightclean import step3_light_clean as step3
 from step3_lightclean.step3_light_clean import clean_ocr_json
+from step4_rag import step4_rag_prepare as step4
 from step4_rag.step4_rag_prepare import main as prepare_rag_blocks
+from step4_rag.step4_lexical_index import LEXICAL_INDEX_FILE
+from step5_embeddings import step5_embeddings as step5
 from step5_embeddings.step5_embeddings import main as build_embeddings
+from step5_embeddings.embedding_provider import EMBEDDING_BACKEND
+from step5_embeddings.vector_store import VECTOR_BACKEND
+
+from batch_manifest import input_hash, stage_key, is_stage_fresh, mark_stage_done
+from batch_scheduler import Stage, StagedPipeline
+
 
 # =====================================================
-# BATCH PIPELINE
+# STAGES (one job dict per CV flows through them)
 # =====================================================
 VALID_EXTENSIONS = {".pdf", ".png", ".jpg", ".jpeg"}
-
-for file_path in CV_INPUT_DIR.iterdir():
-    if file_path.suffix.lower() not in VALID_EXTENSIONS:
-        continue
-
+STAGES = ("step1", "step2", "step3", "step4", "step5")
+
+
+def stage_keys(file_hash):
+    """
+    Chained keys: input hash → step1 → step2 → ... → step5.
+    Changing a version or a parameter invalidates that stage and
+    every stage after it.
+    """
+    specs = {
+        "step1": (step1.STAGE_VERSION, {"dpi": step1.PDF_DPI, "text_layer": step1.USE_TEXT_LAYER,
+                                        "adaptive": step1.ADAPTIVE_PREPROCESS,
+                                        "split_columns": step1.SPLIT_COLUMNS}),
+        "step2": (step2.STAGE_VERSION, {"lang": step2.OCR_LANG, "engine": step2.OCR_ENGINE,
+                                        "format": PAGE_FORMAT}),
+        "step3": (step3.STAGE_VERSION, {"format": PAGE_FORMAT}),
+        "step4": (step4.STAGE_VERSION, {"max_words": step4.MAX_WORDS_PER_BLOCK}),
+        "step5": (step5.STAGE_VERSION, {"model": step5.EMBEDDING_MODEL,
+                                        "backend": EMBEDDING_BACKEND,
+                                        "store": VECTOR_BACKEND,
+                                        "chroma_dir": str(BASE_STEP5_OUT)}),
+    }
+
+    keys = {}
+    upstream = file_hash
+    for stage in STAGES:
+        version, params = specs[stage]
+        upstream = keys[stage] = stage_key(stage, version, params, upstream)
+    return keys
+
+
+def make_job(file_path):
     cv_name = file_path.stem
-    print(f"\n=== Processing CV: {cv_name} ===")
+    manifest = BASE_MANIFEST_DIR / f"{cv_name}.json"
+    return {
+        "cv_name": cv_name,
+        "file_path": str(file_path),
+        "manifest": str(manifest),
+        "keys": stage_keys(input_hash(manifest, file_path)),
+        "step1_out": str(BASE_STEP1_OUT / cv_name),
+        "step2_out": str(BASE_STEP2_OUT / cv_name),
+        "step3_out": str(BASE_STEP3_OUT / cv_name),
+        "step4_out": str(BASE_STEP4_OUT / cv_name),
+        "raw_pages": str(raw_output_path(BASE_STEP2_OUT / cv_name)),
+        "clean_pages": str(with_format(BASE_STEP3_OUT / cv_name / "cv_ocr_clean.json")),
+        "rag_blocks": str(BASE_STEP4_OUT / cv_name / "rag_blocks.json"),
+    }
 
-    # Per-CV folders
-    step1_out = BASE_STEP1_OUT / cv_name
-    step2_out = BASE_STEP2_OUT / cv_name
-    step3_out = BASE_STEP3_OUT / cv_name
-    step4_out = BASE_STEP4_OUT / cv_name
-    step5_out = BASE_STEP5_OUT
 
-    step5_out.mkdir(parents=True, exist_ok=True)
+def is_fresh(job, stage):
+    return is_stage_fresh(job["manifest"], stage, job["keys"][stage])
 
 
-    # -------------------------------
-    # Step 1 — Preprocess
-    # -------------------------------
-    preprocess_file(
-        file_path=file_path,
-        output_dir=step1_out,
-        poppler_path=None  # Ubuntu
-    )
+def mark_done(job, stage, outputs=()):
+    mark_stage_done(job["manifest"], stage, job["keys"][stage], outputs)
 
-    # -------------------------------
-    # Step 2 — OCR (GPU)
-    # -------------------------------
-    try:
-        run_ocr(step1_out, step2_out)
-    except Exception as e:
-        print(f"[ERROR] Step 2 failed: {e}")
-        continue
 
-    raw_json = step2_out / "cv_ocr_raw.json"
-    if not raw_json.exists():
-        print("[SKIP] No OCR output")
-        continue
+# -------------------------------
+# Step 1 — Preprocess (process pool)
+# -------------------------------
+def stage_preprocess(job):
+    if is_fresh(job, "step1"):
+        return job
 
-    # -------------------------------
-    # Step 3 — Light clean
-    # -------------------------------
+    print(f"\n=== Processing CV: {job['cv_name']} ===")
 
-    step3_out.mkdir(parents=True, exist_ok=True)
+    # Drop pages of a previous (possibly longer) version of this CV
+    step1_out = Path(job["step1_out"])
+    for stale in [*step1_out.glob("*.png"), *step1_out.glob(f"*{step1.TRANSFORM_SUFFIX}"),
+                  step1_out / step1.TEXT_LAYER_FILE]:
+        stale.unlink(missing_ok=True)
 
-    raw_json = step2_out / "cv_ocr_raw.json"
-    clean_json = step3_out / "cv_ocr_clean.json"
+    preprocess_file(
+        file_path=job["file_path"],
+        output_dir=job["step1_out"],
+        poppler_path=None,  # Ubuntu
+        adaptive=step1.ADAPTIVE_PREPROCESS,
+        split_columns=step1.SPLIT_COLUMNS
+    )
+    mark_done(job, "step1", [job["step1_out"]])
+    return job
 
-    if not raw_json.exists():
-        print("[SKIP] No OCR output")
-        continue
 
-    try:
-        clean_ocr_json(raw_json, clean_json)
-    except Exception as e:
-        print(f"[ERROR] Step 3 failed: {e}")
-        continue
+# -------------------------------
+# Step 2 — OCR (threads → warm pool)
+# -------------------------------
+def stage_ocr(job, ocr_pool):
+    step2_out = Path(job["step2_out"])
+    raw_json = Path(job["raw_pages"])
+    if is_fresh(job, "step2"):
+        return job
+
+    run_ocr(job["step1_out"], step2_out, pool=ocr_pool)
 
+    if not raw_json.exists():
+        print(f"[SKIP] No OCR output for {job['cv_name']}")
+        return None
 
+    mark_done(job, "step2", [raw_json])
+    return job
 
-    # -------------------------------
-    # Step 4 — Prepare RAG blocks
-    # -------------------------------
-    step4_out.mkdir(parents=True, exist_ok=True)
 
-    rag_blocks = step4_out / "rag_blocks.json"
+# -------------------------------
+# Steps 3 + 4 — Light clean + RAG blocks (process pool)
+# -------------------------------
+def stage_clean_and_blocks(job):
+    raw_json = Path(job["raw_pages"])
+    clean_json = Path(job["clean_pages"])
+    rag_blocks = Path(job["rag_blocks"])
 
+    if not is_fresh(job, "step3"):
+        clean_json.parent.mkdir(parents=True, exist_ok=True)
+        clean_ocr_json(raw_json, clean_json)
+        mark_done(job, "step3", [clean_json])
 
-    try:
+    if not is_fresh(job, "step4"):
+        rag_blocks.parent.mkdir(parents=True, exist_ok=True)
         prepare_rag_blocks(
             input_path=clean_json,
             output_path=rag_blocks,
-            doc_id=cv_name
+            doc_id=job["cv_name"],
+            index_path=BASE_STEP5_OUT / LEXICAL_INDEX_FILE
         )
-    except Exception as e:
-        print(f"[ERROR] Step 4 failed: {e}")
-        continue
+        mark_done(job, "step4", [rag_blocks])
 
+    return job
+
+
+# -------------------------------
+# Step 5 — Embeddings (single batched writer)
+# -------------------------------
+def stage_embed(jobs):
+    BASE_STEP5_OUT.mkdir(parents=True, exist_ok=True)
+
+    # One bulk ingest for every CV of the batch
+    stale = [job for job in jobs if not is_fresh(job, "step5")]
+    if stale:
+        build_embeddings(
+            blocks_path=[job["rag_blocks"] for job in stale],
+            chroma_dir=BASE_STEP5_OUT,
+            doc_ids=[job["cv_name"] for job in stale]
+        )
+        for job in stale:
+            mark_done(job, "step5", [BASE_STEP5_OUT])
+    return jobs
+
+
+# =====================================================
+# BATCH PIPELINE
+# =====================================================
+def run_batch(ocr_pool=None):
+    jobs = [
+        make_job(file_path)
+        for file_path in sorted(CV_INPUT_DIR.iterdir())
+        if file_path.suffix.lower() in VALID_EXTENSIONS
+    ]
+
+    # Fully up-to-date CVs never enter the pipeline
+    pending = [job for job in jobs if not all(is_fresh(job, s) for s in STAGES)]
+    print(f"[BATCH] {len(jobs)} CVs in {CV_INPUT_DIR}")
+    print(f"[BATCH] {len(jobs) - len(pending)} up to date, {len(pending)} to (re)build")
+
+    if not pending:
+        return []
+
+    # Only pay the OCR model load when something needs to be rebuilt
+    ocr_pool = ocr_pool or get_default_pool()
+
+    pipeline = StagedPipeline([
+        Stage("step1", stage_preprocess, workers=STEP1_WORKERS, executor="process"),
+        Stage("step2", partial(stage_ocr, ocr_pool=ocr_pool), workers=OCR_FEEDERS),
+        Stage("step3+4", stage_clean_and_blocks, workers=CLEAN_WORKERS, executor="process"),
+        Stage("step5", stage_embed, batch_size=EMBED_BATCH_SIZE),
+    ])
+
+    return pipeline.run(pending)
 
-    # -------------------------------
-    # Step 5 — Embeddings (GPU)
-    # -------------------------------
-    build_embeddings(
-        blocks_path=rag_blocks,
-        chroma_dir=step5_out
-    )
 
+if __name__ == "__main__":
+    # The warm OCR pool is shared by the whole batch and closed at exit
+    run_batch()
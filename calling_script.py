@@ -19,7 +19,7 @@ preprocess_pdf(
 # =====================================================
 # STEP 2 — OCR (GPU)
 # =====================================================
-from step2_ocr.step2_ocr_paddle import run_ocr
+from step2_ocr.step2_ocr_paddle import raw_output_path, run_ocr
 
 run_ocr(
     input_dir=ROOT / "step1_preprocess" / "step1_output",
@@ -32,7 +32,7 @@ run_ocr(
 from step3_lightclean.step3_light_clean import clean_ocr_json
 
 clean_ocr_json(
-    input_path=ROOT / "step2_ocr" / "step2_output" / "cv_ocr_raw.json",
+    input_path=raw_output_path(ROOT / "step2_ocr" / "step2_output"),
     output_path=ROOT / "step3_lightclean" / "step3_output" / "cv_ocr_cleaned.json"
 )
 
@@ -54,7 +54,8 @@ from step5_embeddings.step5_embeddings import main as build_embeddings
 
 build_embeddings(
     blocks_path=ROOT / "step4_rag" / "step4_output" / "cv_rag_blocks.json",
-    chroma_dir=ROOT / "step5_embeddings" / "step5_output"
+    chroma_dir=ROOT / "step5_embeddings" / "step5_output",
+    doc_ids=["cv_001"]
 )
 
 # =====================================================
@@ -0,0 +1,2 @@
+# Repository root on sys.path for the tests (step packages are imported
+# the way the scripts import them)
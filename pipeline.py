@@ -0,0 +1,246 @@
+# =====================================================
+# IN-MEMORY SINGLE-CV PIPELINE (STEPS 1 → 5)
+# =====================================================
+# Purpose:
+# - "Upload one CV, query it right away": one call chains every
+#   step on Python objects (page arrays → OCR pages → cleaned
+#   lines → blocks → vector store), no intermediate files
+# - Warm: OCR pool, embedding model, vector store and lexical
+#   index are loaded once per Pipeline and reused for every CV
+# - Optional persistence of each stage's output (same files as
+#   the batch caller), written in the background
+# - process() returns the block IDs once Step 6 can find them
+# =====================================================
+# Usage:
+#   with Pipeline(chroma_dir) as pipeline:
+#       block_ids = pipeline.process(file_bytes, "cv_001")
+# =====================================================
+
+import json
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from step1_preprocess.step1_preprocess_pdf import (
+    ADAPTIVE_PREPROCESS, PDF_DPI, SPLIT_COLUMNS, USE_TEXT_LAYER, adaptive_tiles, iter_pdf_pages, page_runs,
+    pdf_page_count, preprocess_array, split_text_layer
+)
+from step2_ocr.step2_ocr_paddle import (
+    get_default_pool, merge_pages, merge_tiles, ocr_page_stream, raw_output_path
+)
+from step2_ocr.step2_page_format import save_pages, with_format
+from step3_lightclean.step3_light_clean import clean_pages
+from step4_rag.step4_lexical_index import LEXICAL_INDEX_FILE, LexicalIndex
+from step4_rag.step4_rag_prepare import prepare_blocks
+from step5_embeddings.embedding_provider import EMBEDDING_MODEL, get_embedding_model
+from step5_embeddings.step5_embeddings import block_key, delete_document, ingest_blocks
+from step5_embeddings.vector_store import open_store
+
+
+PERSIST_WORKERS = 2   # Tunable: background threads writing stage outputs
+
+
+def _save_json(data, path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+
+
+class Pipeline:
+    def __init__(self, chroma_dir, output_dir=None, ocr_pool=None, backend=None,
+                 text_layer=USE_TEXT_LAYER, dpi=PDF_DPI, poppler_path=None, persist_images=False,
+                 adaptive=ADAPTIVE_PREPROCESS, split_columns=SPLIT_COLUMNS):
+        """
+        output_dir    : None → nothing persisted; else one folder per CV
+                        with cv_ocr_raw, cv_ocr_clean and rag_blocks.json
+        persist_images: also write processed_{n}.png (needs output_dir)
+        adaptive      : OCR cropped / scaled tiles (Step 1 adaptive mode)
+        split_columns : adaptive mode, one tile per text column
+        """
+        self.chroma_dir = Path(chroma_dir)
+        self.output_dir = Path(output_dir) if output_dir is not None else None
+        self.backend = backend
+        self.text_layer = text_layer
+        self.dpi = dpi
+        self.poppler_path = poppler_path
+        self.persist_images = persist_images
+        self.adaptive = adaptive
+        self.split_columns = split_columns
+
+        # Warm start: every engine is loaded once, here
+        self.chroma_dir.mkdir(parents=True, exist_ok=True)
+        self.ocr_pool = ocr_pool or get_default_pool()
+        self.model = get_embedding_model(EMBEDDING_MODEL)
+        self.store = open_store(self.chroma_dir, backend=backend)
+        self.lexical_index = LexicalIndex(self.chroma_dir / LEXICAL_INDEX_FILE)
+
+        self._writer = ThreadPoolExecutor(max_workers=PERSIST_WORKERS, thread_name_prefix="persist")
+        self._pending = []
+        self._pending_lock = threading.Lock()
+        self._write_lock = threading.Lock()   # One writer on the store / indexes
+
+    # -------------------------------
+    # Background persistence
+    # -------------------------------
+    def _persist(self, fn, *args):
+        future = self._writer.submit(fn, *args)
+        with self._pending_lock:
+            self._pending = [f for f in self._pending if not f.done()] + [future]
+        return future
+
+    def flush(self):
+        """
+        Waits for every stage output still being written (re-raises
+        the first write error).
+        """
+        with self._pending_lock:
+            pending, self._pending = self._pending, []
+        for future in pending:
+            future.result()
+
+    def close(self):
+        self.flush()
+        self._writer.shutdown()
+        self.lexical_index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # -------------------------------
+    # Steps 1 + 2 — pages → OCR pages
+    # -------------------------------
+    def _page_tiles(self, page_num, img, out_dir, tiles, transforms):
+        """
+        Yields the OCR input(s) of one page (one per adaptive tile) and
+        records (page_num, tile name) + tile transforms for merge_tiles.
+        """
+        img = preprocess_array(img)
+        parts = adaptive_tiles(img, split_columns=self.split_columns) if self.adaptive else [(img, None)]
+
+        for i, (tile, transform) in enumerate(parts):
+            name = f"processed_{page_num}.png" if len(parts) == 1 else f"processed_{page_num}_t{i}.png"
+            if transform is not None:
+                transforms[name] = {**transform, "tile": i}
+            if out_dir is not None and self.persist_images:
+                self._persist(cv2.imwrite, str(out_dir / name), tile)
+            tiles.append((page_num, name))
+            yield page_num, tile
+
+    def _ocr(self, pages, out_dir):
+        """
+        OCR of (page_num, rendered array) pairs → Step 2 pages.
+        """
+        tiles, transforms = [], {}
+        inputs = (
+            tile
+            for page_num, img in pages
+            for tile in self._page_tiles(page_num, img, out_dir, tiles, transforms)
+        )
+        ocr_pages = ocr_page_stream(inputs, pool=self.ocr_pool)["pages"]
+        return merge_tiles(tiles, ocr_pages, transforms)
+
+    def _render(self, pdf_path, page_numbers):
+        """
+        (page_num, array) for the pages to OCR, one window at a time.
+        """
+        for first, last in page_runs(page_numbers):
+            yield from iter_pdf_pages(
+                pdf_path, dpi=self.dpi, poppler_path=self.poppler_path,
+                first_page=first, last_page=last
+            )
+
+    def _read_pages(self, file_bytes, out_dir):
+        """
+        Returns Step 2 output {"pages": [...]} for a PDF or an image.
+        """
+        if not file_bytes.startswith(b"%PDF"):
+            img = cv2.imdecode(np.frombuffer(file_bytes, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+            if img is None:
+                raise ValueError("Unsupported file: neither a PDF nor a readable image")
+            return {"pages": self._ocr([(1, img)], out_dir)}
+
+        # poppler / pdftotext read from a path: one temporary copy of
+        # the upload (pdf2image's convert_from_bytes does the same)
+        with tempfile.TemporaryDirectory(prefix="cv_upload_") as tmp:
+            pdf_path = Path(tmp) / "upload.pdf"
+            pdf_path.write_bytes(file_bytes)
+
+            if self.text_layer:
+                digital, to_ocr = split_text_layer(pdf_path, self.dpi, self.poppler_path)
+            else:
+                digital = []
+                to_ocr = list(range(1, pdf_page_count(pdf_path, poppler_path=self.poppler_path) + 1))
+
+            ocr_pages = []
+            if to_ocr:
+                ocr_pages = self._ocr(self._render(pdf_path, to_ocr), out_dir)
+        return merge_pages(digital, ocr_pages)
+
+    # -------------------------------
+    # Entry point
+    # -------------------------------
+    def process(self, file_bytes, doc_id):
+        """
+        Runs Steps 1 → 5 for one CV (PDF or image bytes).
+        Returns its block IDs, searchable by Step 6 on return.
+        """
+        out_dir = self.output_dir / doc_id if self.output_dir is not None else None
+        if out_dir is not None:
+            out_dir.mkdir(parents=True, exist_ok=True)
+        timings = {}
+
+        t0 = time.perf_counter()
+        raw = self._read_pages(file_bytes, out_dir)
+        timings["ocr"] = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        cleaned = clean_pages(raw["pages"])
+        blocks, _ = prepare_blocks(cleaned, doc_id)
+        timings["blocks"] = time.perf_counter() - t0
+
+        if out_dir is not None:
+            self._persist(save_pages, raw, raw_output_path(out_dir), "raw")
+            self._persist(save_pages, cleaned, with_format(out_dir / "cv_ocr_clean.json"), "clean")
+            self._persist(_save_json, blocks, out_dir / "rag_blocks.json")
+
+        if not blocks:
+            # A re-upload with no text left must not keep its old blocks
+            with self._write_lock:
+                delete_document(self.chroma_dir, doc_id, backend=self.backend,
+                                store=self.store, lexical_index=self.lexical_index)
+            print(f"[PIPELINE] {doc_id}: no text found, nothing indexed")
+            return []
+
+        t0 = time.perf_counter()
+        with self._write_lock:
+            self.lexical_index.update_document(doc_id, blocks)
+            ingest_blocks(blocks, self.chroma_dir, model=self.model, backend=self.backend, store=self.store)
+        timings["index"] = time.perf_counter() - t0
+
+        print(
+            f"[PIPELINE] {doc_id}: {len(raw['pages'])} pages, {len(blocks)} blocks "
+            f"(ocr {timings['ocr']:.2f}s, blocks {timings['blocks']:.2f}s, index {timings['index']:.2f}s)"
+        )
+        return [block_key(b) for b in blocks]
+
+
+# -------------------------------
+# CLI
+# -------------------------------
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) < 3:
+        print("Usage: python pipeline.py <chroma_dir> <cv file> [<cv file> ...]")
+        sys.exit(1)
+
+    with Pipeline(sys.argv[1]) as pipeline:
+        for path in map(Path, sys.argv[2:]):
+            pipeline.process(path.read_bytes(), path.stem)
@@ -7,27 +7,88 @@
 # - Apply minimal preprocessing suitable for OCR
 # - Preserve page order and layout
 # =====================================================
+# Pages are streamed: only PAGE_WINDOW pages are rendered and held
+# in memory at a time, and travel as arrays from rendering to
+# preprocessing (and optionally straight into OCR, see Step 2).
+# Large PDFs can be split into page ranges rendered in parallel
+# (thread or process workers); output order stays page order.
+# Born-digital PDFs: pages with a usable text layer are written to
+# text_layer.json and NOT rasterized (see step1_text_layer.py).
+# Adaptive mode (adaptive=True): each page is cropped to its content,
+# downscaled so glyphs are about TARGET_TEXT_HEIGHT px tall, and
+# optionally split into column tiles → fewer pixels to OCR. The crop /
+# scale of every tile is written to processed_{n}.transform.json so
+# Step 2 maps boxes back to full-page coordinates.
+# =====================================================
 
+import json
+import math
 import os
 import sys
 import cv2
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
-from pdf2image import convert_from_path
+from pdf2image import convert_from_path, pdfinfo_from_path
+
+from step1_preprocess.step1_text_layer import extract_text_layer
+
+
+STAGE_VERSION = "2"     # Bump when the output of this step changes
+PDF_DPI = 300           # Rasterization resolution
+PAGE_WINDOW = 1         # Pages rendered per poppler call (memory bound)
+USE_TEXT_LAYER = True   # Skip OCR for pages with a usable PDF text layer
+TEXT_LAYER_FILE = "text_layer.json"
+
+ADAPTIVE_PREPROCESS = False   # Tunable: crop + scale (+ column tiles) before OCR
+TARGET_TEXT_HEIGHT = 20       # Tunable: median glyph height (px) after scaling
+MIN_SCALE = 0.4               # Never shrink more than this (small print)
+CROP_MARGIN = 16              # px of white kept around the content
+SPLIT_COLUMNS = False         # Tunable: one tile per text column (adaptive mode)
+MIN_GUTTER = 0.03             # Blank vertical band (share of page width) between columns
+TRANSFORM_SUFFIX = ".transform.json"
 
 
 # -------------------------------
-# PDF → PNG conversion
+# PDF → page stream
 # -------------------------------
-def pdf_to_images(pdf_path, output_dir="pages", dpi=300, poppler_path=None):
+def pdf_page_count(pdf_path, poppler_path=None):
+    info = pdfinfo_from_path(str(pdf_path), poppler_path=poppler_path)
+    return int(info["Pages"])
+
+
+def iter_pdf_pages(pdf_path, dpi=PDF_DPI, poppler_path=None, window=PAGE_WINDOW,
+                   first_page=1, last_page=None):
+    """
+    Yields (page_num, grayscale array) one window of pages at a time.
+    """
+    total = last_page or pdf_page_count(pdf_path, poppler_path=poppler_path)
+
+    for first in range(first_page, total + 1, window):
+        last = min(first + window - 1, total)
+        rendered = convert_from_path(
+            str(pdf_path),
+            dpi=dpi,
+            first_page=first,
+            last_page=last,
+            poppler_path=poppler_path
+        )
+        for offset, page in enumerate(rendered):
+            # RGB → gray, as the former cv2.imread(..., IMREAD_GRAYSCALE) did
+            rgb = np.asarray(page.convert("RGB"))
+            yield first + offset, cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY)
+        del rendered
+
+
+def pdf_to_images(pdf_path, output_dir="pages", dpi=PDF_DPI, poppler_path=None):
     """
     Converts each page of a PDF into a PNG image.
     """
     os.makedirs(output_dir, exist_ok=True)
-    pages = convert_from_path(pdf_path, dpi=dpi, poppler_path=poppler_path)
     image_paths = []
-    for i, page in enumerate(pages):
-        path = os.path.join(output_dir, f"page_{i+1}.png")
-        page.save(path, "PNG")
+    for page_num, page in iter_pdf_pages(pdf_path, dpi=dpi, poppler_path=poppler_path):
+        path = os.path.join(output_dir, f"page_{page_num}.png")
+        cv2.imwrite(path, page)
         image_paths.append(path)
     return image_paths
 
@@ -35,44 +96,348 @@ def pdf_to_images(pdf_path, output_dir="pages", dpi=300, poppler_path=None):
 # -------------------------------
 # Minimal image preprocessing
 # -------------------------------
-def preprocess_image(image_path, save_path):
+def preprocess_array(img):
+    """
+    Minimal preprocessing for CV OCR on an in-memory grayscale page:
+    - Light denoising
+    """
+    return cv2.medianBlur(img, 3)
+
+
+def preprocess_image(image_path, save_path, adaptive=ADAPTIVE_PREPROCESS, split_columns=SPLIT_COLUMNS):
     """
     Minimal preprocessing for CV OCR:
     - Grayscale
     - Light denoising
+    - adaptive: crop / scale / column tiles (see save_adaptive)
+    Returns the written image paths.
     """
-    img = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+    img = cv2.imread(str(image_path), cv2.IMREAD_GRAYSCALE)
     if img is None:
         raise RuntimeError(f"Failed to read image: {image_path}")
-    img = cv2.medianBlur(img, 3)
-    cv2.imwrite(save_path, img)
+    img = preprocess_array(img)
+    if adaptive:
+        return save_adaptive(img, save_path, split_columns=split_columns)
+    cv2.imwrite(str(save_path), img)
+    return [str(save_path)]
+
+
+# -------------------------------
+# Adaptive crop / scale / tiles
+# -------------------------------
+def ink_mask(img):
+    """
+    Dark pixels (text, lines) as a boolean mask (Otsu threshold).
+    """
+    _, mask = cv2.threshold(img, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    return mask > 0
+
+
+def content_bbox(mask, margin=CROP_MARGIN, min_ink=2):
+    """
+    (x0, y0, x1, y1) around rows / columns holding ink, or None.
+    Rows / columns with fewer than min_ink pixels count as noise.
+    """
+    rows = np.flatnonzero(mask.sum(axis=1) >= min_ink)
+    cols = np.flatnonzero(mask.sum(axis=0) >= min_ink)
+    if not len(rows) or not len(cols):
+        return None
+    height, width = mask.shape
+    return (
+        max(0, int(cols[0]) - margin), max(0, int(rows[0]) - margin),
+        min(width, int(cols[-1]) + 1 + margin), min(height, int(rows[-1]) + 1 + margin)
+    )
+
+
+def estimate_text_height(mask):
+    """
+    Median height (px) of glyph-sized connected components, or None.
+    """
+    n, _, stats, _ = cv2.connectedComponentsWithStats(mask.astype(np.uint8), connectivity=8)
+    heights = stats[1:, cv2.CC_STAT_HEIGHT]
+    widths = stats[1:, cv2.CC_STAT_WIDTH]
+    glyphs = heights[(heights >= 5) & (heights <= 200) & (widths <= 4 * heights)]
+    return float(np.median(glyphs)) if len(glyphs) else None
+
+
+def column_splits(mask, min_gutter=MIN_GUTTER):
+    """
+    x positions (centres of blank vertical bands) that split the
+    content into columns; bands near the edges are ignored.
+    """
+    width = mask.shape[1]
+    blank = mask.sum(axis=0) == 0
+    min_width = max(1, int(min_gutter * width))
+
+    splits, start = [], None
+    for x, is_blank in enumerate(np.append(blank, False)):
+        if is_blank and start is None:
+            start = x
+        elif not is_blank and start is not None:
+            centre = (start + x) // 2
+            if x - start >= min_width and 0.15 * width <= centre <= 0.85 * width:
+                splits.append(centre)
+            start = None
+    return splits
+
+
+def adaptive_tiles(img, split_columns=SPLIT_COLUMNS):
+    """
+    Preprocessed page → [(tile array, {"x", "y", "scale"})], where a
+    tile pixel (u, v) is page pixel (x + u / scale, y + v / scale).
+    A blank page gives one untouched tile.
+    """
+    mask = ink_mask(img)
+    bbox = content_bbox(mask)
+    if bbox is None:
+        return [(img, {"x": 0, "y": 0, "scale": 1.0})]
+
+    text_height = estimate_text_height(mask)
+    scale = 1.0
+    if text_height:
+        scale = float(np.clip(TARGET_TEXT_HEIGHT / text_height, MIN_SCALE, 1.0))
+
+    x0, y0, x1, y1 = bbox
+    regions = [bbox]
+    if split_columns:
+        edges = [x0, *(x0 + s for s in column_splits(mask[y0:y1, x0:x1])), x1]
+        regions = []
+        for left, right in zip(edges, edges[1:]):
+            sub = content_bbox(mask[y0:y1, left:right])
+            if sub is not None:
+                regions.append((left + sub[0], y0 + sub[1], left + sub[2], y0 + sub[3]))
+
+    tiles = []
+    for rx0, ry0, rx1, ry1 in regions:
+        tile = img[ry0:ry1, rx0:rx1]
+        if scale < 1.0:
+            size = (max(1, round(tile.shape[1] * scale)), max(1, round(tile.shape[0] * scale)))
+            tile = cv2.resize(tile, size, interpolation=cv2.INTER_AREA)
+        tiles.append((tile, {"x": rx0, "y": ry0, "scale": scale}))
+    return tiles
+
+
+def save_adaptive(img, save_path, split_columns=SPLIT_COLUMNS):
+    """
+    Writes the tiles of one page (processed_{n}.png, or
+    processed_{n}_t{i}.png when split) and the sidecar
+    processed_{n}.transform.json. Returns the tile paths.
+    """
+    save_path = Path(save_path)
+    tiles = adaptive_tiles(img, split_columns=split_columns)
+
+    paths, transform = [], {}
+    for i, (tile, tile_transform) in enumerate(tiles):
+        path = save_path if len(tiles) == 1 else save_path.with_name(f"{save_path.stem}_t{i}.png")
+        cv2.imwrite(str(path), tile)
+        paths.append(str(path))
+        transform[path.name] = {**tile_transform, "tile": i}
+
+    sidecar = save_path.with_name(save_path.stem + TRANSFORM_SUFFIX)
+    with open(sidecar, "w", encoding="utf-8") as f:
+        json.dump({"width": int(img.shape[1]), "height": int(img.shape[0]), "tiles": transform}, f)
+    return paths
+
+
+# -------------------------------
+# Streaming pipeline
+# -------------------------------
+def iter_pages(file_path, dpi=PDF_DPI, poppler_path=None, window=PAGE_WINDOW):
+    """
+    Yields (page_num, grayscale array) for a PDF or a single image.
+    """
+    file_path = Path(file_path)
+    suffix = file_path.suffix.lower()
+
+    if suffix == ".pdf":
+        yield from iter_pdf_pages(file_path, dpi=dpi, poppler_path=poppler_path, window=window)
+    elif suffix in [".png", ".jpg", ".jpeg"]:
+        img = cv2.imread(str(file_path), cv2.IMREAD_GRAYSCALE)
+        if img is None:
+            raise RuntimeError(f"Failed to read image: {file_path}")
+        yield 1, img  # treat single image like a page
+    else:
+        raise ValueError(f"Unsupported file type: {file_path.suffix}")
+
+
+def iter_preprocessed_pages(file_path, dpi=PDF_DPI, poppler_path=None, window=PAGE_WINDOW):
+    """
+    Yields (page_num, preprocessed array), ready for OCR.
+    """
+    for page_num, img in iter_pages(file_path, dpi=dpi, poppler_path=poppler_path, window=window):
+        yield page_num, preprocess_array(img)
+
+
+# -------------------------------
+# Page output
+# -------------------------------
+def _emit_page(page_num, img, output_dir, save_images, keep_raw_pages, adaptive=False,
+               split_columns=False):
+    """
+    Returns the outputs of one page: its image path(s), or its array.
+    """
+    if keep_raw_pages:
+        cv2.imwrite(os.path.join(output_dir, f"page_{page_num}.png"), img)
+
+    processed = preprocess_array(img)
+
+    if save_images:
+        out_path = os.path.join(output_dir, f"processed_{page_num}.png")
+        if adaptive:
+            return save_adaptive(processed, out_path, split_columns=split_columns)
+        cv2.imwrite(out_path, processed)
+        return [out_path]
+    return [processed]
+
+
+def _process_page_range(file_path, first, last, dpi, poppler_path, window,
+                        output_dir, save_images, keep_raw_pages, adaptive=False, split_columns=False):
+    """
+    Worker task: render + preprocess pages [first, last] of a PDF.
+    Module-level so process pools can pickle it.
+    """
+    return [
+        out
+        for page_num, img in iter_pdf_pages(
+            file_path, dpi=dpi, poppler_path=poppler_path, window=window,
+            first_page=first, last_page=last
+        )
+        for out in _emit_page(page_num, img, output_dir, save_images, keep_raw_pages, adaptive, split_columns)
+    ]
+
+
+def page_runs(pages):
+    """
+    Sorted page numbers → contiguous (first, last) runs.
+    """
+    runs = []
+    for page_num in sorted(pages):
+        if runs and page_num == runs[-1][1] + 1:
+            runs[-1][1] = page_num
+        else:
+            runs.append([page_num, page_num])
+    return [tuple(r) for r in runs]
+
+
+def split_page_ranges(pages, workers):
+    """
+    Contiguous (first, last) ranges, about one group per worker.
+    """
+    pages = sorted(pages)
+    size = max(1, math.ceil(len(pages) / workers))
+    ranges = []
+    for start in range(0, len(pages), size):
+        ranges.extend(page_runs(pages[start:start + size]))
+    return ranges
+
+
+def split_text_layer(file_path, dpi=PDF_DPI, poppler_path=None):
+    """
+    Returns (born-digital pages in the raw schema, page numbers that
+    still need OCR).
+    """
+    total = pdf_page_count(file_path, poppler_path=poppler_path)
+    extracted = {p["page"]: p for p in extract_text_layer(file_path, dpi, poppler_path)}
+
+    digital = [
+        {"page": n, "blocks": extracted[n]["blocks"]}
+        for n in range(1, total + 1)
+        if n in extracted and extracted[n]["usable"]
+    ]
+    done = {p["page"] for p in digital}
+
+    print(f"[STEP 1] Text layer: {len(done)}/{total} pages born-digital (OCR skipped)")
+    return digital, [n for n in range(1, total + 1) if n not in done]
+
+
+def write_text_layer(file_path, output_dir, dpi, poppler_path):
+    """
+    Writes usable text-layer pages to text_layer.json.
+    Returns the page numbers that still need OCR.
+    """
+    digital, ocr_pages = split_text_layer(file_path, dpi, poppler_path)
+
+    if digital:
+        os.makedirs(output_dir, exist_ok=True)
+        with open(os.path.join(output_dir, TEXT_LAYER_FILE), "w", encoding="utf-8") as f:
+            json.dump({"pages": digital}, f, ensure_ascii=False, indent=2)
+
+    return ocr_pages
 
 
 # -------------------------------
 # Main pipeline function
 # -------------------------------
-def main(file_path, output_dir="pages", poppler_path=None):
+def main(file_path, output_dir="pages", poppler_path=None, save_images=True,
+         keep_raw_pages=False, dpi=PDF_DPI, window=PAGE_WINDOW,
+         workers=1, executor="thread", text_layer=USE_TEXT_LAYER, adaptive=ADAPTIVE_PREPROCESS,
+         split_columns=SPLIT_COLUMNS):
     """
     Main callable pipeline (Notebook + Script safe)
     Supports PDF + single PNG/JPG/JPEG images
+
+    save_images   : write processed_{n}.png (input of Step 2)
+    keep_raw_pages: also write the unprocessed page_{n}.png (debug)
+    workers       : > 1 splits a PDF's pages across a worker pool
+    executor      : "thread" (poppler + cv2 release the GIL) or "process"
+    text_layer    : write born-digital pages to text_layer.json and only
+                    rasterize the pages without a usable text layer
+    adaptive      : crop / scale / tile pages before OCR (with
+                    save_images; in-memory callers use adaptive_tiles)
+    split_columns : adaptive mode, one tile per text column
+    Returns the processed page paths (one per tile), or the page arrays
+    when save_images=False.
     """
     file_path = Path(file_path)
-    os.makedirs(output_dir, exist_ok=True)
+    if save_images or keep_raw_pages:
+        os.makedirs(output_dir, exist_ok=True)
 
-    # Determine input type
-    if file_path.suffix.lower() == ".pdf":
-        pages = pdf_to_images(str(file_path), output_dir=output_dir, poppler_path=poppler_path)
-    elif file_path.suffix.lower() in [".png", ".jpg", ".jpeg"]:
-        pages = [str(file_path)]  # treat single image like a page
-    else:
-        raise ValueError(f"Unsupported file type: {file_path.suffix}")
+    # A text layer, pages / tiles or tile transforms left by a previous
+    # file in the same folder would be merged into this one by Step 2
+    Path(output_dir, TEXT_LAYER_FILE).unlink(missing_ok=True)
+    if Path(output_dir).is_dir():
+        stale = list(Path(output_dir).glob(f"processed_*{TRANSFORM_SUFFIX}"))
+        if save_images:
+            stale += Path(output_dir).glob("processed_*.png")
+        for path in stale:
+            path.unlink(missing_ok=True)
+
+    is_pdf = file_path.suffix.lower() == ".pdf"
+    pages = None
+    if is_pdf and text_layer:
+        pages = write_text_layer(file_path, output_dir, dpi, poppler_path)
 
-    # Preprocess each page/image
-    for i, page in enumerate(pages):
-        out_path = os.path.join(output_dir, f"processed_{i+1}.png")
-        preprocess_image(page, out_path)
+    if is_pdf and (workers > 1 or pages is not None):
+        if executor not in ("thread", "process"):
+            raise ValueError(f"Unknown executor: {executor}")
+
+        if pages is None:
+            pages = range(1, pdf_page_count(file_path, poppler_path=poppler_path) + 1)
+        ranges = split_page_ranges(pages, workers)
+        pool_cls = ThreadPoolExecutor if executor == "thread" else ProcessPoolExecutor
+
+        with pool_cls(max_workers=max(1, min(workers, len(ranges)))) as pool:
+            futures = [
+                pool.submit(
+                    _process_page_range, str(file_path), first, last, dpi,
+                    poppler_path, window, str(output_dir), save_images, keep_raw_pages,
+                    adaptive, split_columns
+                )
+                for first, last in ranges
+            ]
+            # Collected in submission order → page order is deterministic
+            outputs = [out for future in futures for out in future.result()]
+    else:
+        outputs = [
+            out
+            for page_num, img in iter_pages(file_path, dpi=dpi, poppler_path=poppler_path, window=window)
+            for out in _emit_page(page_num, img, output_dir, save_images, keep_raw_pages,
+                                  adaptive, split_columns)
+        ]
 
-    print(f"[STEP 1] Processed {len(pages)} pages → {output_dir}")
+    print(f"[STEP 1] Processed {len(outputs)} {'tiles' if adaptive and save_images else 'pages'} "
+          f"→ {output_dir if save_images else 'memory'}")
+    return outputs
 
 
 # -------------------------------
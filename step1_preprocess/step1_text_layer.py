@@ -0,0 +1,102 @@
+# =====================================================
+# STEP 1 — BORN-DIGITAL FAST PATH (PDF TEXT LAYER)
+# =====================================================
+# Purpose:
+# - Detect pages that already carry a usable text layer
+#   (CVs exported from Word / LaTeX)
+# - Extract lines + bounding boxes with poppler's pdftotext
+# - Emit them in the cv_ocr_raw.json page schema so Step 2
+#   only OCRs the pages that really need it
+# =====================================================
+# Bounding boxes are scaled from PDF points (72 DPI) to the
+# rasterization DPI, so they match OCR'd pages of the same CV.
+# =====================================================
+
+import os
+import subprocess
+import xml.etree.ElementTree as ET
+
+
+MIN_WORDS_PER_PAGE = 5      # Fewer words → treat page as scanned
+MIN_CLEAN_CHAR_RATIO = 0.8  # Share of readable chars (broken font encodings fail this)
+
+_XHTML = "{http://www.w3.org/1999/xhtml}"
+
+
+def _pdftotext_cmd(poppler_path=None):
+    exe = "pdftotext"
+    if poppler_path:
+        exe = os.path.join(poppler_path, exe)
+    return exe
+
+
+def _bbox(node, scale):
+    x1 = float(node.get("xMin")) * scale
+    y1 = float(node.get("yMin")) * scale
+    x2 = float(node.get("xMax")) * scale
+    y2 = float(node.get("yMax")) * scale
+    return [[x1, y1], [x2, y1], [x2, y2], [x1, y2]]
+
+
+def _is_clean_char(ch):
+    return ch.isalnum() or ch.isspace() or ch in ".,;:!?'\"()[]-/+&@%€$#*•–—·|"
+
+
+def is_usable_page(blocks):
+    """
+    A page is usable when it has enough words and they are readable text.
+    """
+    text = " ".join(b["text"] for b in blocks)
+    words = text.split()
+    if len(words) < MIN_WORDS_PER_PAGE:
+        return False
+    clean = sum(1 for ch in text if _is_clean_char(ch))
+    return clean / max(1, len(text)) >= MIN_CLEAN_CHAR_RATIO
+
+
+# -------------------------------
+# pdftotext -bbox-layout → pages
+# -------------------------------
+def parse_bbox_layout(xhtml, dpi):
+    """
+    Parses pdftotext -bbox-layout output.
+    Returns [{"page", "blocks": [{text, confidence, bbox}], "usable"}].
+    """
+    scale = dpi / 72.0
+    root = ET.fromstring(xhtml)
+
+    pages = []
+    for page_num, page in enumerate(root.iter(f"{_XHTML}page"), start=1):
+        blocks = []
+        for line in page.iter(f"{_XHTML}line"):
+            words = [w.text.strip() for w in line.iter(f"{_XHTML}word") if w.text and w.text.strip()]
+            if not words:
+                continue
+            blocks.append({
+                "text": " ".join(words),
+                "confidence": 1.0,
+                "bbox": _bbox(line, scale)
+            })
+
+        pages.append({
+            "page": page_num,
+            "blocks": blocks,
+            "usable": is_usable_page(blocks)
+        })
+    return pages
+
+
+def extract_text_layer(pdf_path, dpi, poppler_path=None):
+    """
+    Returns the parsed pages, or [] when the PDF has no readable
+    text layer or pdftotext is unavailable (→ full OCR).
+    """
+    cmd = [_pdftotext_cmd(poppler_path), "-bbox-layout", "-enc", "UTF-8", str(pdf_path), "-"]
+    try:
+        result = subprocess.run(cmd, capture_output=True, check=True)
+        return parse_bbox_layout(result.stdout, dpi)
+    except FileNotFoundError:
+        print("[STEP 1] pdftotext not found → OCR for every page")
+    except (subprocess.CalledProcessError, ET.ParseError) as e:
+        print(f"[STEP 1] No readable text layer ({e}) → OCR for every page")
+    return []
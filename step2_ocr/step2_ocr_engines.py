@@ -0,0 +1,135 @@
+# =====================================================
+# STEP 2 — OCR ENGINES (PLUGGABLE BACKENDS)
+# =====================================================
+# Purpose:
+# - Define the minimal interface every OCR backend implements
+# - PaddleOCR on CPU (production)
+# - Deterministic stub engine (tests, benchmarks, dry runs)
+# - Every engine returns blocks in the cv_ocr_raw.json schema:
+#   {"text": str, "confidence": float, "bbox": [[x, y] x 4]}
+# =====================================================
+
+import hashlib
+import time
+from pathlib import Path
+
+
+OCR_LANG = "fr"
+
+
+# -------------------------------
+# Engine interface
+# -------------------------------
+class OCREngine:
+    """
+    Base class for OCR backends.
+    load() is called exactly once per worker, ocr_page() once per page.
+    """
+
+    name = "base"
+
+    def load(self):
+        pass
+
+    def ocr_page(self, image):
+        """
+        image: path to an image file or an in-memory image array.
+        Returns a list of {"text", "confidence", "bbox"} blocks.
+        """
+        raise NotImplementedError
+
+
+# -------------------------------
+# PaddleOCR (CPU)
+# -------------------------------
+class PaddleOCREngine(OCREngine):
+    name = "paddle"
+
+    def __init__(self, lang=OCR_LANG, use_gpu=False, use_angle_cls=True):
+        self.lang = lang
+        self.use_gpu = use_gpu
+        self.use_angle_cls = use_angle_cls
+        self._ocr = None
+
+    def load(self):
+        # Imported here so that only OCR workers pay the import cost
+        from paddleocr import PaddleOCR
+
+        self._ocr = PaddleOCR(
+            lang=self.lang,
+            use_gpu=self.use_gpu,
+            use_angle_cls=self.use_angle_cls,
+            show_log=False
+        )
+
+    def ocr_page(self, image):
+        if self._ocr is None:
+            self.load()
+
+        if isinstance(image, Path):
+            image = str(image)
+
+        result = self._ocr.ocr(image, cls=self.use_angle_cls)
+
+        blocks = []
+        if result and result[0]:
+            for line in result[0]:
+                blocks.append({
+                    "text": line[1][0],
+                    "confidence": float(line[1][1]),
+                    "bbox": [[float(x), float(y)] for x, y in line[0]]
+                })
+        return blocks
+
+
+# -------------------------------
+# Deterministic stub
+# -------------------------------
+class StubOCREngine(OCREngine):
+    """
+    Returns one block per page whose text is derived from the page
+    content hash. Same input → same output, no models required.
+    """
+
+    name = "stub"
+
+    def __init__(self, delay=0.0, **_):
+        self.delay = delay
+
+    def ocr_page(self, image):
+        if hasattr(image, "tobytes"):
+            payload = image.tobytes()
+            height, width = image.shape[:2]
+        else:
+            payload = Path(image).read_bytes()
+            height, width = 100, 100
+
+        if self.delay:
+            time.sleep(self.delay)
+
+        digest = hashlib.sha1(payload).hexdigest()[:12]
+        return [{
+            "text": f"stub page {digest}",
+            "confidence": 1.0,
+            "bbox": [
+                [0.0, 0.0],
+                [float(width), 0.0],
+                [float(width), float(height)],
+                [0.0, float(height)]
+            ]
+        }]
+
+
+# -------------------------------
+# Registry
+# -------------------------------
+ENGINES = {
+    PaddleOCREngine.name: PaddleOCREngine,
+    StubOCREngine.name: StubOCREngine,
+}
+
+
+def create_engine(name, **kwargs):
+    if name not in ENGINES:
+        raise ValueError(f"Unknown OCR engine: {name} (available: {sorted(ENGINES)})")
+    return ENGINES[name](**kwargs)
@@ -1,19 +1,196 @@
 # =====================================================
-# STEP 2 — OCR USING PADDLEOCR (DOCKER + GPU)
+# STEP 2 — OCR USING PADDLEOCR (WARM WORKER POOL)
 # =====================================================
 # Input : directory of PNG images
-# Output: cv_ocr_raw.json
+# Output: cv_ocr_raw.json (or cv_ocr_raw.npz, PAGE_FORMAT="npz")
+# =====================================================
+# - Default: in-process pool of warm PaddleOCR workers (CPU),
+#   shared by every CV of the process
+# - Legacy : one Docker container per CV (GPU), see run_ocr_docker
+# - Pages extracted from the PDF text layer by Step 1
+#   (text_layer.json) are merged in without OCR
+# - Adaptive Step 1 tiles (processed_{n}.transform.json) are OCR'd
+#   one by one, their boxes mapped back to full-page coordinates
+#   and merged into one page
 # =====================================================
 
+import atexit
+import json
+import re
 import subprocess
 from pathlib import Path
 
+from step2_ocr.step2_ocr_engines import OCR_LANG
+from step2_ocr.step2_ocr_pool import OCRPool, OCR_WORKERS
+from step2_ocr.step2_page_format import PAGE_FORMAT, save_pages, with_format
+
 
 DOCKER_IMAGE = "paddlecloud/paddleocr:2.6-gpu-cuda11.2-cudnn8-latest"
-OCR_LANG = "fr"
+OCR_ENGINE = "paddle"   # "paddle" | "stub"
+STAGE_VERSION = "2"     # Bump when the output of this step changes
+TEXT_LAYER_FILE = "text_layer.json"
+TRANSFORM_SUFFIX = ".transform.json"   # Written by Step 1 (adaptive mode)
+RAW_OUTPUT_FILE = "cv_ocr_raw.json"
+
+
+# -------------------------------
+# Shared warm pool
+# -------------------------------
+_DEFAULT_POOL = None
+
+
+def get_default_pool():
+    """
+    Process-wide OCR pool, created on first use and closed at exit.
+    """
+    global _DEFAULT_POOL
+    if _DEFAULT_POOL is None:
+        _DEFAULT_POOL = OCRPool(
+            engine=OCR_ENGINE,
+            engine_kwargs={"lang": OCR_LANG} if OCR_ENGINE == "paddle" else {},
+            workers=OCR_WORKERS
+        )
+        atexit.register(_DEFAULT_POOL.close)
+    return _DEFAULT_POOL
+
+
+# -------------------------------
+# Page discovery
+# -------------------------------
+def _page_number(path):
+    match = re.search(r"(\d+)", path.stem)
+    return int(match.group(1)) if match else 0
 
 
-def run_ocr(input_dir: str, output_dir: str):
+def list_page_images(input_dir):
+    """
+    Step 1 output pages in page order (processed_2 before processed_10).
+    Falls back to every PNG (legacy folders of page images) only when
+    Step 1 left neither processed_* pages nor a text layer: with a text
+    layer, no processed page means every page was born-digital, and
+    other PNGs (page_{n}.png debug renders) must not be OCR'd.
+    """
+    input_dir = Path(input_dir)
+    images = list(input_dir.glob("processed_*.png"))
+    if not images and not (input_dir / TEXT_LAYER_FILE).exists():
+        images = list(input_dir.glob("*.png"))
+    return sorted(images, key=lambda p: (_page_number(p), p.name))
+
+
+def number_pages(images):
+    """
+    (page_num, path) pairs: processed_{n}.png keeps its page number n,
+    any other PNG is numbered by position.
+    """
+    if all(p.name.startswith("processed_") for p in images):
+        return [(_page_number(p), p) for p in images]
+    return list(enumerate(images, start=1))
+
+
+def load_text_layer(input_dir):
+    """
+    Born-digital pages written by Step 1, already in the raw schema.
+    """
+    path = Path(input_dir) / TEXT_LAYER_FILE
+    if not path.exists():
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f).get("pages", [])
+
+
+def load_transforms(input_dir):
+    """
+    {tile image name: {"x", "y", "scale", "tile"}} from the Step 1
+    sidecars; empty when Step 1 did not run in adaptive mode.
+    """
+    transforms = {}
+    for path in Path(input_dir).glob(f"*{TRANSFORM_SUFFIX}"):
+        with open(path, "r", encoding="utf-8") as f:
+            transforms.update(json.load(f)["tiles"])
+    return transforms
+
+
+def map_blocks(blocks, transform):
+    """
+    Tile coordinates → page coordinates: x / scale + x0, y / scale + y0.
+    """
+    scale, x0, y0 = transform["scale"], transform["x"], transform["y"]
+    mapped = []
+    for block in blocks:
+        bbox = block.get("bbox")
+        if bbox is not None:
+            bbox = [[x / scale + x0, y / scale + y0] for x, y in bbox]
+        mapped.append({**block, "bbox": bbox})
+    return mapped
+
+
+def merge_tiles(images, ocr_pages, transforms):
+    """
+    images: the (page_num, path) pairs that were OCR'd, aligned with
+    ocr_pages. Returns one page per page_num, tiles in tile order.
+    """
+    tiles = {}
+    for (page_num, path), page in zip(images, ocr_pages):
+        transform = transforms.get(Path(path).name)
+        blocks = map_blocks(page["blocks"], transform) if transform else page["blocks"]
+        tiles.setdefault(page_num, []).append((transform["tile"] if transform else 0, blocks))
+
+    return [
+        {"page": page_num, "blocks": [b for _, blocks in sorted(parts, key=lambda t: t[0]) for b in blocks]}
+        for page_num, parts in sorted(tiles.items())
+    ]
+
+
+# -------------------------------
+# OCR → cv_ocr_raw.json schema
+# -------------------------------
+def ocr_page_stream(pages, pool=None):
+    """
+    OCR a stream of (page_num, image) pairs on the warm pool.
+    Each page is queued as soon as it is produced; the bounded pool
+    queue applies backpressure to the producer.
+    Returns {"pages": [{"page", "blocks"}]}.
+    """
+    pool = pool or get_default_pool()
+    submitted = [(page_num, pool.submit(image)) for page_num, image in pages]
+
+    pages = []
+    for page_num, future in submitted:
+        pages.append({
+            "page": page_num,
+            "blocks": future.result()
+        })
+    return {"pages": pages}
+
+
+def ocr_images(images, pool=None):
+    """
+    OCR a sequence of pages (paths or arrays) on the warm pool.
+    Returns {"pages": [{"page", "blocks"}]}.
+    """
+    return ocr_page_stream(enumerate(images, start=1), pool=pool)
+
+
+def merge_pages(digital_pages, ocr_pages):
+    """
+    Text-layer pages + OCR'd pages → {"pages": [...]} in page order.
+    """
+    pages = sorted(
+        [{"page": p["page"], "blocks": p["blocks"]} for p in digital_pages] + list(ocr_pages),
+        key=lambda p: p["page"]
+    )
+    return {"pages": pages}
+
+
+def raw_output_path(output_dir, fmt=PAGE_FORMAT):
+    return with_format(Path(output_dir) / RAW_OUTPUT_FILE, fmt)
+
+
+def _write_raw_json(ocr_result, output_dir):
+    return save_pages(ocr_result, raw_output_path(output_dir), "raw")
+
+
+def run_ocr(input_dir: str, output_dir: str, pool=None):
     """
     Entry point expected by caller_batch.py
     """
@@ -22,6 +199,59 @@ def run_ocr(input_dir: str, output_dir: str):
     output_dir = Path(output_dir).resolve()
     output_dir.mkdir(parents=True, exist_ok=True)
 
+    images = number_pages(list_page_images(input_dir))
+    digital_pages = load_text_layer(input_dir)
+
+    print("[STEP 2] OCR via warm worker pool")
+    print(f"  Language: {OCR_LANG}")
+    print(f"  Input   : {input_dir} ({len(images)} to OCR, {len(digital_pages)} from text layer)")
+    print(f"  Output  : {output_dir}")
+
+    ocr_pages = []
+    if images:
+        ocr_pages = ocr_page_stream(((n, str(p)) for n, p in images), pool=pool)["pages"]
+        ocr_pages = merge_tiles(images, ocr_pages, load_transforms(input_dir))
+
+    _write_raw_json(merge_pages(digital_pages, ocr_pages), output_dir)
+
+    print(f"[STEP 2] OCR completed → {output_dir}")
+    return output_dir
+
+
+def run_ocr_stream(file_path, output_dir, pool=None, poppler_path=None):
+    """
+    Steps 1 + 2 without intermediate PNGs: pages are rendered,
+    preprocessed and OCR'd as in-memory arrays.
+    """
+    from step1_preprocess.step1_preprocess_pdf import iter_preprocessed_pages
+
+    output_dir = Path(output_dir).resolve()
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    print(f"[STEP 2] Streaming OCR: {file_path}")
+    ocr_result = ocr_page_stream(
+        iter_preprocessed_pages(file_path, poppler_path=poppler_path),
+        pool=pool
+    )
+    _write_raw_json(ocr_result, output_dir)
+
+    print(f"[STEP 2] OCR completed ({len(ocr_result['pages'])} pages) → {output_dir}")
+    return output_dir
+
+
+# -------------------------------
+# Legacy: one Docker container per CV (GPU)
+# -------------------------------
+def run_ocr_docker(input_dir: str, output_dir: str):
+    """
+    Original GPU path: starts a fresh container (and reloads the models)
+    for every call. Kept for GPU hosts without a local PaddleOCR install.
+    """
+
+    input_dir = Path(input_dir).resolve()
+    output_dir = Path(output_dir).resolve()
+    output_dir.mkdir(parents=True, exist_ok=True)
+
     print("[STEP 2] OCR via Docker (GPU ENABLED + MODEL CACHE)")
     print(f"  Language: {OCR_LANG}")
     print(f"  Input   : {input_dir}")
@@ -0,0 +1,234 @@
+# =====================================================
+# STEP 2 — WARM OCR WORKER POOL
+# =====================================================
+# Purpose:
+# - Load OCR models ONCE per worker (not once per CV)
+# - Feed pages to long-lived workers over a bounded queue
+# - Let many CVs share the same warm pool concurrently
+# =====================================================
+
+import itertools
+import multiprocessing as mp
+import queue
+import threading
+from concurrent.futures import Future
+
+from step2_ocr.step2_ocr_engines import create_engine
+
+
+OCR_WORKERS = 2          # Tunable: number of warm OCR workers
+OCR_QUEUE_SIZE = 16      # Tunable: max pages waiting for a worker
+PUT_TIMEOUT = 1.0        # Seconds between worker liveness checks while the queue is full
+
+
+# -------------------------------
+# Worker loop (thread or process)
+# -------------------------------
+def _worker_main(engine_name, engine_kwargs, task_q, result_q, slot, current):
+    """
+    current[slot]: id of the last task taken by this worker, written
+    before OCR (shared memory, survives a crash of the worker).
+    """
+    try:
+        engine = create_engine(engine_name, **engine_kwargs)
+        engine.load()
+    except Exception as e:
+        result_q.put(("failed", None, repr(e)))
+        return
+
+    while True:
+        task = task_q.get()
+        if task is None:
+            break
+
+        task_id, image = task
+        current[slot] = task_id
+        try:
+            blocks = engine.ocr_page(image)
+            result_q.put(("done", task_id, blocks))
+        except Exception as e:
+            result_q.put(("error", task_id, repr(e)))
+
+
+# -------------------------------
+# Pool
+# -------------------------------
+class OCRPool:
+    """
+    Long-lived pool of OCR workers.
+
+    mode="process": one engine per process (PaddleOCR, CPU-bound)
+    mode="thread" : one engine per thread (stub engine, tests)
+    """
+
+    def __init__(self, engine="paddle", engine_kwargs=None, workers=OCR_WORKERS,
+                 mode="process", queue_size=OCR_QUEUE_SIZE):
+        if mode not in ("process", "thread"):
+            raise ValueError(f"Unknown pool mode: {mode}")
+
+        self.engine = engine
+        self.workers = workers
+        self.mode = mode
+
+        if mode == "process":
+            ctx = mp.get_context("spawn")  # PaddleOCR is not fork-safe
+            self._task_q = ctx.Queue(maxsize=queue_size)
+            self._result_q = ctx.Queue()
+            self._current = ctx.RawArray("q", [-1] * workers)
+            worker_cls = ctx.Process
+        else:
+            self._task_q = queue.Queue(maxsize=queue_size)
+            self._result_q = queue.Queue()
+            self._current = [-1] * workers
+            worker_cls = threading.Thread
+
+        self._futures = {}
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+        self._closed = False
+        self._failed = None      # Reason once no worker can take pages any more
+        self._load_failures = 0
+        self._reaped = set()     # Slots of dead workers already handled
+
+        self._workers = [
+            worker_cls(
+                target=_worker_main,
+                args=(engine, engine_kwargs or {}, self._task_q, self._result_q, slot, self._current),
+                daemon=True
+            )
+            for slot in range(workers)
+        ]
+        for w in self._workers:
+            w.start()
+
+        self._collector = threading.Thread(target=self._collect, daemon=True)
+        self._collector.start()
+
+        print(f"[STEP 2] OCR pool started ({workers} {mode} workers, engine={engine})")
+
+    # -------------------------------
+    # Result dispatch
+    # -------------------------------
+    def _collect(self):
+        while True:
+            try:
+                kind, task_id, payload = self._result_q.get(timeout=1.0)
+            except queue.Empty:
+                # Results queue drained: any page still held by a dead
+                # worker will never come back
+                self._reap_dead()
+                if not self._alive():
+                    self._fail_pending("All OCR workers exited")
+                    return
+                continue
+
+            if kind == "stop":
+                return
+            if kind == "failed":
+                print(f"[ERROR] OCR worker failed to load engine: {payload}")
+                self._load_failures += 1
+                if self._load_failures == self.workers:
+                    self._fail_pending(f"OCR engine failed to load in every worker: {payload}")
+                    return
+                continue
+
+            with self._lock:
+                future = self._futures.pop(task_id, None)
+            if future is None:
+                continue
+
+            if kind == "done":
+                future.set_result(payload)
+            else:
+                future.set_exception(RuntimeError(f"OCR failed: {payload}"))
+
+    def _alive(self):
+        return any(w.is_alive() for w in self._workers)
+
+    def _reap_dead(self):
+        """
+        Fails the page a crashed worker (segfault, OOM kill) was on.
+        """
+        for slot, w in enumerate(self._workers):
+            if slot in self._reaped or w.is_alive():
+                continue
+            self._reaped.add(slot)
+            with self._lock:
+                future = self._futures.pop(self._current[slot], None)
+            if future is not None and not future.done():
+                future.set_exception(RuntimeError("OCR worker died while processing this page"))
+
+    def _fail_pending(self, reason):
+        """
+        Marks the pool failed (submit raises from now on) and fails
+        every page still waiting.
+        """
+        with self._lock:
+            self._failed = self._failed or reason
+            pending = list(self._futures.values())
+            self._futures.clear()
+        for future in pending:
+            if not future.done():
+                future.set_exception(RuntimeError(reason))
+
+    # -------------------------------
+    # Public API
+    # -------------------------------
+    def submit(self, image):
+        """
+        Queue one page (path or array). Returns a Future → list of blocks.
+        Blocks when the queue is full (backpressure), raises RuntimeError
+        once no worker is left to OCR it.
+        """
+        if self._closed:
+            raise RuntimeError("OCR pool is closed")
+
+        task_id = next(self._ids)
+        future = Future()
+        with self._lock:
+            if self._failed:
+                raise RuntimeError(self._failed)
+            self._futures[task_id] = future
+
+        while True:
+            try:
+                self._task_q.put((task_id, image), timeout=PUT_TIMEOUT)
+                return future
+            except queue.Full:
+                if self._failed or not self._alive():
+                    with self._lock:
+                        self._futures.pop(task_id, None)
+                    raise RuntimeError(self._failed or "All OCR workers exited")
+
+    def map_pages(self, images):
+        """
+        OCR pages in order. All pages are queued before waiting,
+        so other callers can interleave their pages on the same pool.
+        """
+        futures = [self.submit(image) for image in images]
+        return [f.result() for f in futures]
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+
+        for _ in self._workers:
+            while self._alive():
+                try:
+                    self._task_q.put(None, timeout=PUT_TIMEOUT)
+                    break
+                except queue.Full:
+                    continue
+        for w in self._workers:
+            w.join()
+
+        self._result_q.put(("stop", None, None))
+        self._collector.join()
+        self._fail_pending("OCR pool closed")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,202 @@
+# =====================================================
+# STEP 2/3/4 — COMPACT PAGE FORMAT (.NPZ)
+# =====================================================
+# Purpose:
+# - Optional columnar alternative to the indented JSON files
+#   passed between Steps 2 → 3 → 4 (smaller, no JSON parsing)
+# - Same content, both schemas:
+#   - "raw"  : Step 2 output  {"pages": [{"page", "blocks"}]}
+#   - "clean": Step 3 output  [{"page_num", "lines"}]
+# - Streaming reader: pages are decoded one at a time
+# - JSON ↔ npz converter for debugging (CLI below)
+# =====================================================
+# Arrays (N lines in total, P pages):
+#   kind          "raw" | "clean"
+#   page_nums     P int32
+#   page_offsets  P+1 int64, lines of page i = [off[i], off[i+1])
+#   text          UTF-8 bytes of every line, concatenated (uint8)
+#   text_offsets  N+1 int64 into text
+#   confidence    N float32 (NaN = none)
+#   bbox          N x 4 x 2 float32 (NaN = none)
+# The file format follows the suffix: ".npz" here, anything
+# else is the JSON schema.
+# =====================================================
+# Usage:
+#   python -m step2_ocr.step2_page_format <in.json|in.npz> <out.npz|out.json>
+# =====================================================
+
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+
+PAGE_FORMAT = os.environ.get("PAGE_FORMAT", "json")   # "json" | "npz" (Steps 2-4 outputs)
+PAGE_FORMATS = ("json", "npz")
+
+# Page / line keys of each schema
+SCHEMAS = {
+    "raw": ("page", "blocks"),
+    "clean": ("page_num", "lines"),
+}
+
+
+def is_npz(path):
+    return Path(path).suffix == ".npz"
+
+
+def with_format(path, fmt=PAGE_FORMAT):
+    """
+    cv_ocr_raw.json → cv_ocr_raw.npz when fmt is "npz".
+    """
+    if fmt not in PAGE_FORMATS:
+        raise ValueError(f"Unknown page format: {fmt} (expected one of {PAGE_FORMATS})")
+    return Path(path).with_suffix(f".{fmt}")
+
+
+# -------------------------------
+# Write
+# -------------------------------
+def save_npz(pages, path, kind):
+    """
+    pages: a Step 2 result (kind "raw") or Step 3 pages (kind "clean").
+    """
+    page_key, lines_key = SCHEMAS[kind]
+    if kind == "raw":
+        pages = pages.get("pages", [])
+
+    page_nums, page_offsets = [], [0]
+    encoded, confidence, bbox = [], [], []
+    for page in pages:
+        for line in page.get(lines_key, []):
+            encoded.append(line.get("text", "").encode("utf-8"))
+            conf = line.get("confidence")
+            confidence.append(np.nan if conf is None else conf)
+            box = line.get("bbox")
+            bbox.append(np.full((4, 2), np.nan) if box is None else box)
+        page_nums.append(page.get(page_key) or 0)
+        page_offsets.append(len(encoded))
+
+    text_offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(t) for t in encoded], out=text_offsets[1:])
+
+    bbox = np.asarray(bbox, dtype=np.float32).reshape(len(encoded), 4, 2)
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "wb") as f:
+        np.savez(
+            f,
+            kind=np.array(kind),
+            page_nums=np.asarray(page_nums, dtype=np.int32),
+            page_offsets=np.asarray(page_offsets, dtype=np.int64),
+            text=np.frombuffer(b"".join(encoded), dtype=np.uint8),
+            text_offsets=text_offsets,
+            confidence=np.asarray(confidence, dtype=np.float32),
+            bbox=bbox
+        )
+    return path
+
+
+# -------------------------------
+# Read
+# -------------------------------
+def npz_kind(path):
+    with np.load(path) as data:
+        return str(data["kind"])
+
+
+def iter_npz_pages(path):
+    """
+    Yields the pages of an npz file one at a time, in the schema
+    it was written from.
+    """
+    with np.load(path) as data:
+        kind = str(data["kind"])
+        page_key, lines_key = SCHEMAS[kind]
+        page_nums = data["page_nums"]
+        page_offsets = data["page_offsets"]
+        text = data["text"].tobytes()
+        text_offsets = data["text_offsets"]
+        confidence = data["confidence"]
+        bbox = data["bbox"]
+
+    for i, page_num in enumerate(page_nums):
+        lines = []
+        for n in range(page_offsets[i], page_offsets[i + 1]):
+            conf = confidence[n]
+            box = bbox[n]
+            lines.append({
+                "text": text[text_offsets[n]:text_offsets[n + 1]].decode("utf-8"),
+                "confidence": None if np.isnan(conf) else float(conf),
+                "bbox": None if np.isnan(box).all() else box.tolist()
+            })
+        yield {page_key: int(page_num), lines_key: lines}
+
+
+def iter_raw_pages(path):
+    """
+    Step 2 pages ({"page", "blocks"}) from cv_ocr_raw.json or .npz.
+    """
+    if is_npz(path):
+        yield from iter_npz_pages(path)
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        yield from json.load(f).get("pages", [])
+
+
+def load_clean_pages(path):
+    """
+    Step 3 pages ({"page_num", "lines"}) from cv_ocr_clean.json or .npz.
+    """
+    if is_npz(path):
+        return list(iter_npz_pages(path))
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_pages(pages, path, kind):
+    """
+    Writes npz or indented JSON, following the suffix of `path`.
+    """
+    if is_npz(path):
+        return save_npz(pages, path, kind)
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(pages, f, ensure_ascii=False, indent=2)
+    return path
+
+
+# -------------------------------
+# Converter (debugging)
+# -------------------------------
+def convert(input_path, output_path):
+    """
+    JSON ↔ npz, either schema (detected from the input).
+    """
+    if is_npz(input_path):
+        kind = npz_kind(input_path)
+        pages = list(iter_npz_pages(input_path))
+        if kind == "raw":
+            pages = {"pages": pages}
+    else:
+        with open(input_path, "r", encoding="utf-8") as f:
+            pages = json.load(f)
+        kind = "raw" if isinstance(pages, dict) else "clean"
+
+    save_pages(pages, output_path, kind)
+    print(f"[PAGES] {input_path} → {output_path} ({kind})")
+    return output_path
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) != 3:
+        print("Usage: python -m step2_ocr.step2_page_format <in.json|in.npz> <out.npz|out.json>")
+        sys.exit(1)
+
+    convert(sys.argv[1], sys.argv[2])
@@ -1,16 +1,23 @@
 # =====================================================
 # STEP 3 — LIGHT CLEAN OCR JSON (STRUCTURE PRESERVING)
 # =====================================================
+# Input / output: JSON, or the compact .npz page format
+# (step2_ocr/step2_page_format.py), chosen by file suffix.
+# =====================================================
 
-import json
 from pathlib import Path
 
+from step2_ocr.step2_page_format import iter_raw_pages, save_pages
+
+
+STAGE_VERSION = "1"   # Bump when the output of this step changes
 
-def clean_ocr_json(input_json: Path, output_json: Path):
-    with open(input_json, "r", encoding="utf-8") as f:
-        raw = json.load(f)
 
-    raw_pages = raw.get("pages", [])
+def clean_pages(raw_pages):
+    """
+    Step 2 pages ({"page", "blocks"}, any iterable) → cleaned pages.
+    Pure: no file access.
+    """
     cleaned_pages = []
 
     for page in raw_pages:
@@ -32,9 +39,12 @@ def clean_ocr_json(input_json: Path, output_json: Path):
             "lines": lines
         })
 
-    output_json.parent.mkdir(parents=True, exist_ok=True)
-    with open(output_json, "w", encoding="utf-8") as f:
-        json.dump(cleaned_pages, f, ensure_ascii=False, indent=2)
+    return cleaned_pages
+
+
+def clean_ocr_json(input_path: Path, output_path: Path):
+    cleaned_pages = clean_pages(iter_raw_pages(input_path))
 
-    print(f"[STEP 3] Cleaned OCR saved → {output_json}")
+    save_pages(cleaned_pages, output_path, "clean")
 
+    print(f"[STEP 3] Cleaned OCR saved → {output_path}")
@@ -0,0 +1,203 @@
+# =====================================================
+# STEP 4 — LEXICAL INDEX (BM25, SQLITE)
+# =====================================================
+# Purpose:
+# - Persistent inverted index over RAG block tokens
+# - Updated incrementally by Step 4, one CV at a time
+#   (re-indexing a CV replaces its previous blocks)
+# - Exact-token lookups for skill queries ("Kubernetes",
+#   "SAP FICO") without loading the embedding model
+# - Used by Step 6 (lexical + hybrid modes)
+# =====================================================
+# Tables:
+# - blocks  : one row per block (key, doc_id, page, block_id, text, length)
+# - postings: (term, block) → term frequency
+# - stats   : block count, token count, version
+# =====================================================
+
+import heapq
+import math
+import re
+import sqlite3
+import threading
+import unicodedata
+from collections import Counter
+from pathlib import Path
+
+
+LEXICAL_INDEX_FILE = "lexical_index.sqlite"
+BM25_K1 = 1.2      # Tunable: term frequency saturation
+BM25_B = 0.75      # Tunable: block length normalization
+
+# Keeps skill tokens whole: c++, c#, node.js, ci/cd, ms-office
+_TOKEN_RE = re.compile(r"[a-z0-9][a-z0-9+#]*(?:[./\-][a-z0-9+#]+)*")
+
+
+def tokenize(text):
+    """
+    Lowercase, accent folding (French CVs), skill-friendly tokens.
+    """
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return _TOKEN_RE.findall(text)
+
+
+def block_key(block):
+    # Same IDs as the vector store (Step 5), so results can be fused
+    return f"{block['doc_id']}_p{block['page']}_b{block['block_id']}"
+
+
+# -------------------------------
+# Index
+# -------------------------------
+class LexicalIndex:
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        # Step 4 runs in several processes: wait on the writer lock
+        self._conn = sqlite3.connect(str(self.path), timeout=60, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS blocks (
+                    id INTEGER PRIMARY KEY,
+                    key TEXT UNIQUE NOT NULL,
+                    doc_id TEXT NOT NULL,
+                    page INTEGER NOT NULL,
+                    block_id INTEGER NOT NULL,
+                    text TEXT NOT NULL,
+                    length INTEGER NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS blocks_doc ON blocks (doc_id);
+                CREATE TABLE IF NOT EXISTS postings (
+                    term TEXT NOT NULL,
+                    block INTEGER NOT NULL,
+                    tf INTEGER NOT NULL,
+                    PRIMARY KEY (term, block)
+                ) WITHOUT ROWID;
+                CREATE INDEX IF NOT EXISTS postings_block ON postings (block);
+                CREATE TABLE IF NOT EXISTS stats (
+                    name TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL
+                );
+                INSERT OR IGNORE INTO stats VALUES ('blocks', 0), ('tokens', 0), ('version', 0);
+            """)
+
+    def close(self):
+        self._conn.close()
+
+    # -------------------------------
+    # Writes
+    # -------------------------------
+    def _delete_doc(self, doc_id):
+        n_blocks, n_tokens = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(length), 0) FROM blocks WHERE doc_id = ?", (doc_id,)
+        ).fetchone()
+        if n_blocks:
+            self._conn.execute(
+                "DELETE FROM postings WHERE block IN (SELECT id FROM blocks WHERE doc_id = ?)", (doc_id,)
+            )
+            self._conn.execute("DELETE FROM blocks WHERE doc_id = ?", (doc_id,))
+            self._add_stats(-n_blocks, -n_tokens)
+        return n_blocks
+
+    def _add_stats(self, n_blocks, n_tokens):
+        self._conn.executemany(
+            "UPDATE stats SET value = value + ? WHERE name = ?",
+            [(n_blocks, "blocks"), (n_tokens, "tokens"), (1, "version")]
+        )
+
+    def update_document(self, doc_id, blocks):
+        """
+        Replaces every indexed block of doc_id with `blocks`
+        (one transaction, so readers never see a half-indexed CV).
+        """
+        n_tokens = 0
+        with self._lock, self._conn:
+            self._delete_doc(doc_id)
+
+            for block in blocks:
+                tokens = tokenize(block["text"])
+                n_tokens += len(tokens)
+                row_id = self._conn.execute(
+                    "INSERT INTO blocks (key, doc_id, page, block_id, text, length) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (block_key(block), doc_id, block["page"], block["block_id"],
+                     block["text"], len(tokens))
+                ).lastrowid
+                self._conn.executemany(
+                    "INSERT INTO postings (term, block, tf) VALUES (?, ?, ?)",
+                    [(term, row_id, tf) for term, tf in Counter(tokens).items()]
+                )
+
+            self._add_stats(len(blocks), n_tokens)
+
+        return len(blocks)
+
+    def delete_document(self, doc_id):
+        with self._lock, self._conn:
+            return self._delete_doc(doc_id)
+
+    # -------------------------------
+    # Reads
+    # -------------------------------
+    def stats(self):
+        with self._lock:
+            return dict(self._conn.execute("SELECT name, value FROM stats").fetchall())
+
+    def version(self):
+        return self.stats()["version"]
+
+    def search(self, query, top_k=10, doc_ids=None):
+        """
+        BM25 over the whole index (optionally restricted to doc_ids).
+        Returns [(key, score, block)] best first.
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms or top_k <= 0:
+            return []
+
+        marks = ",".join("?" * len(terms))
+        with self._lock:
+            stats = dict(self._conn.execute("SELECT name, value FROM stats").fetchall())
+            n_blocks = stats["blocks"]
+            if not n_blocks:
+                return []
+            avg_len = stats["tokens"] / n_blocks
+
+            df = dict(self._conn.execute(
+                f"SELECT term, COUNT(*) FROM postings WHERE term IN ({marks}) GROUP BY term", terms
+            ).fetchall())
+            postings = self._conn.execute(
+                f"SELECT p.term, p.block, p.tf, b.length, b.doc_id FROM postings p "
+                f"JOIN blocks b ON b.id = p.block WHERE p.term IN ({marks})", terms
+            ).fetchall()
+
+        allowed = set(doc_ids) if doc_ids is not None else None
+        idf = {t: math.log(1 + (n_blocks - n + 0.5) / (n + 0.5)) for t, n in df.items()}
+
+        scores = {}
+        for term, row_id, tf, length, doc_id in postings:
+            if allowed is not None and doc_id not in allowed:
+                continue
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * length / avg_len)
+            scores[row_id] = scores.get(row_id, 0.0) + idf[term] * tf * (BM25_K1 + 1) / (tf + norm)
+
+        best = heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+        if not best:
+            return []
+
+        with self._lock:
+            rows = {
+                row[0]: row[1:] for row in self._conn.execute(
+                    f"SELECT id, key, doc_id, page, block_id, text FROM blocks "
+                    f"WHERE id IN ({','.join('?' * len(best))})", [row_id for row_id, _ in best]
+                )
+            }
+
+        results = []
+        for row_id, score in best:
+            key, doc_id, page, block_id, text = rows[row_id]
+            results.append((key, score, {"doc_id": doc_id, "page": page, "block_id": block_id, "text": text}))
+        return results
@@ -0,0 +1,194 @@
+# =====================================================
+# STEP 4 — STRUCTURED CV METADATA (DETERMINISTIC)
+# =====================================================
+# Purpose:
+# - Pull filterable facts out of the cleaned OCR lines with
+#   regexes + dictionaries (French and English CVs), no model:
+#   - degree_level     : highest degree as bac+N (0, 2, 3, 5, 8)
+#   - degree           : its label ("master", "phd", ...)
+#   - graduation_year  : latest year on a line of that degree
+#   - birth_year       : from a birth date after an explicit marker
+#                        ("né(e)", "date de naissance", "born"...)
+#   - age              : else the stated age, as written ("âge : 34",
+#                        or "34 ans" as its own field in the CV header)
+#   - years_experience : stated ("8 ans d'expérience"), else the
+#                        union of date ranges outside education lines
+#   - lang_<code>      : True for each language mentioned
+# - Only fields that were found are returned (vector stores
+#   reject null metadata)
+# - CLOCK_FIELDS depend on the current year ("2019 - présent"); they
+#   are kept out of Step 5's content hash so an unchanged CV is not
+#   re-embedded when the year changes
+# =====================================================
+
+import datetime
+import re
+import unicodedata
+
+
+# (bac+N level, label, pattern on accent-folded lowercase text)
+DEGREES = [
+    (8, "phd", r"\b(doctorat|ph\.? ?d|doctorate|docteur)\b"),
+    # "master" alone is also a job title (Scrum Master): only in degree context
+    (5, "master", r"\b(master(?:'s)?\s*(?:[12]|en|of|in|de|d'|degree|pro|professionnel|recherche|"
+                  r"specialise)(?![a-z])|(?:diplome|degree)\s+(?:de |d'|of )?master|mastere|msc|m\.sc|mba|"
+                  r"diplome d'ingenieur|ingenieur diplome|engineering degree|bac ?\+ ?5|dea|dess)(?![a-z])"),
+    (3, "bachelor", r"\b(licence|bachelor|bsc|b\.sc|bac ?\+ ?3)\b"),
+    (2, "associate", r"\b(bts|dut|deug|bac ?\+ ?2|associate degree)\b"),
+    (0, "baccalaureate", r"\b(baccalaureat|bac(?! ?\+)|high school diploma)\b"),
+]
+
+LANGUAGES = {
+    "fr": ("francais", "french"),
+    "en": ("anglais", "english"),
+    "es": ("espagnol", "spanish"),
+    "de": ("allemand", "german"),
+    "it": ("italien", "italian"),
+    "pt": ("portugais", "portuguese"),
+    "ar": ("arabe", "arabic"),
+    "zh": ("chinois", "mandarin", "chinese"),
+    "nl": ("neerlandais", "dutch"),
+}
+
+# Job titles / terms containing a degree word, blanked before matching degrees
+ROLE_PHRASES = r"\b(scrum ?master|webmaster|master ?data|master ?class|master ?chef|game ?master|" \
+               r"master ?black ?belt|bachelor ?party)\b"
+
+YEAR = r"(19[4-9]\d|20[0-4]\d)"
+BIRTH_YEAR = r"\b(19[4-9]\d|200\d|201\d)\b"
+HEADER_LINES = 8   # Top lines where a bare "34 ans" field is read as an age
+CLOCK_FIELDS = ("years_experience",)
+EDUCATION_WORDS = r"\b(universite|university|ecole|school|college|lycee|formation|education|diplome|degree)\b"
+
+_DEGREE_RES = [(level, label, re.compile(p)) for level, label, p in DEGREES]
+_ROLE_RE = re.compile(ROLE_PHRASES)
+_LANGUAGE_RES = {code: re.compile(r"\b(" + "|".join(words) + r")\b") for code, words in LANGUAGES.items()}
+_YEAR_RE = re.compile(YEAR)
+_EDUCATION_RE = re.compile(EDUCATION_WORDS)
+# Birth markers: on folded text, "ne(e) le" only before a day number
+# (bare "ne" is the French negation); the accented "né(e)" is matched
+# on the unfolded text
+_BIRTH_RE = re.compile(
+    r"\b(?:date de naissance|naissance|date of birth|birth ?date|born|dob|nee? le\s+\d{1,2}\b)"
+    r"[^\n]{0,30}?" + BIRTH_YEAR
+)
+_BIRTH_ACCENT_RE = re.compile(r"\bnée?(?:\(e\))?(?!\w)[^\n]{0,30}?" + BIRTH_YEAR)
+_AGE_RE = re.compile(r"\bage\s*:?\s*(1[6-9]|[2-6]\d)\b(?!\s*(?:ans|years?)?\s*(?:d'|de |of )?\s*exp)")
+_HEADER_AGE_RE = re.compile(
+    r"(?:^|[,;|•·/–-])\s*(1[6-9]|[2-6]\d)\s*(?:ans|years old|yo)\s*(?:$|[,;|•·/–-])"
+)
+_EXPERIENCE_RE = re.compile(
+    r"\b(\d{1,2})\s*\+?\s*(?:ans|annees|years?|yrs)\s*(?:d'|de |of )?\s*(?:experience|exp)\b"
+)
+_RANGE_RE = re.compile(
+    YEAR + r"\s*(?:-|–|—|a|au|to)\s*(?:" + YEAR + r"|(present|aujourd'hui|actuel|now|current|ce jour))"
+)
+
+
+def fold(text):
+    """
+    Lowercase, no accents, straight apostrophes.
+    """
+    text = unicodedata.normalize("NFKD", text.lower().replace("’", "'"))
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+def _experience_from_ranges(lines, reference_year):
+    spans = []
+    for line in lines:
+        if _EDUCATION_RE.search(line) or any(r.search(_ROLE_RE.sub(" ", line)) for _, _, r in _DEGREE_RES):
+            continue
+        for start, end, ongoing in _RANGE_RE.findall(line):
+            start = int(start)
+            end = reference_year if ongoing else int(end)
+            if start <= end <= reference_year and end - start <= 50:
+                spans.append((start, end))
+
+    # Union of overlapping jobs
+    total, current = 0, None
+    for start, end in sorted(spans):
+        if current and start <= current[1]:
+            current = (current[0], max(current[1], end))
+            continue
+        if current:
+            total += current[1] - current[0]
+        current = (start, end)
+    if current:
+        total += current[1] - current[0]
+    return total
+
+
+def extract_from_lines(lines, reference_year=None):
+    """
+    lines: raw text lines of one CV. Returns {field: value}.
+    """
+    reference_year = reference_year or datetime.date.today().year
+    raw_lines = [unicodedata.normalize("NFC", line.lower()) for line in lines if line.strip()]
+    lines = [fold(line) for line in raw_lines]
+    text = "\n".join(lines)
+    meta = {}
+
+    # -------------------------------
+    # Degree + graduation year
+    # -------------------------------
+    best = None
+    graduation_years = []   # Years on the lines of the best degree only
+    for line in lines:
+        line = _ROLE_RE.sub(" ", line)
+        for level, label, pattern in _DEGREE_RES:
+            if pattern.search(line):
+                years = [int(y) for y in _YEAR_RE.findall(line)]
+                if best is None or level > best[0]:
+                    best = (level, label)
+                    graduation_years = years
+                elif level == best[0]:
+                    graduation_years.extend(years)
+                break
+    if best:
+        meta["degree_level"], meta["degree"] = best
+    graduation_years = [y for y in graduation_years if y <= reference_year]
+    if graduation_years:
+        meta["graduation_year"] = max(graduation_years)
+
+    # -------------------------------
+    # Birth year (date of birth), else stated age
+    # -------------------------------
+    birth = _BIRTH_RE.search(text) or _BIRTH_ACCENT_RE.search("\n".join(raw_lines))
+    if birth:
+        meta["birth_year"] = int(birth.group(1))
+    else:
+        age = _AGE_RE.search(text) or next(
+            filter(None, (_HEADER_AGE_RE.search(line) for line in lines[:HEADER_LINES])), None
+        )
+        if age:
+            meta["age"] = int(age.group(1))
+
+    # -------------------------------
+    # Experience (stated, else date ranges)
+    # -------------------------------
+    stated = [int(n) for n in _EXPERIENCE_RE.findall(text) if 0 < int(n) <= 50]
+    years = max(stated) if stated else _experience_from_ranges(lines, reference_year)
+    if years:
+        meta["years_experience"] = years
+
+    # -------------------------------
+    # Languages
+    # -------------------------------
+    for code, pattern in _LANGUAGE_RES.items():
+        if pattern.search(text):
+            meta[f"lang_{code}"] = True
+
+    return meta
+
+
+def extract_metadata(cleaned_pages, reference_year=None):
+    """
+    Step 3 output (pages of lines) → candidate-level metadata.
+    """
+    lines = [
+        line.get("text", "")
+        for page in cleaned_pages
+        for line in page.get("lines", [])
+    ]
+    return extract_from_lines(lines, reference_year)
+
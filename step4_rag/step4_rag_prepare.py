@@ -6,13 +6,24 @@
 # - Optimize for embeddings and retrieval
 # - Absorb CV layout fragmentation
 # - Preserve page boundaries and traceability
+# - Optionally update the BM25 lexical index (step4_lexical_index.py)
+# - Attach candidate-level metadata (degree, birth year, languages,
+#   experience) to every block (step4_metadata.py), so Step 6 can
+#   filter before the similarity search
+# - Input: cleaned pages as JSON or the compact .npz page format
+#   (step2_ocr/step2_page_format.py)
 # =====================================================
 
 import json
 from pathlib import Path
 
+from step2_ocr.step2_page_format import load_clean_pages
+from step4_rag.step4_lexical_index import LexicalIndex
+from step4_rag.step4_metadata import extract_metadata
+
 
 MAX_WORDS_PER_BLOCK = 120   # Tunable: max words per RAG block
+STAGE_VERSION = "4"         # Bump when the output of this step changes
 
 
 def normalize_text(text: str) -> str:
@@ -23,6 +34,9 @@ def normalize_text(text: str) -> str:
 
 
 def build_blocks(cleaned_pages, doc_id):
+    """
+    cleaned_pages: Step 3 pages, any iterable (e.g. iter_npz_pages).
+    """
     blocks = []
     block_id = 0
 
@@ -61,17 +75,33 @@ def build_blocks(cleaned_pages, doc_id):
     return blocks
 
 
-def main(input_path, output_path, doc_id):
+def prepare_blocks(cleaned_pages, doc_id):
+    """
+    Blocks of one CV with the same candidate-level facts on every
+    block. Returns (blocks, metadata).
+    """
+    cleaned_pages = list(cleaned_pages)
+    rag_blocks = build_blocks(cleaned_pages, doc_id)
+
+    metadata = extract_metadata(cleaned_pages)
+    for block in rag_blocks:
+        block["meta"] = metadata
+    return rag_blocks, metadata
+
+
+def main(input_path, output_path, doc_id, index_path=None):
+    """
+    index_path: optional lexical index (SQLite) updated with this CV's blocks.
+    """
     input_path = Path(input_path)
     output_path = Path(output_path)
 
     if not input_path.exists():
         raise FileNotFoundError(f"Input file not found: {input_path}")
 
-    with open(input_path, "r", encoding="utf-8") as f:
-        cleaned_pages = json.load(f)
+    cleaned_pages = load_clean_pages(input_path)
 
-    rag_blocks = build_blocks(cleaned_pages, doc_id)
+    rag_blocks, metadata = prepare_blocks(cleaned_pages, doc_id)
 
     output_path.parent.mkdir(parents=True, exist_ok=True)
     with open(output_path, "w", encoding="utf-8") as f:
@@ -79,6 +109,15 @@ def main(input_path, output_path, doc_id):
 
     print(f"[STEP 4] RAG blocks saved → {output_path}")
     print(f"[STEP 4] Total blocks: {len(rag_blocks)}")
+    print(f"[STEP 4] Metadata: {metadata}")
+
+    if index_path is not None:
+        index = LexicalIndex(index_path)
+        try:
+            index.update_document(doc_id, rag_blocks)
+        finally:
+            index.close()
+        print(f"[STEP 4] Lexical index updated → {index_path}")
 
     return rag_blocks
 
@@ -87,7 +126,7 @@ if __name__ == "__main__":
     import sys
 
     if len(sys.argv) < 4:
-        print("Usage: python step4_rag_prepare.py <cleaned.json> <rag_blocks.json> <doc_id>")
+        print("Usage: python step4_rag_prepare.py <cleaned.json|cleaned.npz> <rag_blocks.json> <doc_id> [lexical_index.sqlite]")
         sys.exit(1)
 
-    main(sys.argv[1], sys.argv[2], sys.argv[3])
+    main(sys.argv[1], sys.argv[2], sys.argv[3], sys.argv[4] if len(sys.argv) > 4 else None)
@@ -0,0 +1,203 @@
+# =====================================================
+# STEP 5/6 — CANDIDATE INDEX (ONE VECTOR PER CV)
+# =====================================================
+# Purpose:
+# - One summary vector per candidate (doc_id), pooled from its
+#   block embeddings (normalized mean by default, or max)
+# - Maintained by Step 5 for every CV it touches
+# - Lets Step 6 rank candidates on a small matrix first, then
+#   score blocks of the top candidates only (coarse → fine)
+# - Keeps each CV's structured metadata (Step 4) so where filters
+#   apply before ranking
+# =====================================================
+# On-disk layout (under chroma_dir/candidate_index):
+#   vectors.npy   n_candidates x dim float32 (normalized)
+#   metadata.json structured metadata of each row
+#   doc_ids.json  doc_id of each row
+# All are replaced atomically (tmp file + os.replace).
+# =====================================================
+
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+from step5_embeddings.vector_store import matches_where
+
+
+CANDIDATE_INDEX_DIR = "candidate_index"
+CANDIDATE_POOLING = "mean"   # Tunable: "mean" (centroid) | "max"
+REBUILD_CHUNK_DOCS = 200     # Tunable: CVs per store lookup when rebuilding
+BLOCK_FIELDS = ("doc_id", "page", "block_id", "content_hash")   # Per-block keys, not candidate metadata
+
+
+def pool_embeddings(embeddings, pooling=CANDIDATE_POOLING):
+    """
+    Block embeddings of one CV (n, dim) → normalized summary vector.
+    """
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    if pooling == "mean":
+        vector = embeddings.mean(axis=0)
+    elif pooling == "max":
+        vector = embeddings.max(axis=0)
+    else:
+        raise ValueError(f"Unknown candidate pooling: {pooling}")
+
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+
+class CandidateIndex:
+    def __init__(self, chroma_dir):
+        self.index_dir = Path(chroma_dir) / CANDIDATE_INDEX_DIR
+        self._stamp = None
+        self.doc_ids = []
+        self.vectors = None
+        self.metadata = []
+        self.refresh()
+
+    def exists(self):
+        return (self.index_dir / "doc_ids.json").exists()
+
+    def refresh(self):
+        """
+        Reloads when Step 5 rewrote the index since the last load.
+        """
+        path = self.index_dir / "doc_ids.json"
+        stamp = path.stat().st_mtime_ns if path.exists() else None
+        if stamp == self._stamp:
+            return
+
+        if stamp is None:
+            self.doc_ids, self.vectors, self.metadata = [], None, []
+        else:
+            with open(path, "r", encoding="utf-8") as f:
+                self.doc_ids = json.load(f)
+            self.vectors = np.load(self.index_dir / "vectors.npy")
+
+            metadata_path = self.index_dir / "metadata.json"
+            self.metadata = [{} for _ in self.doc_ids]
+            if metadata_path.exists():
+                with open(metadata_path, "r", encoding="utf-8") as f:
+                    metadata = json.load(f)
+                if len(metadata) == len(self.doc_ids):
+                    self.metadata = metadata
+        self._stamp = stamp
+
+    # -------------------------------
+    # Writes (Step 5)
+    # -------------------------------
+    def update(self, doc_vectors, removed=(), doc_metadata=None):
+        """
+        doc_vectors: {doc_id: pooled vector}; removed: doc_ids to drop;
+        doc_metadata: {doc_id: metadata} (kept as is when missing).
+        """
+        rows, metas = {}, {}
+        if self.vectors is not None:
+            rows = {d: self.vectors[i] for i, d in enumerate(self.doc_ids)}
+            metas = dict(zip(self.doc_ids, self.metadata))
+        for doc_id in removed:
+            rows.pop(doc_id, None)
+            metas.pop(doc_id, None)
+        rows.update(doc_vectors)
+        metas.update(doc_metadata or {})
+
+        doc_ids = sorted(rows)
+        vectors = np.stack([rows[d] for d in doc_ids]).astype(np.float32) if doc_ids else None
+        self._save(doc_ids, vectors, [metas.get(d, {}) for d in doc_ids])
+
+    def _save(self, doc_ids, vectors, metadata):
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+
+        if vectors is not None:
+            tmp_vectors = self.index_dir / "vectors.tmp.npy"
+            np.save(tmp_vectors, vectors)
+            os.replace(tmp_vectors, self.index_dir / "vectors.npy")
+
+        tmp_metadata = self.index_dir / "metadata.json.tmp"
+        with open(tmp_metadata, "w", encoding="utf-8") as f:
+            json.dump(metadata, f, ensure_ascii=False)
+        os.replace(tmp_metadata, self.index_dir / "metadata.json")
+
+        # doc_ids.json last: its mtime is what readers watch
+        tmp_ids = self.index_dir / "doc_ids.json.tmp"
+        with open(tmp_ids, "w", encoding="utf-8") as f:
+            json.dump(doc_ids, f, ensure_ascii=False)
+        os.replace(tmp_ids, self.index_dir / "doc_ids.json")
+
+        self.doc_ids, self.vectors, self.metadata = doc_ids, vectors, metadata
+        self.refresh()
+
+    # -------------------------------
+    # Reads (Step 6)
+    # -------------------------------
+    def filter(self, where):
+        """
+        doc_ids whose metadata matches a Chroma-style where filter.
+        """
+        return [d for d, m in zip(self.doc_ids, self.metadata) if matches_where({**m, "doc_id": d}, where)]
+
+    def rank(self, query_embedding, top_n, where=None):
+        """
+        Returns [(doc_id, score)] for the top_n candidates, best first.
+        """
+        if self.vectors is None or not self.doc_ids:
+            return []
+
+        scores = self.vectors @ np.asarray(query_embedding, dtype=np.float32)
+        if where is not None:
+            keep = set(self.filter(where))
+            mask = np.array([d in keep for d in self.doc_ids], dtype=bool)
+            scores = np.where(mask, scores, -np.inf)
+            top_n = min(top_n, int(mask.sum()))
+            if top_n == 0:
+                return []
+        top_n = min(top_n, len(scores))
+        best = np.argpartition(-scores, top_n - 1)[:top_n]
+        best = best[np.argsort(-scores[best])]
+        return [(self.doc_ids[i], float(scores[i])) for i in best]
+
+
+# -------------------------------
+# Maintenance (called by Step 5)
+# -------------------------------
+def pooled_vectors(store, doc_ids, pooling=CANDIDATE_POOLING):
+    """
+    Re-pools each CV from the embeddings currently in the vector store.
+    Returns (vectors, metadata, removed); CVs with no blocks left are
+    returned as removed.
+    """
+    doc_ids = list(doc_ids)
+    vectors, metadata = {}, {}
+
+    for start in range(0, len(doc_ids), REBUILD_CHUNK_DOCS):
+        chunk = doc_ids[start:start + REBUILD_CHUNK_DOCS]
+        result = store.get(where={"doc_id": {"$in": chunk}}, include=("embeddings", "metadatas"))
+
+        per_doc = {}
+        for embedding, meta in zip(result["embeddings"], result["metadatas"]):
+            per_doc.setdefault(meta["doc_id"], []).append(embedding)
+            metadata.setdefault(meta["doc_id"], {
+                k: v for k, v in meta.items() if k not in BLOCK_FIELDS
+            })
+        for doc_id, embeddings in per_doc.items():
+            vectors[doc_id] = pool_embeddings(embeddings, pooling)
+
+    removed = [d for d in doc_ids if d not in vectors]
+    return vectors, metadata, removed
+
+
+def update_candidates(store, chroma_dir, doc_ids):
+    """
+    Refreshes the summary vectors of doc_ids. The first call on an
+    existing collection backfills every CV already stored.
+    """
+    index = CandidateIndex(chroma_dir)
+    if not index.exists():
+        all_docs = {m["doc_id"] for m in store.get(include=("metadatas",))["metadatas"]}
+        doc_ids = set(doc_ids) | all_docs
+
+    vectors, metadata, removed = pooled_vectors(store, doc_ids)
+    index.update(vectors, removed, metadata)
+    return len(vectors)
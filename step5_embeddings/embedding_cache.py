@@ -0,0 +1,164 @@
+# =====================================================
+# STEP 5 — PERSISTENT EMBEDDING CACHE (SQLITE)
+# =====================================================
+# Purpose:
+# - Never encode the same block text twice with the same model:
+#   boilerplate shared by many CVs, re-chunked or re-uploaded CVs
+#   reuse the stored vector
+# - Content-addressed: key = model + embedding backend +
+#   normalized text (Unicode NFC, collapsed whitespace)
+# - Bounded: least recently used vectors are evicted above
+#   EMBEDDING_CACHE_ENTRIES
+# - Hit / miss counters, reported per batch by Step 5
+# =====================================================
+# Location: STEP5_EMBEDDING_CACHE (default: $XDG_CACHE_HOME or ~/.cache,
+# ocr_pipeline/embedding_cache.sqlite; never inside the source tree)
+# =====================================================
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from pathlib import Path
+
+import numpy as np
+
+
+CACHE_DIR = Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / "ocr_pipeline"
+EMBEDDING_CACHE_PATH = os.environ.get("STEP5_EMBEDDING_CACHE", str(CACHE_DIR / "embedding_cache.sqlite"))
+EMBEDDING_CACHE_ENTRIES = 500000   # Tunable: max cached vectors (~1.5 KB each at dim 384)
+LOOKUP_CHUNK = 500                 # Keys per SQL query (SQLite variable limit)
+
+
+def normalize_text(text):
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def embedding_key(model, backend, text):
+    payload = f"{model}\x00{backend}\x00{normalize_text(text)}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    def __init__(self, path=EMBEDDING_CACHE_PATH, max_entries=EMBEDDING_CACHE_ENTRIES):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, dim INTEGER NOT NULL, vector BLOB NOT NULL, "
+                "accessed REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_accessed ON embeddings (accessed)")
+
+    def get_many(self, keys):
+        """
+        Returns {key: float32 vector} for the keys that are cached.
+        """
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        now = time.time()
+        with self._lock:
+            for start in range(0, len(keys), LOOKUP_CHUNK):
+                chunk = keys[start:start + LOOKUP_CHUNK]
+                marks = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, dim, vector FROM embeddings WHERE key IN ({marks})", chunk
+                ).fetchall()
+                for key, dim, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32, count=dim)
+            if found:
+                with self._conn:
+                    self._conn.executemany(
+                        "UPDATE embeddings SET accessed = ? WHERE key = ?", [(now, k) for k in found]
+                    )
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, items):
+        """
+        items: [(key, vector)]
+        """
+        now = time.time()
+        rows = []
+        for key, vector in items:
+            vector = np.asarray(vector, dtype=np.float32)
+            rows.append((key, int(vector.shape[0]), vector.tobytes(), now))
+        if not rows:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, dim, vector, accessed) VALUES (?, ?, ?, ?)", rows
+            )
+            self._evict()
+
+    def _evict(self):
+        size = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        if size > self.max_entries:
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE key IN "
+                "(SELECT key FROM embeddings ORDER BY accessed ASC LIMIT ?)",
+                (size - self.max_entries,)
+            )
+
+    def stats(self):
+        total = self.hits + self.misses
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        return {
+            "size": size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0
+        }
+
+
+# -------------------------------
+# Cached encoding
+# -------------------------------
+def encode_cached(texts, encode, cache, model, backend):
+    """
+    texts: block texts; encode: callable (texts) → normalized vectors,
+    called once for the texts missing from the cache (each distinct
+    text encoded once). Returns (float32 array (n, dim), n_hits).
+    """
+    keys = [embedding_key(model, backend, text) for text in texts]
+    found = cache.get_many(keys)
+
+    todo = {}
+    for key, text in zip(keys, texts):
+        if key not in found:
+            todo.setdefault(key, text)
+
+    if todo:
+        vectors = np.asarray(encode(list(todo.values())), dtype=np.float32)
+        fresh = dict(zip(todo, vectors))
+        cache.put_many(fresh.items())
+        found.update(fresh)
+
+    hits = sum(key not in todo for key in keys)
+    return np.stack([found[key] for key in keys]), hits
+
+
+# -------------------------------
+# Process-wide cache
+# -------------------------------
+_CACHE = {}
+_CACHE_LOCK = threading.Lock()
+
+
+def embedding_cache(path=None):
+    path = str(path or EMBEDDING_CACHE_PATH)
+    with _CACHE_LOCK:
+        if path not in _CACHE:
+            _CACHE[path] = EmbeddingCache(path)
+        return _CACHE[path]
@@ -0,0 +1,115 @@
+# =====================================================
+# SHARED EMBEDDING PROVIDER (STEPS 5 + 6)
+# =====================================================
+# Purpose:
+# - One memoized model instance per process (no reload per call)
+# - Automatic device detection with CPU fallback
+# - Optional ONNX / int8-quantized inference on CPU
+# =====================================================
+# Backends:
+# - "torch"    : SentenceTransformer on cuda / mps / cpu
+# - "onnx"     : ONNX Runtime, fp32 (CPU)
+# - "onnx-int8": ONNX Runtime, dynamically quantized int8 (CPU)
+# Select with EMBEDDING_BACKEND (env var or argument).
+# =====================================================
+
+import os
+import threading
+
+
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+EMBEDDING_BACKEND = os.environ.get("EMBEDDING_BACKEND", "torch")
+EMBEDDING_DEVICE = os.environ.get("EMBEDDING_DEVICE")   # None → auto-detect
+
+# Quantized export shipped with the sentence-transformers model repo
+ONNX_INT8_FILE = "onnx/model_quint8_avx2.onnx"
+
+BACKENDS = ("torch", "onnx", "onnx-int8")
+
+_MODELS = {}
+_LOCK = threading.Lock()
+
+
+# -------------------------------
+# Device detection
+# -------------------------------
+def detect_device():
+    """
+    cuda > mps > cpu, depending on what this node actually has.
+    """
+    try:
+        import torch
+    except ImportError:
+        return "cpu"
+
+    if torch.cuda.is_available():
+        return "cuda"
+    if getattr(torch.backends, "mps", None) and torch.backends.mps.is_available():
+        return "mps"
+    return "cpu"
+
+
+# -------------------------------
+# Model loading
+# -------------------------------
+def _load_model(model_name, backend, device):
+    from sentence_transformers import SentenceTransformer
+
+    if backend == "torch":
+        try:
+            return SentenceTransformer(model_name, device=device)
+        except Exception as e:
+            if device == "cpu":
+                raise
+            print(f"[EMBED] Could not load on {device} ({e}) → falling back to CPU")
+            return SentenceTransformer(model_name, device="cpu")
+
+    if backend == "onnx":
+        return SentenceTransformer(model_name, device="cpu", backend="onnx")
+
+    if backend == "onnx-int8":
+        return SentenceTransformer(
+            model_name,
+            device="cpu",
+            backend="onnx",
+            model_kwargs={"file_name": ONNX_INT8_FILE}
+        )
+
+    raise ValueError(f"Unknown embedding backend: {backend} (available: {BACKENDS})")
+
+
+def get_embedding_model(model_name=EMBEDDING_MODEL, backend=None, device=None):
+    """
+    Returns the process-wide model for (model_name, backend, device),
+    loading it on first use.
+    """
+    backend = backend or EMBEDDING_BACKEND
+    if backend == "torch":
+        device = device or EMBEDDING_DEVICE or detect_device()
+    else:
+        device = "cpu"
+
+    key = (model_name, backend, device)
+    with _LOCK:
+        if key not in _MODELS:
+            print(f"[EMBED] Loading {model_name} (backend={backend}, device={device})")
+            _MODELS[key] = _load_model(model_name, backend, device)
+        return _MODELS[key]
+
+
+def encode_texts(texts, model=None, batch_size=64):
+    """
+    L2-normalized embeddings (float32 array, one row per text).
+    """
+    model = model or get_embedding_model()
+    return model.encode(
+        list(texts),
+        batch_size=batch_size,
+        normalize_embeddings=True,
+        convert_to_numpy=True
+    )
+
+
+def clear_cache():
+    with _LOCK:
+        _MODELS.clear()
@@ -0,0 +1,432 @@
+# =====================================================
+# STEP 5/6 — MEMORY-MAPPED FLAT VECTOR INDEX
+# =====================================================
+# Purpose:
+# - Alternative to Chroma for large corpora
+# - Normalized block embeddings in a memory-mapped matrix,
+#   stored as float16 or int8 (+ one float32 scale per vector)
+# - Compact side arrays for block metadata
+# - Exact top-k: vectorized dot product + argpartition,
+#   optional doc_id filtering
+# =====================================================
+# On-disk layout (one directory):
+#   header.json  dim, dtype, count, doc table
+#   vectors.bin  count x dim (float16 | int8)
+#   scales.bin   count float32            (int8 only)
+#   meta.bin     count x (doc_idx, page, block_id) int32
+#   texts.bin    UTF-8 block texts, concatenated
+#   spans.bin    count x (offset, length) int64 into texts.bin
+#   extra.bin    other metadata fields, one compact JSON object per row
+#   extra_spans.bin  count x (offset, length) int64 into extra.bin
+#   ids.txt      one block ID per line
+# Appends only extend the files; header.json is replaced last, so a
+# crash mid-write leaves the previous state readable.
+# Readers only map the first header.count rows and never change a
+# file. Writers (one at a time, exclusive flock on <dir>.lock next to
+# the directory) drop uncommitted rows of a crashed append before
+# writing their own.
+# =====================================================
+
+import json
+import os
+import shutil
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:   # Windows: no cross-process lock, single writer assumed
+    fcntl = None
+
+import numpy as np
+
+
+FLAT_DTYPE = "float16"      # "float16" | "int8"
+SEARCH_CHUNK_ROWS = 8192    # Rows scored per step (bounds temp memory, stays in cache)
+
+META_DTYPE = np.dtype([("doc_idx", "<i4"), ("page", "<i4"), ("block_id", "<i4")])
+META_FIELDS = ("doc_id", "page", "block_id")   # Stored in meta.bin; anything else goes to extra.bin
+SPAN_DTYPE = np.dtype([("offset", "<i8"), ("length", "<i8")])
+
+
+# -------------------------------
+# Quantization
+# -------------------------------
+def quantize(embeddings, dtype):
+    """
+    float32 (n, dim) → (stored array, per-vector scales or None)
+    """
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    if dtype == "float16":
+        return embeddings.astype(np.float16), None
+    if dtype == "int8":
+        scales = np.abs(embeddings).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        q = np.clip(np.rint(embeddings / scales[:, None]), -127, 127).astype(np.int8)
+        return q, scales.astype(np.float32)
+    raise ValueError(f"Unsupported flat index dtype: {dtype}")
+
+
+# -------------------------------
+# Index
+# -------------------------------
+class FlatIndex:
+    def __init__(self, index_dir, dtype=FLAT_DTYPE, writer=False):
+        """
+        writer: False → read-only view (Step 6, services, scoring);
+                True  → Step 5, may append / rewrite
+        """
+        self.index_dir = Path(index_dir)
+        self.writer = writer
+        self._default_dtype = dtype
+        self._lock_path = self.index_dir.with_name(self.index_dir.name + ".lock")
+        if writer:
+            with self._exclusive():
+                self._load()
+                self._truncate_to_header()
+        else:
+            self._load()
+
+    def _load(self):
+        self.header = self._read_header() or {
+            "dim": None, "dtype": self._default_dtype, "count": 0, "docs": []
+        }
+        self.dtype = self.header["dtype"]
+        self._doc_index = {d: i for i, d in enumerate(self.header["docs"])}
+        self._ids = None
+        self._header_mtime = self._header_stamp()
+
+    def _header_stamp(self):
+        path = self.index_dir / "header.json"
+        return path.stat().st_mtime_ns if path.exists() else None
+
+    def refresh(self):
+        """
+        Re-reads the header if another process committed new rows.
+        """
+        if self._header_stamp() != self._header_mtime:
+            self._load()
+
+    # -------------------------------
+    # Header + crash recovery
+    # -------------------------------
+    @contextmanager
+    def _exclusive(self):
+        """
+        Cross-process writer lock (held for a whole append / rewrite).
+        """
+        if not self.writer:
+            raise PermissionError(f"Flat index opened read-only: {self.index_dir}")
+        self._lock_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self._lock_path, "a") as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _read_header(self):
+        path = self.index_dir / "header.json"
+        if not path.exists():
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _write_header(self):
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.index_dir / "header.json.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.header, f, ensure_ascii=False)
+        os.replace(tmp_path, self.index_dir / "header.json")
+
+    def _truncate_to_header(self):
+        """
+        Drops rows appended after the last committed header.
+        Writers only, under _exclusive(): a live append is never cut.
+        """
+        n, dim = self.count, self.dim
+        if dim is None:
+            return
+        itemsize = np.dtype(self.dtype).itemsize
+        expected = {
+            "vectors.bin": n * dim * itemsize,
+            "scales.bin": n * 4 if self.dtype == "int8" else 0,
+            "meta.bin": n * META_DTYPE.itemsize,
+            "spans.bin": n * SPAN_DTYPE.itemsize,
+            "extra_spans.bin": n * SPAN_DTYPE.itemsize,
+        }
+        for name, size in expected.items():
+            path = self.index_dir / name
+            if path.exists() and path.stat().st_size > size:
+                with open(path, "r+b") as f:
+                    f.truncate(size)
+
+        ids_path = self.index_dir / "ids.txt"
+        if ids_path.exists():
+            ids = ids_path.read_text(encoding="utf-8").splitlines()
+            if len(ids) > n:
+                ids_path.write_text("".join(i + "\n" for i in ids[:n]), encoding="utf-8")
+
+        for blob_name, spans_name in (("texts.bin", "spans.bin"), ("extra.bin", "extra_spans.bin")):
+            spans = self._spans(spans_name)
+            blob_path = self.index_dir / blob_name
+            if n and spans is not None and blob_path.exists():
+                end = int(spans[-1]["offset"] + spans[-1]["length"])
+                if blob_path.stat().st_size > end:
+                    with open(blob_path, "r+b") as f:
+                        f.truncate(end)
+
+    @property
+    def count(self):
+        return self.header["count"]
+
+    @property
+    def dim(self):
+        return self.header["dim"]
+
+    @property
+    def docs(self):
+        return self.header["docs"]
+
+    def _memmap(self, name, dtype, shape):
+        path = self.index_dir / name
+        if not path.exists() or shape[0] == 0:
+            return None
+        return np.memmap(path, dtype=dtype, mode="r", shape=shape)
+
+    # -------------------------------
+    # Read access
+    # -------------------------------
+    def vectors(self):
+        return self._memmap("vectors.bin", self.dtype, (self.count, self.dim))
+
+    def scales(self):
+        if self.dtype != "int8":
+            return None
+        return self._memmap("scales.bin", np.float32, (self.count,))
+
+    def meta(self):
+        return self._memmap("meta.bin", META_DTYPE, (self.count,))
+
+    def ids(self):
+        if self._ids is None:
+            path = self.index_dir / "ids.txt"
+            self._ids = path.read_text(encoding="utf-8").splitlines()[:self.count] if path.exists() else []
+        return self._ids
+
+    def _spans(self, name):
+        """
+        Span table of a blob file; None if missing or shorter than count
+        (extra_spans.bin of indexes written before it existed).
+        """
+        path = self.index_dir / name
+        if not path.exists() or path.stat().st_size < self.count * SPAN_DTYPE.itemsize:
+            return None
+        return self._memmap(name, SPAN_DTYPE, (self.count,))
+
+    def _read_blobs(self, blob_name, spans_name, rows):
+        spans = self._spans(spans_name)
+        if spans is None:
+            return [b""] * len(rows)
+        out = []
+        with open(self.index_dir / blob_name, "rb") as f:
+            for row in rows:
+                f.seek(int(spans[row]["offset"]))
+                out.append(f.read(int(spans[row]["length"])))
+        return out
+
+    def texts(self, rows):
+        return [data.decode("utf-8") for data in self._read_blobs("texts.bin", "spans.bin", rows)]
+
+    def metadatas(self, rows):
+        rows = list(rows)
+        meta = self.meta()
+        extras = self._read_blobs("extra.bin", "extra_spans.bin", rows)
+        return [{
+            **(json.loads(extra) if extra else {}),
+            "doc_id": self.docs[int(meta[row]["doc_idx"])],
+            "page": int(meta[row]["page"]),
+            "block_id": int(meta[row]["block_id"])
+        } for row, extra in zip(rows, extras)]
+
+    def row_embeddings(self, rows):
+        rows = np.asarray(rows, dtype=np.int64)
+        vecs = np.asarray(self.vectors()[rows], dtype=np.float32)
+        if self.dtype == "int8":
+            vecs *= self.scales()[rows][:, None]
+        return vecs
+
+    # -------------------------------
+    # Write access
+    # -------------------------------
+    def append(self, ids, embeddings, documents, metadatas):
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if not len(ids):
+            return
+        with self._exclusive():
+            # Rows committed by another writer since we loaded, then
+            # leftovers of a crashed append
+            self.refresh()
+            self._truncate_to_header()
+            self._append(ids, embeddings, documents, metadatas)
+
+    def _append(self, ids, embeddings, documents, metadatas):
+        if self.dim is None:
+            self.header["dim"] = int(embeddings.shape[1])
+        if embeddings.shape[1] != self.dim:
+            raise ValueError(f"Embedding dim {embeddings.shape[1]} != index dim {self.dim}")
+
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        stored, scales = quantize(embeddings, self.dtype)
+
+        meta = np.zeros(len(ids), dtype=META_DTYPE)
+        for i, m in enumerate(metadatas):
+            doc_id = m["doc_id"]
+            if doc_id not in self._doc_index:
+                self._doc_index[doc_id] = len(self.header["docs"])
+                self.header["docs"].append(doc_id)
+            meta[i] = (self._doc_index[doc_id], m["page"], m["block_id"])
+
+        extras = [
+            {k: v for k, v in m.items() if k not in META_FIELDS} for m in metadatas
+        ]
+
+        with open(self.index_dir / "vectors.bin", "ab") as f:
+            f.write(stored.tobytes())
+        if scales is not None:
+            with open(self.index_dir / "scales.bin", "ab") as f:
+                f.write(scales.tobytes())
+        with open(self.index_dir / "meta.bin", "ab") as f:
+            f.write(meta.tobytes())
+        self._append_blobs("texts.bin", "spans.bin", [d.encode("utf-8") for d in documents])
+        self._append_blobs("extra.bin", "extra_spans.bin", [
+            json.dumps(e, ensure_ascii=False, separators=(",", ":")).encode("utf-8") if e else b""
+            for e in extras
+        ])
+        with open(self.index_dir / "ids.txt", "a", encoding="utf-8") as f:
+            f.write("".join(i + "\n" for i in ids))
+
+        # Commit
+        self.header["count"] += len(ids)
+        self._write_header()
+        self._ids = None
+        self._header_mtime = self._header_stamp()
+
+    def _append_blobs(self, blob_name, spans_name, encoded):
+        blob_path = self.index_dir / blob_name
+        spans_path = self.index_dir / spans_name
+        offset = blob_path.stat().st_size if blob_path.exists() else 0
+
+        # Rows committed before this file existed get empty spans
+        have = spans_path.stat().st_size // SPAN_DTYPE.itemsize if spans_path.exists() else 0
+        spans = np.zeros(self.count - have + len(encoded), dtype=SPAN_DTYPE)
+        spans["offset"] = offset
+        for i, data in enumerate(encoded, start=self.count - have):
+            spans[i] = (offset, len(data))
+            offset += len(data)
+
+        with open(blob_path, "ab") as f:
+            f.write(b"".join(encoded))
+        with open(spans_path, "ab") as f:
+            f.write(spans.tobytes())
+
+    def rewrite(self, keep_rows, extra=None):
+        """
+        Compaction: keeps keep_rows (in order), then appends `extra`
+        (ids, embeddings, documents, metadatas). Used for delete/upsert.
+        """
+        with self._exclusive():
+            self.refresh()
+            self._rewrite(list(keep_rows), extra)
+
+    def _rewrite(self, keep_rows, extra):
+        tmp_dir = self.index_dir.with_name(self.index_dir.name + ".tmp")
+        old_dir = self.index_dir.with_name(self.index_dir.name + ".old")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+        tmp = FlatIndex(tmp_dir, dtype=self.dtype, writer=True)
+        tmp.header["dim"] = self.dim
+        if keep_rows:
+            tmp.append(
+                self.ids_at(keep_rows),
+                self.row_embeddings(keep_rows),
+                self.texts(keep_rows),
+                self.metadatas(keep_rows)
+            )
+        if extra and len(extra[0]):
+            tmp.append(*extra)
+        tmp._write_header()
+
+        # Swap directories (old index stays readable until the rename)
+        shutil.rmtree(old_dir, ignore_errors=True)
+        if self.index_dir.exists():
+            os.replace(self.index_dir, old_dir)
+        os.replace(tmp_dir, self.index_dir)
+        shutil.rmtree(old_dir, ignore_errors=True)
+        tmp._lock_path.unlink(missing_ok=True)
+
+        self._load()
+
+    def ids_at(self, rows):
+        ids = self.ids()
+        return [ids[r] for r in rows]
+
+    # -------------------------------
+    # Search
+    # -------------------------------
+    def doc_mask(self, doc_ids):
+        """
+        Boolean row mask for the given doc_ids.
+        """
+        wanted = [self._doc_index[d] for d in doc_ids if d in self._doc_index]
+        return np.isin(np.asarray(self.meta()["doc_idx"]), wanted)
+
+    def iter_scores(self, queries, chunk_rows=SEARCH_CHUNK_ROWS):
+        """
+        Yields (start_row, scores[rows, n_queries]) chunk by chunk.
+        """
+        queries = np.asarray(queries, dtype=np.float32)
+        vectors, scales = self.vectors(), self.scales()
+        for start in range(0, self.count, chunk_rows):
+            block = np.asarray(vectors[start:start + chunk_rows], dtype=np.float32)
+            scores = block @ queries.T
+            if scales is not None:
+                scores *= scales[start:start + chunk_rows][:, None]
+            yield start, scores
+
+    def search(self, queries, top_k, mask=None):
+        """
+        Exact top-k per query. Returns (rows, scores), each (n_queries, k),
+        best first. Rows excluded by `mask` are never returned.
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        n_q = len(queries)
+        best_rows = np.zeros((n_q, 0), dtype=np.int64)
+        best_scores = np.zeros((n_q, 0), dtype=np.float32)
+
+        if self.count == 0:
+            return best_rows, best_scores
+
+        for start, scores in self.iter_scores(queries):
+            scores = scores.T  # (n_q, rows)
+            if mask is not None:
+                scores = np.where(mask[start:start + scores.shape[1]], scores, -np.inf)
+
+            k = min(top_k, scores.shape[1])
+            part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            cand_scores = np.take_along_axis(scores, part, axis=1)
+
+            best_rows = np.concatenate([best_rows, part + start], axis=1)
+            best_scores = np.concatenate([best_scores, cand_scores], axis=1)
+
+            if best_rows.shape[1] > top_k:
+                keep = np.argpartition(-best_scores, top_k - 1, axis=1)[:, :top_k]
+                best_rows = np.take_along_axis(best_rows, keep, axis=1)
+                best_scores = np.take_along_axis(best_scores, keep, axis=1)
+
+        order = np.argsort(-best_scores, axis=1, kind="stable")
+        best_rows = np.take_along_axis(best_rows, order, axis=1)
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+        return best_rows, best_scores
@@ -5,89 +5,379 @@
 # - Embed RAG blocks into a persistent Chroma DB
 # - Skip blocks that are already embedded
 # - Allow incremental updates (safe re-runs)
+# - Reconcile re-uploaded / re-chunked CVs: stale blocks are
+#   deleted, changed blocks re-embedded, the rest kept
+# - delete_document(): remove one CV without a rebuild
+# =====================================================
+# Ingestion is batched:
+# - one bulk existence check for all candidate IDs
+# - only missing texts are encoded, ENCODE_BATCH_SIZE at a time
+# - chunked bulk add (ADD_CHUNK_SIZE rows per call)
+# - texts already encoded by the same model (any CV, any run) come
+#   from the embedding cache (embedding_cache.py)
+# - blocks of many CVs can be ingested in a single call
+# Storage backend: Chroma (default) or the memory-mapped flat
+# index (VECTOR_BACKEND="flat"), see vector_store.py
+# Every CV that gains blocks gets its summary vector re-pooled
+# in the candidate index (candidate_index.py, used by Step 6)
+# Reconciliation (per CV):
+# - every block stores a content_hash (text + Step 4 metadata)
+# - every CV has a fingerprint (hash of its block keys + hashes);
+#   an unchanged fingerprint skips the CV without a store lookup
+# - otherwise: one bulk delete (removed + changed blocks), then
+#   changed + new blocks are embedded and added
 # =====================================================
 
+import hashlib
 import json
+import os
 from pathlib import Path
-import chromadb
-from sentence_transformers import SentenceTransformer
+
+from step4_rag.step4_lexical_index import LEXICAL_INDEX_FILE, LexicalIndex
+from step4_rag.step4_metadata import CLOCK_FIELDS
+from step5_embeddings.candidate_index import REBUILD_CHUNK_DOCS, CandidateIndex, update_candidates
+from step5_embeddings.embedding_cache import embedding_cache, encode_cached
+from step5_embeddings.embedding_provider import EMBEDDING_BACKEND, EMBEDDING_MODEL, get_embedding_model
+from step5_embeddings.vector_store import open_store
 
 # -------------------------------
 # CONFIG
 # -------------------------------
-EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+STAGE_VERSION = "2"   # Bump when the output of this step changes
+
+ENCODE_BATCH_SIZE = 64    # Tunable: texts per encoder forward pass
+ADD_CHUNK_SIZE = 1000     # Tunable: rows per Chroma add/upsert call
+LOOKUP_CHUNK_SIZE = 5000  # Tunable: IDs per existence lookup (SQLite limits)
+VERSION_FILE = "collection_version.json"
+FINGERPRINTS_FILE = "doc_fingerprints_{backend}.json"
 
 
 # -------------------------------
-# MAIN
+# HELPERS
 # -------------------------------
-def main(blocks_path, chroma_dir):
-    blocks_path = Path(blocks_path)
+def block_key(block):
+    return f"{block['doc_id']}_p{block['page']}_b{block['block_id']}"
+
+
+def content_hash(block):
+    """
+    Changes when the text or the Step 4 metadata of a block changes
+    (not the fields that follow the calendar year).
+    """
+    meta = {k: v for k, v in block.get("meta", {}).items() if k not in CLOCK_FIELDS}
+    payload = json.dumps([block["text"], meta], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def block_metadata(block):
+    """
+    Store metadata: position + the Step 4 candidate-level fields.
+    """
+    return {
+        **block.get("meta", {}),
+        "doc_id": block["doc_id"],
+        "page": block["page"],
+        "block_id": block["block_id"],
+        "content_hash": content_hash(block)
+    }
+
+
+def document_fingerprint(blocks):
+    """
+    blocks: every block of one CV → hash of its (key, content_hash) set.
+    """
+    digest = hashlib.sha1()
+    for key, block_hash in sorted((block_key(b), content_hash(b)) for b in blocks):
+        digest.update(f"{key}:{block_hash}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def existing_ids(store, ids):
+    """
+    Bulk existence check (one lookup per LOOKUP_CHUNK_SIZE IDs).
+    """
+    found = set()
+    for chunk in _chunks(ids, LOOKUP_CHUNK_SIZE):
+        found.update(store.existing_ids(chunk))
+    return found
+
+
+# -------------------------------
+# COLLECTION VERSION (read by the Step 6 cache)
+# -------------------------------
+def read_collection_version(chroma_dir):
+    path = Path(chroma_dir) / VERSION_FILE
+    if not path.exists():
+        return 0
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f).get("version", 0)
+
+
+def bump_collection_version(chroma_dir):
+    """
+    Called after every write, so cached Step 6 results keyed on the
+    previous version are never served again.
+    """
     chroma_dir = Path(chroma_dir)
+    chroma_dir.mkdir(parents=True, exist_ok=True)
+    version = read_collection_version(chroma_dir) + 1
 
-    if not blocks_path.exists():
-        raise FileNotFoundError(f"Blocks file not found: {blocks_path}")
+    tmp_path = chroma_dir / (VERSION_FILE + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"version": version}, f)
+    os.replace(tmp_path, chroma_dir / VERSION_FILE)
+    return version
 
-    # Load blocks
-    with open(blocks_path, "r", encoding="utf-8") as f:
-        blocks = json.load(f)
 
-    if not blocks:
-        print("[STEP 5] No blocks to embed")
-        return
+# -------------------------------
+# DOCUMENT FINGERPRINTS (one file per backend)
+# -------------------------------
+def _fingerprints_path(chroma_dir, backend):
+    return Path(chroma_dir) / FINGERPRINTS_FILE.format(backend=backend)
 
-    # Load embedding model (GPU if available)
-    model = SentenceTransformer(EMBEDDING_MODEL, device="cuda")
 
-    # Connect to persistent Chroma DB
-    client = chromadb.Client(
-        settings=chromadb.Settings(
-            persist_directory=str(chroma_dir),
-            is_persistent=True,
-            anonymized_telemetry=False
-        )
-    )
+def read_fingerprints(chroma_dir, backend):
+    path = _fingerprints_path(chroma_dir, backend)
+    if not path.exists():
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_fingerprints(chroma_dir, backend, fingerprints):
+    path = _fingerprints_path(chroma_dir, backend)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(fingerprints, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
 
-    collection = client.get_or_create_collection(name="cv_blocks")
+def stored_hashes(store, doc_ids):
+    """
+    {block ID: content_hash} of everything stored for doc_ids
+    (None for blocks written before content hashes existed).
+    """
+    doc_ids = list(doc_ids)
+    hashes = {}
+    for chunk in _chunks(doc_ids, REBUILD_CHUNK_DOCS):
+        result = store.get(where={"doc_id": {"$in": chunk}}, include=("metadatas",))
+        for block_id, meta in zip(result["ids"], result["metadatas"]):
+            hashes[block_id] = meta.get("content_hash")
+    return hashes
+
+
+def delete_blocks(store, ids):
+    for chunk in _chunks(list(ids), LOOKUP_CHUNK_SIZE):
+        store.delete(ids=chunk)
+
+
+def load_blocks(blocks_paths):
+    """
+    Loads and concatenates one or many rag_blocks.json files.
+    """
+    if isinstance(blocks_paths, (str, Path)):
+        blocks_paths = [blocks_paths]
+
+    blocks = []
+    for path in map(Path, blocks_paths):
+        if not path.exists():
+            raise FileNotFoundError(f"Blocks file not found: {path}")
+        with open(path, "r", encoding="utf-8") as f:
+            blocks.extend(json.load(f))
+    return blocks
+
+
+# -------------------------------
+# BATCHED INGESTION
+# -------------------------------
+def plan_reconcile(store, unique, fingerprints):
+    """
+    unique: {block ID: block} holding every block of each CV.
+    Returns (missing, stale, changed_docs): block IDs to embed, stored
+    block IDs to delete first, doc_ids whose fingerprint changed.
+    """
+    per_doc = {}
+    for block_id, block in unique.items():
+        per_doc.setdefault(block["doc_id"], []).append(block_id)
 
-    added = 0
-    skipped = 0
+    changed_docs = {
+        doc_id: document_fingerprint([unique[i] for i in block_ids])
+        for doc_id, block_ids in per_doc.items()
+    }
+    changed_docs = {d: fp for d, fp in changed_docs.items() if fingerprints.get(d) != fp}
 
-    # -------------------------------
-    # Embed blocks incrementally
-    # -------------------------------
+    stored = stored_hashes(store, changed_docs)
+    missing, stale = [], []
+    for doc_id in changed_docs:
+        for block_id in per_doc[doc_id]:
+            if block_id not in stored:
+                missing.append(block_id)
+            elif stored[block_id] != content_hash(unique[block_id]):
+                missing.append(block_id)
+                stale.append(block_id)
+
+    wanted = set(unique)
+    stale.extend(block_id for block_id in stored if block_id not in wanted)
+    return missing, stale, changed_docs
+
+
+def ingest_blocks(blocks, chroma_dir, model=None, batch_size=ENCODE_BATCH_SIZE,
+                  chunk_size=ADD_CHUNK_SIZE, upsert=False, backend=None, reconcile=True,
+                  use_cache=True, store=None):
+    """
+    Embeds and stores blocks (from any number of CVs) in bulk.
+    reconcile=True: `blocks` holds every block of each CV it mentions;
+    stored blocks of those CVs that are gone are deleted and blocks whose
+    text or metadata changed are re-embedded. reconcile=False only adds
+    block IDs that are not stored yet.
+    upsert=True re-embeds and overwrites blocks that already exist.
+    use_cache=True reuses vectors of texts encoded before (embedding cache).
+    store: an already open vector store for chroma_dir (kept warm by callers).
+    Returns {"added": int, "skipped": int, "deleted": int, "cache_hits": int}.
+    """
+    chroma_dir = Path(chroma_dir)
+
+    # Deduplicate within the batch (first occurrence wins)
+    unique = {}
     for block in blocks:
-        block_id = f"{block['doc_id']}_p{block['page']}_b{block['block_id']}"
-
-        # Check if already embedded
-        existing = collection.get(ids=[block_id])
-        if existing["ids"]:
-            skipped += 1
-            continue
-
-        # Embed text
-        embedding = model.encode(
-            block["text"],
-            normalize_embeddings=True
-        )
+        unique.setdefault(block_key(block), block)
+
+    store = store or open_store(chroma_dir, backend=backend)
+    ids = list(unique)
+    fingerprints = read_fingerprints(chroma_dir, store.backend)
+    changed_docs = {}
+
+    if upsert:
+        missing, stale = ids, []
+    elif reconcile:
+        missing, stale, changed_docs = plan_reconcile(store, unique, fingerprints)
+    else:
+        present = existing_ids(store, ids)
+        missing, stale = [block_id for block_id in ids if block_id not in present], []
+
+    def encode(texts):
+        # Shared, memoized model (GPU if available, else CPU), only
+        # loaded when some text is not cached
+        encoder = model or get_embedding_model(EMBEDDING_MODEL)
+        return encoder.encode(texts, batch_size=batch_size, normalize_embeddings=True)
+
+    cache = embedding_cache() if use_cache else None
+    cache_hits = 0
 
-        # Store in Chroma
-        collection.add(
-            ids=[block_id],
-            documents=[block["text"]],
-            embeddings=[embedding.tolist()],
-            metadatas=[{
-                "doc_id": block["doc_id"],
-                "page": block["page"],
-                "block_id": block["block_id"]
-            }]
+    # One bulk delete: removed blocks + old versions of changed ones
+    if stale:
+        delete_blocks(store, stale)
+
+    write = store.upsert if upsert else store.add
+
+    for chunk in _chunks(missing, chunk_size):
+        chunk_blocks = [unique[block_id] for block_id in chunk]
+        texts = [b["text"] for b in chunk_blocks]
+        if cache is not None:
+            embeddings, hits = encode_cached(texts, encode, cache, EMBEDDING_MODEL, EMBEDDING_BACKEND)
+            cache_hits += hits
+            print(f"[STEP 5] Embedding cache: {hits}/{len(texts)} hits ({hits / len(texts):.0%})")
+        else:
+            embeddings = encode(texts)
+
+        write(
+            ids=chunk,
+            documents=[b["text"] for b in chunk_blocks],
+            embeddings=embeddings,
+            metadatas=[block_metadata(b) for b in chunk_blocks]
         )
 
-        added += 1
+    added = len(missing)
+    skipped = len(ids) - added
+    deleted = len(stale) - len(set(stale) & set(missing))
+
+    # Also backfills the candidate index of collections built before it existed
+    if added or stale or not CandidateIndex(chroma_dir).exists():
+        touched = {unique[block_id]["doc_id"] for block_id in missing} | set(changed_docs)
+        n_candidates = update_candidates(store, chroma_dir, touched)
+        print(f"[STEP 5] Candidate vectors updated: {n_candidates}")
+
+    if added or stale:
+        bump_collection_version(chroma_dir)
 
-    print(f"[STEP 5] Added {added} new blocks")
-    print(f"[STEP 5] Skipped {skipped} existing blocks")
-    print(f"[STEP 5] Chroma DB directory: {chroma_dir.resolve()}")
+    # Fingerprints last: a crash above re-reconciles these CVs next run
+    if changed_docs:
+        fingerprints.update(changed_docs)
+        write_fingerprints(chroma_dir, store.backend, fingerprints)
+
+    print(f"[STEP 5] Added {added} new or changed blocks")
+    print(f"[STEP 5] Deleted {deleted} stale blocks")
+    print(f"[STEP 5] Skipped {skipped} unchanged blocks")
+    if added and cache is not None:
+        print(f"[STEP 5] Embedding cache total: {cache_hits}/{added} hits ({cache_hits / added:.0%})")
+    print(f"[STEP 5] Vector store ({store.backend}): {chroma_dir.resolve()}")
+
+    return {"added": added, "skipped": skipped, "deleted": deleted, "cache_hits": cache_hits}
+
+
+def delete_document(chroma_dir, doc_id, backend=None, store=None, lexical_index=None):
+    """
+    Removes one CV everywhere Step 6 looks: vector store, candidate
+    index, lexical index (if present) and fingerprints.
+    store / lexical_index: already open instances to reuse (Pipeline).
+    Returns the number of blocks deleted from the vector store.
+    """
+    chroma_dir = Path(chroma_dir)
+    store = store or open_store(chroma_dir, backend=backend)
+
+    block_ids = list(stored_hashes(store, [doc_id]))
+    delete_blocks(store, block_ids)
+
+    candidates = CandidateIndex(chroma_dir)
+    if candidates.exists():
+        candidates.update({}, removed=[doc_id])
+
+    lexical_path = chroma_dir / LEXICAL_INDEX_FILE
+    if lexical_index is not None:
+        lexical_index.delete_document(doc_id)
+    elif lexical_path.exists():
+        index = LexicalIndex(lexical_path)
+        try:
+            index.delete_document(doc_id)
+        finally:
+            index.close()
+
+    fingerprints = read_fingerprints(chroma_dir, store.backend)
+    if fingerprints.pop(doc_id, None) is not None:
+        write_fingerprints(chroma_dir, store.backend, fingerprints)
+
+    bump_collection_version(chroma_dir)
+    print(f"[STEP 5] Deleted {doc_id}: {len(block_ids)} blocks")
+    return len(block_ids)
+
+
+# -------------------------------
+# MAIN
+# -------------------------------
+def main(blocks_path, chroma_dir, backend=None, doc_ids=None):
+    """
+    blocks_path: one rag_blocks.json, or a list of them (one bulk ingest).
+    backend    : "chroma" | "flat" (default: VECTOR_BACKEND)
+    doc_ids    : the CVs these files hold; one left without blocks (a
+                 re-upload with no text) is deleted, not kept stale.
+    """
+    blocks = load_blocks(blocks_path)
+
+    present = {b["doc_id"] for b in blocks}
+    for doc_id in doc_ids or []:
+        if doc_id not in present:
+            delete_document(chroma_dir, doc_id, backend=backend)
+
+    if not blocks:
+        print("[STEP 5] No blocks to embed")
+        return
+
+    return ingest_blocks(blocks, chroma_dir, backend=backend)
 
 
 # -------------------------------
@@ -96,8 +386,13 @@ def main(blocks_path, chroma_dir):
 if __name__ == "__main__":
     import sys
 
-    if len(sys.argv) != 3:
-        print("Usage: python step5_embeddings.py <blocks.json> <chroma_dir>")
+    if len(sys.argv) == 4 and sys.argv[1] == "--delete":
+        delete_document(sys.argv[3], sys.argv[2])
+        sys.exit(0)
+
+    if len(sys.argv) < 3:
+        print("Usage: python step5_embeddings.py <blocks.json> [<blocks.json> ...] <chroma_dir>")
+        print("       python step5_embeddings.py --delete <doc_id> <chroma_dir>")
         sys.exit(1)
 
-    main(sys.argv[1], sys.argv[2])
+    main(sys.argv[1:-1], sys.argv[-1])
@@ -0,0 +1,247 @@
+# =====================================================
+# STEP 5/6 — VECTOR STORE BACKENDS
+# =====================================================
+# Purpose:
+# - One small interface for Steps 5 and 6, two backends:
+#   - "chroma": persistent Chroma collection (default)
+#   - "flat"  : memory-mapped float16/int8 matrix (flat_index.py)
+# - Both live under the same chroma_dir, so every
+#   main(chroma_dir, ...) contract stays unchanged
+# - query()/get() return Chroma-shaped dicts
+# =====================================================
+
+import os
+import threading
+from pathlib import Path
+
+import numpy as np
+
+from step5_embeddings.flat_index import FLAT_DTYPE, FlatIndex
+
+
+VECTOR_BACKEND = os.environ.get("VECTOR_BACKEND", "chroma")   # "chroma" | "flat"
+COLLECTION_NAME = "cv_blocks"
+FLAT_INDEX_DIR = "flat_index"
+
+
+# -------------------------------
+# Chroma
+# -------------------------------
+class ChromaStore:
+    backend = "chroma"
+
+    def __init__(self, chroma_dir, name=COLLECTION_NAME, create=True):
+        import chromadb
+
+        client = chromadb.Client(
+            settings=chromadb.Settings(
+                persist_directory=str(chroma_dir),
+                is_persistent=True,
+                anonymized_telemetry=False
+            )
+        )
+        if create:
+            self.collection = client.get_or_create_collection(name=name)
+        else:
+            self.collection = client.get_collection(name=name)
+
+    def count(self):
+        return self.collection.count()
+
+    def refresh(self):
+        pass
+
+    def existing_ids(self, ids):
+        return set(self.collection.get(ids=list(ids), include=[])["ids"])
+
+    def add(self, ids, embeddings, documents, metadatas):
+        self.collection.add(ids=ids, embeddings=_as_lists(embeddings),
+                            documents=documents, metadatas=metadatas)
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        self.collection.upsert(ids=ids, embeddings=_as_lists(embeddings),
+                               documents=documents, metadatas=metadatas)
+
+    def delete(self, ids=None, where=None):
+        self.collection.delete(ids=ids, where=where)
+
+    def get(self, ids=None, where=None, include=("documents", "metadatas"), limit=None, offset=None):
+        return self.collection.get(ids=ids, where=where, include=list(include),
+                                   limit=limit, offset=offset)
+
+    def query(self, query_embeddings, n_results, where=None):
+        return self.collection.query(
+            query_embeddings=_as_lists(query_embeddings),
+            n_results=n_results,
+            where=where,
+            include=["documents", "metadatas", "distances"]
+        )
+
+
+def _as_lists(embeddings):
+    return [list(map(float, e)) for e in embeddings]
+
+
+# -------------------------------
+# Flat (memory-mapped)
+# -------------------------------
+class FlatStore:
+    backend = "flat"
+
+    def __init__(self, chroma_dir, dtype=FLAT_DTYPE, create=True):
+        # create=False (Step 6): read-only, never touches the files
+        self.index = FlatIndex(Path(chroma_dir) / FLAT_INDEX_DIR, dtype=dtype, writer=create)
+        self._lock = threading.Lock()
+
+    def count(self):
+        return self.index.count
+
+    def refresh(self):
+        self.index.refresh()
+
+    def _rows_by_id(self):
+        return {block_id: row for row, block_id in enumerate(self.index.ids())}
+
+    def existing_ids(self, ids):
+        rows = self._rows_by_id()
+        return {i for i in ids if i in rows}
+
+    def add(self, ids, embeddings, documents, metadatas):
+        with self._lock:
+            self.index.append(ids, embeddings, documents, metadatas)
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        with self._lock:
+            replaced = set(ids)
+            keep = [row for row, i in enumerate(self.index.ids()) if i not in replaced]
+            if len(keep) == self.index.count:
+                self.index.append(ids, embeddings, documents, metadatas)
+            else:
+                self.index.rewrite(keep, (ids, embeddings, documents, metadatas))
+
+    def delete(self, ids=None, where=None):
+        with self._lock:
+            drop = set(ids or [])
+            if where is not None:
+                drop.update(self.get(where=where, include=())["ids"])
+            keep = [row for row, i in enumerate(self.index.ids()) if i not in drop]
+            if len(keep) != self.index.count:
+                self.index.rewrite(keep)
+
+    # -------------------------------
+    # Filters
+    # -------------------------------
+    def _mask(self, where):
+        if where is None or self.index.count == 0:
+            return None
+        doc_ids = _doc_id_filter(where)
+        if doc_ids is not None:
+            return self.index.doc_mask(doc_ids)
+        metas = self.index.metadatas(range(self.index.count))
+        return np.array([matches_where(m, where) for m in metas], dtype=bool)
+
+    # -------------------------------
+    # Reads
+    # -------------------------------
+    def get(self, ids=None, where=None, include=("documents", "metadatas"), limit=None, offset=None):
+        offset = offset or 0
+        end = None if limit is None else offset + limit
+
+        if ids is None and where is None:
+            # Plain paging: no full row list
+            rows = list(range(min(offset, self.index.count), min(end or self.index.count, self.index.count)))
+            return self._rows_result(rows, include)
+
+        if ids is not None:
+            by_id = self._rows_by_id()
+            rows = [by_id[i] for i in ids if i in by_id]
+        else:
+            rows = list(range(self.index.count))
+        mask = self._mask(where)
+        if mask is not None:
+            rows = [r for r in rows if mask[r]]
+        return self._rows_result(rows[offset:end], include)
+
+    def _rows_result(self, rows, include):
+        result = {"ids": self.index.ids_at(rows)}
+        if "documents" in include:
+            result["documents"] = self.index.texts(rows)
+        if "metadatas" in include:
+            result["metadatas"] = self.index.metadatas(rows)
+        if "embeddings" in include:
+            result["embeddings"] = self.index.row_embeddings(rows) if rows else []
+        return result
+
+    def query(self, query_embeddings, n_results, where=None):
+        rows, scores = self.index.search(query_embeddings, n_results, mask=self._mask(where))
+
+        out = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        for q_rows, q_scores in zip(rows, scores):
+            valid = np.isfinite(q_scores)
+            q_rows, q_scores = q_rows[valid].tolist(), q_scores[valid]
+            r = self._rows_result(q_rows, ("documents", "metadatas"))
+            out["ids"].append(r["ids"])
+            out["documents"].append(r["documents"])
+            out["metadatas"].append(r["metadatas"])
+            # Squared L2 on unit vectors, same scale as Chroma's default space
+            out["distances"].append((2.0 - 2.0 * q_scores).tolist())
+        return out
+
+
+# -------------------------------
+# Chroma-style where filters (flat backend)
+# -------------------------------
+_OPS = {
+    "$eq": lambda a, b: a == b,
+    "$ne": lambda a, b: a != b,
+    "$gt": lambda a, b: a is not None and a > b,
+    "$gte": lambda a, b: a is not None and a >= b,
+    "$lt": lambda a, b: a is not None and a < b,
+    "$lte": lambda a, b: a is not None and a <= b,
+    "$in": lambda a, b: a in b,
+    "$nin": lambda a, b: a not in b,
+}
+
+
+def matches_where(meta, where):
+    for key, cond in where.items():
+        if key == "$and":
+            if not all(matches_where(meta, c) for c in cond):
+                return False
+        elif key == "$or":
+            if not any(matches_where(meta, c) for c in cond):
+                return False
+        elif isinstance(cond, dict):
+            if not all(_OPS[op](meta.get(key), value) for op, value in cond.items()):
+                return False
+        elif meta.get(key) != cond:
+            return False
+    return True
+
+
+def _doc_id_filter(where):
+    """
+    Fast path: a filter on doc_id only → list of doc_ids, else None.
+    """
+    if set(where) != {"doc_id"}:
+        return None
+    cond = where["doc_id"]
+    if not isinstance(cond, dict):
+        return [cond]
+    if set(cond) == {"$eq"}:
+        return [cond["$eq"]]
+    if set(cond) == {"$in"}:
+        return list(cond["$in"])
+    return None
+
+
+# -------------------------------
+# Factory
+# -------------------------------
+def open_store(chroma_dir, backend=None, create=True):
+    backend = backend or VECTOR_BACKEND
+    if backend == "chroma":
+        return ChromaStore(chroma_dir, create=create)
+    if backend == "flat":
+        return FlatStore(chroma_dir, create=create)
+    raise ValueError(f"Unknown vector backend: {backend}")
@@ -0,0 +1,263 @@
+# =====================================================
+# STEP 6 — BATCH SCORING (QUERIES x CANDIDATES MATRIX)
+# =====================================================
+# Purpose:
+# - Match hundreds of job descriptions against the whole CV pool
+# - Encode every query in one batch (model loaded once)
+# - Stream block embeddings from the vector store in chunks
+#   (bounded memory) and pool block similarities per doc_id
+#   (max or mean) with vectorized segment reductions
+# - Save a compact matrix + the best-matching block per cell,
+#   no per-query printing
+# =====================================================
+# Outputs:
+# - <out>.npy         n_queries x n_candidates float32 scores
+#   <out>_blocks.npy  same shape, (page, block_id) of the best block
+#   <out>.json        query ids, doc_ids (column order), pooling
+# - <out>.parquet     long table: query_id, doc_id, score, block_key
+#                     (needs pyarrow)
+# =====================================================
+
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+
+from step5_embeddings.embedding_provider import encode_texts, get_embedding_model
+from step6_retrieval.step6_retrieval import EMBEDDING_MODEL_NAME, get_store
+
+
+BLOCK_CHUNK_ROWS = 8192     # Tunable: block embeddings scored per step
+QUERY_BATCH_SIZE = 64       # Tunable: texts per encoder forward pass
+POOLINGS = ("max", "mean")
+
+BEST_BLOCK_DTYPE = np.dtype([("page", "<i2"), ("block_id", "<i4")])
+
+
+# -------------------------------
+# Inputs
+# -------------------------------
+def load_queries(path):
+    """
+    .txt: one query per line.
+    .json / .jsonl: strings or {"id": ..., "text": ...} objects.
+    Returns (query_ids, texts).
+    """
+    path = Path(path)
+    if not path.exists():
+        raise FileNotFoundError(f"Queries file not found: {path}")
+
+    with open(path, "r", encoding="utf-8") as f:
+        if path.suffix == ".json":
+            items = json.load(f)
+        elif path.suffix == ".jsonl":
+            items = [json.loads(line) for line in f if line.strip()]
+        else:
+            items = [line.strip() for line in f if line.strip()]
+
+    ids, texts = [], []
+    for n, item in enumerate(items):
+        if isinstance(item, dict):
+            ids.append(str(item.get("id", n)))
+            texts.append(item["text"])
+        else:
+            ids.append(str(n))
+            texts.append(item)
+    return ids, texts
+
+
+def iter_block_chunks(store, chunk_rows=BLOCK_CHUNK_ROWS):
+    """
+    Yields (embeddings float32 (n, dim), metadatas) pages of the store.
+    """
+    offset = 0
+    while True:
+        result = store.get(include=("embeddings", "metadatas"), limit=chunk_rows, offset=offset)
+        if not result["ids"]:
+            return
+        yield np.asarray(result["embeddings"], dtype=np.float32), result["metadatas"]
+        offset += len(result["ids"])
+
+
+# -------------------------------
+# Accumulator (one column per doc_id, grown on demand)
+# -------------------------------
+class _ScoreColumns:
+    def __init__(self, n_queries, pooling):
+        self.n_queries = n_queries
+        self.pooling = pooling
+        self.doc_ids = []
+        self._columns = {}
+
+        self.best = np.full((n_queries, 0), -np.inf, dtype=np.float32)
+        self.best_block = np.zeros((n_queries, 0), dtype=BEST_BLOCK_DTYPE)
+        self.sums = np.zeros((n_queries, 0), dtype=np.float32)
+        self.counts = np.zeros(0, dtype=np.int64)
+
+    def _grow(self, needed):
+        capacity = self.best.shape[1]
+        if needed <= capacity:
+            return
+        extra = max(needed, 2 * capacity, 64) - capacity
+        self.best = np.concatenate([self.best, np.full((self.n_queries, extra), -np.inf, np.float32)], axis=1)
+        self.best_block = np.concatenate([self.best_block, np.zeros((self.n_queries, extra), BEST_BLOCK_DTYPE)], axis=1)
+        self.sums = np.concatenate([self.sums, np.zeros((self.n_queries, extra), np.float32)], axis=1)
+        self.counts = np.concatenate([self.counts, np.zeros(extra, np.int64)])
+
+    def columns(self, doc_ids):
+        for doc_id in doc_ids:
+            if doc_id not in self._columns:
+                self._columns[doc_id] = len(self.doc_ids)
+                self.doc_ids.append(doc_id)
+        self._grow(len(self.doc_ids))
+        return np.array([self._columns[d] for d in doc_ids], dtype=np.int64)
+
+    def add_chunk(self, query_embeddings, embeddings, metadatas):
+        # Sort rows by column so every doc_id is one contiguous segment
+        cols = self.columns([m["doc_id"] for m in metadatas])
+        order = np.argsort(cols, kind="stable")
+        cols = cols[order]
+        starts = np.flatnonzero(np.r_[True, cols[1:] != cols[:-1]])
+        lengths = np.diff(np.r_[starts, len(cols)])
+        seg_cols = cols[starts]
+
+        scores = query_embeddings @ embeddings[order].T                 # (Q, rows)
+        seg_max = np.maximum.reduceat(scores, starts, axis=1)           # (Q, segments)
+
+        # First row reaching the segment max = best block of that doc
+        is_max = scores == np.repeat(seg_max, lengths, axis=1)
+        positions = np.where(is_max, np.arange(len(cols)), len(cols))
+        first = np.minimum.reduceat(positions, starts, axis=1)
+
+        blocks = np.array(
+            [(metadatas[i]["page"], metadatas[i]["block_id"]) for i in order],
+            dtype=BEST_BLOCK_DTYPE
+        )
+
+        better = seg_max > self.best[:, seg_cols]
+        self.best[:, seg_cols] = np.where(better, seg_max, self.best[:, seg_cols])
+        self.best_block[:, seg_cols] = np.where(better, blocks[first], self.best_block[:, seg_cols])
+
+        if self.pooling == "mean":
+            self.sums[:, seg_cols] += np.add.reduceat(scores, starts, axis=1)
+            self.counts[seg_cols] += lengths
+
+    def result(self):
+        n = len(self.doc_ids)
+        order = np.argsort(np.array(self.doc_ids, dtype=object)) if n else np.zeros(0, np.int64)
+
+        if self.pooling == "mean":
+            scores = self.sums[:, :n] / np.maximum(self.counts[:n], 1)
+        else:
+            scores = self.best[:, :n]
+
+        return (
+            [self.doc_ids[i] for i in order],
+            np.ascontiguousarray(scores[:, order], dtype=np.float32),
+            np.ascontiguousarray(self.best_block[:, order])
+        )
+
+
+# -------------------------------
+# Scoring
+# -------------------------------
+def score_matrix(store, query_embeddings, pooling="max", chunk_rows=BLOCK_CHUNK_ROWS):
+    """
+    Dense queries x candidates similarity matrix.
+    Returns (doc_ids, scores (Q, D) float32, best blocks (Q, D)).
+    """
+    if pooling not in POOLINGS:
+        raise ValueError(f"Unknown pooling: {pooling} (expected one of {POOLINGS})")
+
+    query_embeddings = np.asarray(query_embeddings, dtype=np.float32)
+    columns = _ScoreColumns(len(query_embeddings), pooling)
+
+    for embeddings, metadatas in iter_block_chunks(store, chunk_rows):
+        columns.add_chunk(query_embeddings, embeddings, metadatas)
+
+    return columns.result()
+
+
+# -------------------------------
+# Outputs
+# -------------------------------
+def save_npy(output_path, query_ids, doc_ids, scores, best_blocks, pooling):
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+
+    np.save(output_path, scores)
+    np.save(output_path.with_name(output_path.stem + "_blocks.npy"), best_blocks)
+    with open(output_path.with_suffix(".json"), "w", encoding="utf-8") as f:
+        json.dump({"queries": query_ids, "doc_ids": doc_ids, "pooling": pooling}, f, ensure_ascii=False)
+
+
+def save_parquet(output_path, query_ids, doc_ids, scores, best_blocks):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError("Parquet output needs pyarrow (pip install pyarrow), or use a .npy output") from e
+
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+
+    n_queries, n_docs = scores.shape
+    docs = np.array(doc_ids, dtype=object)
+    block_keys = [
+        f"{doc_id}_p{page}_b{block_id}"
+        for doc_id, page, block_id in zip(
+            np.tile(docs, n_queries), best_blocks["page"].ravel(), best_blocks["block_id"].ravel()
+        )
+    ]
+
+    table = pa.table({
+        "query_id": pa.array(np.repeat(np.array(query_ids, dtype=object), n_docs)).dictionary_encode(),
+        "doc_id": pa.array(np.tile(docs, n_queries)).dictionary_encode(),
+        "score": pa.array(scores.ravel()),
+        "block_key": pa.array(block_keys),
+    })
+    pq.write_table(table, output_path, compression="zstd")
+
+
+# -------------------------------
+# MAIN
+# -------------------------------
+def main(chroma_dir, queries_path, output_path, pooling="max", backend=None):
+    t0 = time.perf_counter()
+    query_ids, texts = load_queries(queries_path)
+    if not texts:
+        print("[STEP 6] No queries to score")
+        return None
+
+    # One model load, one batched encode
+    model = get_embedding_model(EMBEDDING_MODEL_NAME)
+    query_embeddings = encode_texts(texts, model=model, batch_size=QUERY_BATCH_SIZE)
+
+    store = get_store(chroma_dir, backend=backend)
+    doc_ids, scores, best_blocks = score_matrix(store, query_embeddings, pooling=pooling)
+
+    if Path(output_path).suffix == ".parquet":
+        save_parquet(output_path, query_ids, doc_ids, scores, best_blocks)
+    else:
+        save_npy(output_path, query_ids, doc_ids, scores, best_blocks, pooling)
+
+    print(
+        f"[STEP 6] Scored {len(query_ids)} queries x {len(doc_ids)} candidates "
+        f"({pooling}) in {time.perf_counter() - t0:.1f}s → {output_path}"
+    )
+    return query_ids, doc_ids, scores
+
+
+# -------------------------------
+# CLI
+# -------------------------------
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) < 4:
+        print("Usage: python -m step6_retrieval.step6_batch_scoring <chroma_dir> <queries.txt|.json|.jsonl> "
+              "<out.npy|out.parquet> [max|mean]")
+        sys.exit(1)
+
+    main(sys.argv[1], sys.argv[2], sys.argv[3], sys.argv[4] if len(sys.argv) > 4 else "max")
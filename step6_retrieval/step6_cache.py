@@ -0,0 +1,179 @@
+# =====================================================
+# STEP 6 — QUERY EMBEDDING + RESULT CACHE
+# =====================================================
+# Purpose:
+# - Skip re-encoding repeated recruiter questions
+# - Skip re-running the vector search for repeated questions
+# - Never serve stale results: result keys include the collection
+#   version, which Step 5 bumps whenever it adds blocks
+# =====================================================
+# Keys:
+# - query embeddings: (model, backend, normalized query)
+# - grouped results : (chroma_dir, backend, mode, normalized query, top_k,
+#                      collection version, lexical index version)
+# Layers:
+# - in-memory LRU (size-bounded)
+# - optional SQLite layer (STEP6_CACHE_DIR), shared across processes
+# =====================================================
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+
+QUERY_CACHE_SIZE = 1024     # Tunable: query embeddings kept in memory
+RESULT_CACHE_SIZE = 1024    # Tunable: grouped results kept in memory
+DISK_CACHE_ENTRIES = 50000  # Tunable: rows kept per on-disk table
+CACHE_DIR = os.environ.get("STEP6_CACHE_DIR")   # None → memory only
+
+
+def normalize_query(query):
+    """
+    Case + whitespace folding. all-MiniLM-L6-v2 is uncased, so this
+    does not change the embedding.
+    """
+    return " ".join(query.lower().split())
+
+
+# -------------------------------
+# On-disk layer (SQLite)
+# -------------------------------
+class DiskCache:
+    def __init__(self, path, table, max_entries=DISK_CACHE_ENTRIES):
+        self.path = Path(path)
+        self.table = table
+        self.max_entries = max_entries
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} "
+                f"(key TEXT PRIMARY KEY, value TEXT NOT NULL, accessed REAL NOT NULL)"
+            )
+        self._writes = 0
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT value FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            with self._conn:
+                self._conn.execute(
+                    f"UPDATE {self.table} SET accessed = ? WHERE key = ?", (time.time(), key)
+                )
+        return json.loads(row[0])
+
+    def put(self, key, value):
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, accessed) VALUES (?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), time.time())
+            )
+            self._writes += 1
+            if self._writes % 100 == 0:
+                self._evict()
+
+    def _evict(self):
+        # Keep the most recently accessed max_entries rows
+        self._conn.execute(
+            f"DELETE FROM {self.table} WHERE key NOT IN "
+            f"(SELECT key FROM {self.table} ORDER BY accessed DESC LIMIT ?)",
+            (self.max_entries,)
+        )
+
+
+# -------------------------------
+# In-memory LRU (+ optional disk layer)
+# -------------------------------
+class LRUCache:
+    def __init__(self, maxsize, disk=None):
+        self.maxsize = maxsize
+        self.disk = disk
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        key = json.dumps(key, ensure_ascii=False)
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+
+        value = self.disk.get(key) if self.disk else None
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._store(key, value)
+        return value
+
+    def put(self, key, value):
+        key = json.dumps(key, ensure_ascii=False)
+        with self._lock:
+            self._store(key, value)
+        if self.disk:
+            self.disk.put(key, value)
+
+    def _store(self, key, value):
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0
+        }
+
+
+# -------------------------------
+# Process-wide caches
+# -------------------------------
+_CACHES = {}
+_CACHES_LOCK = threading.Lock()
+
+
+def configure_cache(cache_dir=CACHE_DIR, query_size=QUERY_CACHE_SIZE, result_size=RESULT_CACHE_SIZE):
+    """
+    (Re)creates the process-wide caches. cache_dir enables the disk layer.
+    """
+    db_path = Path(cache_dir) / "step6_cache.sqlite" if cache_dir else None
+    with _CACHES_LOCK:
+        _CACHES["query"] = LRUCache(
+            query_size, DiskCache(db_path, "query_embeddings") if db_path else None
+        )
+        _CACHES["result"] = LRUCache(
+            result_size, DiskCache(db_path, "results") if db_path else None
+        )
+
+
+def query_cache():
+    if "query" not in _CACHES:
+        configure_cache()
+    return _CACHES["query"]
+
+
+def result_cache():
+    if "result" not in _CACHES:
+        configure_cache()
+    return _CACHES["result"]
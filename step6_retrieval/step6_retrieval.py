@@ -6,64 +6,282 @@
 # - Group them by candidate (doc_id)
 # - Provide candidate-level context for LLM reasoning
 # =====================================================
+# Backend: Chroma (default) or the memory-mapped flat index
+# (VECTOR_BACKEND="flat"), same main(chroma_dir, query, top_k).
+# Modes:
+# - "vector" : embedding search (default)
+# - "lexical": BM25 over the Step 4 lexical index, never loads
+#              the embedding model (keyword / skill queries)
+# - "hybrid" : BM25 candidate prefilter + vector search, fused
+#              with reciprocal-rank fusion
+# Candidate-level retrieval (retrieve_candidates):
+# - rank CVs on their Step 5 summary vectors (small matrix)
+# - score blocks of the top CVs only → top_candidates x
+#   blocks_per_candidate, independent of the corpus size
+# Metadata filters (where): Chroma-style filters on the Step 4
+# CV fields (degree_level, birth_year / age, years_experience, lang_*),
+# applied inside the search in every mode; metadata_where() builds
+# the common ones.
+# =====================================================
+
+import datetime
+import json
+import threading
 
-import chromadb
-from sentence_transformers import SentenceTransformer
 from collections import defaultdict
+from pathlib import Path
 
-EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+import numpy as np
 
+from step4_rag.step4_lexical_index import LEXICAL_INDEX_FILE, LexicalIndex
+from step5_embeddings.candidate_index import CandidateIndex
+from step5_embeddings.embedding_provider import EMBEDDING_BACKEND, EMBEDDING_MODEL, get_embedding_model
+from step5_embeddings.step5_embeddings import read_collection_version
+from step5_embeddings.vector_store import VECTOR_BACKEND, open_store
+from step6_retrieval.step6_cache import normalize_query, query_cache, result_cache
 
-def main(chroma_dir, query, top_k=10):
-    # -------------------------------
-    # Load embedding model (GPU)
-    # -------------------------------
-    model = SentenceTransformer(EMBEDDING_MODEL_NAME, device="cuda")
+EMBEDDING_MODEL_NAME = EMBEDDING_MODEL
 
-    # -------------------------------
-    # Connect to Chroma
-    # -------------------------------
-    client = chromadb.Client(
-        settings=chromadb.Settings(
-            persist_directory=str(chroma_dir),
-            is_persistent=True,
-            anonymized_telemetry=False
+RETRIEVAL_MODES = ("vector", "lexical", "hybrid")
+LEXICAL_PREFILTER = 200    # Tunable: BM25 blocks whose CVs are searched in hybrid mode
+RRF_K = 60                 # Tunable: reciprocal-rank fusion constant
+
+_STORES = {}
+_INDEXES = {}
+_CANDIDATES = {}
+_LOCK = threading.Lock()
+
+
+# -------------------------------
+# Vector store connection (one per directory + backend per process)
+# -------------------------------
+def get_store(chroma_dir, backend=None):
+    backend = backend or VECTOR_BACKEND
+    key = (str(chroma_dir), backend)
+    with _LOCK:
+        if key not in _STORES:
+            _STORES[key] = open_store(chroma_dir, backend=backend, create=False)
+        store = _STORES[key]
+
+    # Pick up rows committed by Step 5 since opening (flat backend)
+    store.refresh()
+    return store
+
+
+def get_candidate_index(chroma_dir):
+    with _LOCK:
+        if str(chroma_dir) not in _CANDIDATES:
+            _CANDIDATES[str(chroma_dir)] = CandidateIndex(chroma_dir)
+        index = _CANDIDATES[str(chroma_dir)]
+
+    index.refresh()
+    return index
+
+
+def get_lexical_index(chroma_dir):
+    """
+    The Step 4 lexical index, stored next to the vector store.
+    """
+    path = Path(chroma_dir) / LEXICAL_INDEX_FILE
+    if not path.exists():
+        raise FileNotFoundError(f"Lexical index not found: {path}")
+
+    with _LOCK:
+        if str(path) not in _INDEXES:
+            _INDEXES[str(path)] = LexicalIndex(path)
+        return _INDEXES[str(path)]
+
+
+# -------------------------------
+# Search + aggregation
+# -------------------------------
+def group_results(documents, metadatas, scores=None):
+    """
+    Flat Chroma hits → {doc_id: [blocks]} (rank order kept).
+    scores: optional retrieval score per hit (higher is better), kept
+    as block["score"] for Step 7 context packing.
+    """
+    grouped = defaultdict(list)
+
+    for n, (doc, meta) in enumerate(zip(documents, metadatas)):
+        block = {
+            "page": meta["page"],
+            "block_id": meta["block_id"],
+            "text": doc
+        }
+        if scores is not None:
+            block["score"] = float(scores[n])
+        grouped[meta["doc_id"]].append(block)
+
+    return grouped
+
+
+# -------------------------------
+# Metadata filters
+# -------------------------------
+def metadata_where(min_degree=None, max_age=None, languages=(), min_experience=None, reference_year=None):
+    """
+    Where filter on the Step 4 metadata, None when nothing is asked.
+    min_degree: bac+N level (3 = bachelor, 5 = master, 8 = PhD).
+    CVs missing a requested field do not match.
+    """
+    clauses = []
+    if min_degree is not None:
+        clauses.append({"degree_level": {"$gte": min_degree}})
+    if max_age is not None:
+        year = reference_year or datetime.date.today().year
+        # Birth date, else the age stated on the CV
+        clauses.append({"$or": [{"birth_year": {"$gte": year - max_age}}, {"age": {"$lte": max_age}}]})
+    for code in languages:
+        clauses.append({f"lang_{code}": True})
+    if min_experience is not None:
+        clauses.append({"years_experience": {"$gte": min_experience}})
+    return combine_where(*clauses)
+
+
+def combine_where(*filters):
+    filters = [f for f in filters if f]
+    if not filters:
+        return None
+    return filters[0] if len(filters) == 1 else {"$and": filters}
+
+
+def where_key(where):
+    return json.dumps(where, sort_keys=True) if where else None
+
+
+def filtered_doc_ids(chroma_dir, where):
+    """
+    doc_ids matching `where`, from the candidate index metadata
+    (lexical mode has no vector store to filter in).
+    """
+    candidates = get_candidate_index(chroma_dir)
+    if not candidates.exists():
+        raise FileNotFoundError(
+            f"No candidate index in {chroma_dir} (re-run Step 5 to build it)"
         )
+    return candidates.filter(where)
+
+
+# -------------------------------
+# Search modes
+# -------------------------------
+def similarities(distances):
+    # Squared L2 on unit vectors → cosine similarity
+    return [1.0 - d / 2.0 for d in distances]
+
+
+def search(store, query_embeddings, top_k, where=None):
+    """
+    One vector search for many queries.
+    top_k: an int, or one int per query (searches max(top_k) once
+    and truncates each query's ranked hits).
+    Returns one grouped dict per query.
+    """
+    if isinstance(top_k, int):
+        top_k = [top_k] * len(query_embeddings)
+
+    results = store.query(query_embeddings, n_results=max(top_k), where=where)
+
+    return [
+        group_results(docs[:k], metas[:k], similarities(dists[:k]))
+        for docs, metas, dists, k in zip(
+            results["documents"], results["metadatas"], results["distances"], top_k
+        )
+    ]
+
+
+def lexical_search(index, query, top_k, doc_ids=None):
+    """
+    BM25 only: no embedding model, no vector store.
+    """
+    hits = index.search(query, top_k, doc_ids=doc_ids)
+    return group_results(
+        [block["text"] for _, _, block in hits],
+        [block for _, _, block in hits],
+        [score for _, score, _ in hits]
     )
 
-    collection = client.get_collection(name="cv_blocks")
 
-    # -------------------------------
-    # Encode query
-    # -------------------------------
-    query_embedding = model.encode(
-        [query],
-        normalize_embeddings=True
+def fuse_rankings(rankings, top_k, k=RRF_K):
+    """
+    Reciprocal-rank fusion of ranked [(block_id, text, meta)] lists.
+    Returns [(text, meta, fused score)] best first.
+    """
+    scores = {}
+    hits = {}
+    for ranking in rankings:
+        for rank, (block_id, text, meta) in enumerate(ranking):
+            scores[block_id] = scores.get(block_id, 0.0) + 1.0 / (k + rank + 1)
+            hits.setdefault(block_id, (text, meta))
+
+    best = sorted(scores, key=scores.get, reverse=True)[:top_k]
+    return [(*hits[block_id], scores[block_id]) for block_id in best]
+
+
+def hybrid_search(store, index, query, query_embedding, top_k, prefilter=LEXICAL_PREFILTER,
+                  where=None, allowed_doc_ids=None):
+    """
+    BM25 picks the candidate CVs, the vector search runs inside
+    them only, both block rankings are fused (RRF).
+    Falls back to a plain vector search when no query token is indexed.
+    where / allowed_doc_ids: metadata filter and the CVs it matches.
+    """
+    lexical_hits = index.search(query, prefilter, doc_ids=allowed_doc_ids)
+    doc_ids = sorted({block["doc_id"] for _, _, block in lexical_hits})
+    where = combine_where({"doc_id": {"$in": doc_ids}} if doc_ids else None, where)
+
+    results = store.query([query_embedding], n_results=top_k, where=where)
+    vector_ranking = list(zip(results["ids"][0], results["documents"][0], results["metadatas"][0]))
+    lexical_ranking = [(key, block["text"], block) for key, _, block in lexical_hits]
+
+    fused = fuse_rankings([vector_ranking, lexical_ranking], top_k)
+    return group_results(
+        [text for text, _, _ in fused],
+        [meta for _, meta, _ in fused],
+        [score for _, _, score in fused]
     )
 
-    # -------------------------------
-    # Vector search
-    # -------------------------------
-    results = collection.query(
-        query_embeddings=query_embedding.tolist(),
-        n_results=top_k
+
+def candidate_search(store, candidates, query_embedding, top_candidates, blocks_per_candidate, where=None):
+    """
+    Coarse: rank CVs on their summary vectors (matching `where`).
+    Fine  : fetch the blocks of the top CVs only and score them locally.
+    Returns {doc_id: [blocks]} in candidate rank order.
+    """
+    ranked = candidates.rank(query_embedding, top_candidates, where=where)
+    if not ranked:
+        return defaultdict(list)
+
+    doc_ids = [doc_id for doc_id, _ in ranked]
+    result = store.get(
+        where={"doc_id": {"$in": doc_ids}},
+        include=("documents", "metadatas", "embeddings")
     )
+    if not result["ids"]:
+        return defaultdict(list)
+
+    scores = np.asarray(result["embeddings"], dtype=np.float32) @ np.asarray(query_embedding, dtype=np.float32)
+
+    rows_by_doc = defaultdict(list)
+    for row, meta in enumerate(result["metadatas"]):
+        rows_by_doc[meta["doc_id"]].append(row)
 
-    # -------------------------------
-    # AGGREGATION BY CANDIDATE (doc_id)
-    # -------------------------------
     grouped = defaultdict(list)
+    for doc_id in doc_ids:
+        rows = sorted(rows_by_doc.get(doc_id, []), key=lambda r: -scores[r])[:blocks_per_candidate]
+        for row in rows:
+            meta = result["metadatas"][row]
+            grouped[doc_id].append({
+                "page": meta["page"],
+                "block_id": meta["block_id"],
+                "text": result["documents"][row],
+                "score": float(scores[row])
+            })
+    return grouped
 
-    for doc, meta in zip(results["documents"][0], results["metadatas"][0]):
-        grouped[meta["doc_id"]].append({
-            "page": meta["page"],
-            "block_id": meta["block_id"],
-            "text": doc
-        })
 
-    # -------------------------------
-    # OUTPUT (candidate-level)
-    # -------------------------------
+def print_grouped(grouped):
     print("\n[STEP 6] Retrieved candidates:\n")
 
     for doc_id, blocks in grouped.items():
@@ -73,9 +291,117 @@ def main(chroma_dir, query, top_k=10):
             print(f"    {block['text'][:300]}")
         print()
 
+
+def encode_query(query):
+    """
+    Query embedding, cached by (model, backend, normalized query).
+    """
+    normalized = normalize_query(query)
+    key = (EMBEDDING_MODEL_NAME, EMBEDDING_BACKEND, normalized)
+
+    embedding = query_cache().get(key)
+    if embedding is None:
+        # Shared embedding model (loaded once per process)
+        model = get_embedding_model(EMBEDDING_MODEL_NAME)
+        embedding = model.encode([normalized], normalize_embeddings=True)[0].tolist()
+        query_cache().put(key, embedding)
+    return embedding
+
+
+def _copy_grouped(grouped):
+    return defaultdict(list, {doc_id: [dict(b) for b in blocks] for doc_id, blocks in grouped.items()})
+
+
+def main(chroma_dir, query, top_k=10, use_cache=True, backend=None, mode="vector", where=None):
+    if mode not in RETRIEVAL_MODES:
+        raise ValueError(f"Unknown retrieval mode: {mode} (expected one of {RETRIEVAL_MODES})")
+
+    # -------------------------------
+    # Result cache (invalidated by the Step 5 collection version
+    # and by the Step 4 lexical index version)
+    # -------------------------------
+    index = get_lexical_index(chroma_dir) if mode != "vector" else None
+    result_key = (
+        str(chroma_dir), backend or VECTOR_BACKEND, mode, normalize_query(query), top_k,
+        read_collection_version(chroma_dir) if mode != "lexical" else None,
+        index.version() if index is not None else None,
+        where_key(where)
+    )
+    grouped = result_cache().get(result_key) if use_cache else None
+
+    if grouped is None:
+        # CVs matching the metadata filter (BM25 filters on doc_id only)
+        allowed = filtered_doc_ids(chroma_dir, where) if where and mode != "vector" else None
+
+        if mode == "lexical":
+            # -------------------------------
+            # BM25 only (no embedding model, no vector store)
+            # -------------------------------
+            grouped = lexical_search(index, query, top_k, doc_ids=allowed)
+        else:
+            # -------------------------------
+            # Connect to the vector store
+            # -------------------------------
+            store = get_store(chroma_dir, backend=backend)
+
+            # -------------------------------
+            # Encode query
+            # -------------------------------
+            query_embedding = encode_query(query)
+
+            # -------------------------------
+            # Vector search + AGGREGATION BY CANDIDATE (doc_id)
+            # -------------------------------
+            if mode == "hybrid":
+                grouped = hybrid_search(store, index, query, query_embedding, top_k,
+                                        where=where, allowed_doc_ids=allowed)
+            else:
+                grouped = search(store, [query_embedding], top_k, where=where)[0]
+
+        if use_cache:
+            result_cache().put(result_key, dict(grouped))
+
+    grouped = _copy_grouped(grouped)
+
+    # -------------------------------
+    # OUTPUT (candidate-level)
+    # -------------------------------
+    print_grouped(grouped)
+
     return grouped
 
 
+
+def retrieve_candidates(chroma_dir, query, top_candidates=20, blocks_per_candidate=3,
+                        use_cache=True, backend=None, where=None):
+    """
+    Two-stage retrieval: top_candidates CVs, blocks_per_candidate
+    blocks each. Same {doc_id: [blocks]} output as main().
+    """
+    result_key = (
+        "candidates", str(chroma_dir), backend or VECTOR_BACKEND, normalize_query(query),
+        top_candidates, blocks_per_candidate, read_collection_version(chroma_dir), where_key(where)
+    )
+    grouped = result_cache().get(result_key) if use_cache else None
+
+    if grouped is None:
+        store = get_store(chroma_dir, backend=backend)
+        candidates = get_candidate_index(chroma_dir)
+        if not candidates.exists():
+            raise FileNotFoundError(
+                f"No candidate index in {chroma_dir} (re-run Step 5 to build it)"
+            )
+
+        grouped = candidate_search(
+            store, candidates, encode_query(query), top_candidates, blocks_per_candidate, where=where
+        )
+        if use_cache:
+            result_cache().put(result_key, dict(grouped))
+
+    grouped = _copy_grouped(grouped)
+    print_grouped(grouped)
+    return grouped
+
 # -------------------------------
 # CLI
 # -------------------------------
@@ -83,11 +409,14 @@ if __name__ == "__main__":
     import sys
 
     if len(sys.argv) < 3:
-        print("Usage: python step6_retrieval.py <chroma_dir> <query> [top_k]")
+        print("Usage: python step6_retrieval.py <chroma_dir> <query> [top_k] [vector|lexical|hybrid] [where_json]")
+        print('  e.g. where_json = \'{"$and": [{"degree_level": {"$gte": 5}}, {"lang_en": true}]}\'')
         sys.exit(1)
 
     chroma_dir = sys.argv[1]
     query = sys.argv[2]
     top_k = int(sys.argv[3]) if len(sys.argv) > 3 else 10
+    mode = sys.argv[4] if len(sys.argv) > 4 else "vector"
+    where = json.loads(sys.argv[5]) if len(sys.argv) > 5 else None
 
-    main(chroma_dir, query, top_k)
+    main(chroma_dir, query, top_k, mode=mode, where=where)
@@ -0,0 +1,235 @@
+# =====================================================
+# STEP 6 — WARM RETRIEVAL SERVICE (ASYNCIO DAEMON)
+# =====================================================
+# Purpose:
+# - Keep the embedding model and the vector store warm
+# - Serve queries over local HTTP (TCP or Unix socket)
+# - Micro-batch concurrent requests into ONE model.encode call
+# - Thin client returning the same {doc_id: [blocks]} structure
+# =====================================================
+# Endpoints:
+#   POST /retrieve  {"query": str, "top_k": int} → {doc_id: [blocks]}
+#   GET  /health                                 → {"status": "ok"}
+# =====================================================
+
+import asyncio
+import http.client
+import json
+import socket
+import time
+
+from step5_embeddings.embedding_provider import get_embedding_model
+from step6_retrieval.step6_retrieval import EMBEDDING_MODEL_NAME, get_store, search
+
+
+SERVICE_HOST = "127.0.0.1"
+SERVICE_PORT = 8765
+MAX_BATCH = 32            # Tunable: max queries per encode call
+BATCH_WINDOW_MS = 5       # Tunable: how long to wait for more queries
+
+
+# -------------------------------
+# Service
+# -------------------------------
+class RetrievalService:
+    def __init__(self, chroma_dir, max_batch=MAX_BATCH, batch_window_ms=BATCH_WINDOW_MS):
+        self.chroma_dir = chroma_dir
+        self.max_batch = max_batch
+        self.batch_window = batch_window_ms / 1000.0
+
+        # Warm start: pay model + vector store load once
+        self.model = get_embedding_model(EMBEDDING_MODEL_NAME)
+        self.store = get_store(chroma_dir)
+
+        self.queries = 0
+        self.batches = 0
+        self._queue = None
+
+    # -------------------------------
+    # Micro-batching
+    # -------------------------------
+    async def retrieve(self, query, top_k=10):
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((query, int(top_k), future))
+        return await future
+
+    def _search_batch(self, batch):
+        queries = [q for q, _, _ in batch]
+        embeddings = self.model.encode(queries, normalize_embeddings=True)
+        return search(get_store(self.chroma_dir), embeddings, [k for _, k, _ in batch])
+
+    async def _batcher(self):
+        loop = asyncio.get_running_loop()
+
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.batch_window
+
+            while len(batch) < self.max_batch:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            try:
+                results = await loop.run_in_executor(None, self._search_batch, batch)
+            except Exception as e:
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            self.queries += len(batch)
+            self.batches += 1
+            for (_, _, future), grouped in zip(batch, results):
+                if not future.done():
+                    future.set_result(dict(grouped))
+
+    # -------------------------------
+    # Minimal HTTP/1.1 handling
+    # -------------------------------
+    async def _handle(self, reader, writer):
+        try:
+            request_line = (await reader.readline()).decode("latin-1").strip()
+            if not request_line:
+                return
+            method, path, _ = request_line.split(" ", 2)
+
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode("latin-1").strip()
+                if not line:
+                    break
+                name, _, value = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+
+            length = int(headers.get("content-length", 0))
+            body = await reader.readexactly(length) if length else b""
+
+            if method == "GET" and path == "/health":
+                status, payload = 200, {
+                    "status": "ok",
+                    "queries": self.queries,
+                    "batches": self.batches
+                }
+            elif method == "POST" and path == "/retrieve":
+                request = json.loads(body or b"{}")
+                grouped = await self.retrieve(request["query"], request.get("top_k", 10))
+                status, payload = 200, grouped
+            else:
+                status, payload = 404, {"error": f"{method} {path} not found"}
+        except Exception as e:
+            status, payload = 500, {"error": repr(e)}
+
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        writer.write(
+            f"HTTP/1.1 {status} {'OK' if status == 200 else 'ERROR'}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(data)}\r\n"
+            f"Connection: close\r\n\r\n".encode("latin-1") + data
+        )
+        await writer.drain()
+        writer.close()
+
+    async def serve(self, host=SERVICE_HOST, port=SERVICE_PORT, socket_path=None):
+        self._queue = asyncio.Queue()
+        batcher = asyncio.create_task(self._batcher())
+
+        if socket_path:
+            server = await asyncio.start_unix_server(self._handle, path=str(socket_path))
+            where = f"unix:{socket_path}"
+        else:
+            server = await asyncio.start_server(self._handle, host=host, port=port)
+            where = f"http://{host}:{port}"
+
+        print(f"[STEP 6] Retrieval service ready on {where} (chroma: {self.chroma_dir})")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batcher.cancel()
+
+
+# -------------------------------
+# Client
+# -------------------------------
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path, timeout):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(str(self.socket_path))
+
+
+class RetrievalClient:
+    """
+    Thin client: retrieve() returns {doc_id: [blocks]} like step6.main,
+    without loading any model in the calling process.
+    """
+
+    def __init__(self, host=SERVICE_HOST, port=SERVICE_PORT, socket_path=None, timeout=30.0):
+        self.host = host
+        self.port = port
+        self.socket_path = socket_path
+        self.timeout = timeout
+
+    def _connection(self):
+        if self.socket_path:
+            return _UnixHTTPConnection(self.socket_path, self.timeout)
+        return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    def _request(self, method, path, payload=None):
+        conn = self._connection()
+        try:
+            body = json.dumps(payload).encode("utf-8") if payload is not None else None
+            conn.request(method, path, body=body, headers={"Content-Type": "application/json"})
+            response = conn.getresponse()
+            data = json.loads(response.read() or b"{}")
+        finally:
+            conn.close()
+
+        if response.status != 200:
+            raise RuntimeError(f"Retrieval service error {response.status}: {data.get('error')}")
+        return data
+
+    def retrieve(self, query, top_k=10):
+        return self._request("POST", "/retrieve", {"query": query, "top_k": top_k})
+
+    def health(self):
+        return self._request("GET", "/health")
+
+    def wait_ready(self, timeout=60.0):
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                return self.health()
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.2)
+
+
+# -------------------------------
+# CLI
+# -------------------------------
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) < 2:
+        print("Usage: python -m step6_retrieval.step6_retrieval_service <chroma_dir> [port | socket_path]")
+        sys.exit(1)
+
+    chroma_dir = sys.argv[1]
+    target = sys.argv[2] if len(sys.argv) > 2 else str(SERVICE_PORT)
+
+    service = RetrievalService(chroma_dir)
+    if target.isdigit():
+        asyncio.run(service.serve(port=int(target)))
+    else:
+        asyncio.run(service.serve(socket_path=target))
@@ -0,0 +1,228 @@
+# =====================================================
+# STEP 7 — LOCAL OLLAMA STUB (TESTS / BENCHMARKS)
+# =====================================================
+# Purpose:
+# - Imitate the Ollama chat API without a model:
+#   POST /api/chat   streamed (NDJSON, chunked) or single JSON
+#   GET  /api/tags   model list
+#   GET  /api/version
+# - Deterministic answers, configurable per-token delay
+# - Counts requests and the peak number of concurrent
+#   generations (to check the Step 7 concurrency limit)
+# - Simulated model load honouring keep_alive, and system prefix
+#   reuse: an unchanged system message is not counted again in
+#   prompt_eval_count (to check the Step 7 session layer)
+# =====================================================
+# Usage:
+#   python -m step7_llm.ollama_stub [port] [token_delay_ms] [load_ms]
+#   OLLAMA_HOST=http://127.0.0.1:<port> python -m step7_llm.step7_llm_async ...
+# =====================================================
+
+import asyncio
+import hashlib
+import json
+import re
+import time
+
+
+STUB_HOST = "127.0.0.1"
+STUB_PORT = 11435
+TOKEN_DELAY_MS = 20
+LOAD_MS = 0                   # Simulated model load time
+DEFAULT_KEEP_ALIVE = 300      # Ollama default: 5 minutes
+
+
+def keep_alive_seconds(value):
+    """
+    Ollama keep_alive (seconds, "30m", "1h", negative = forever) → seconds.
+    """
+    if value is None:
+        return DEFAULT_KEEP_ALIVE
+    if isinstance(value, (int, float)):
+        seconds = float(value)
+    else:
+        match = re.fullmatch(r"(-?\d+(?:\.\d+)?)(ms|s|m|h)?", str(value).strip())
+        if not match:
+            return DEFAULT_KEEP_ALIVE
+        unit = {"ms": 0.001, "s": 1, "m": 60, "h": 3600, None: 1}[match.group(2)]
+        seconds = float(match.group(1)) * unit
+    return float("inf") if seconds < 0 else seconds
+
+
+def count_tokens(text):
+    return len(text.split())
+
+
+def stub_answer(model, messages):
+    """
+    Deterministic reply: same conversation → same tokens.
+    """
+    last = messages[-1]["content"] if messages else ""
+    digest = hashlib.sha1(last.encode("utf-8")).hexdigest()[:8]
+    words = f"Stub answer from {model} ({digest}): Not found in the CV".split(" ")
+    return [w if i == 0 else " " + w for i, w in enumerate(words)]
+
+
+class OllamaStub:
+    def __init__(self, token_delay_ms=TOKEN_DELAY_MS, load_ms=LOAD_MS):
+        self.token_delay = token_delay_ms / 1000.0
+        self.load_delay = load_ms / 1000.0
+        self.requests = 0
+        self.loads = 0
+        self.active = 0
+        self.max_active = 0
+        self.server = None
+
+        self._loaded_until = {}    # model → monotonic deadline
+        self._load_locks = {}
+        self._last_system = {}     # model → last system prompt (prefix cache)
+
+    async def _ensure_loaded(self, model, keep_alive):
+        lock = self._load_locks.setdefault(model, asyncio.Lock())
+        async with lock:
+            load = 0.0
+            if self._loaded_until.get(model, 0.0) < time.monotonic():
+                self.loads += 1
+                self._last_system.pop(model, None)
+                await asyncio.sleep(self.load_delay)
+                load = self.load_delay
+            self._loaded_until[model] = time.monotonic() + keep_alive_seconds(keep_alive)
+        return load
+
+    def _prompt_tokens(self, model, messages):
+        system = "".join(m["content"] for m in messages if m.get("role") == "system")
+        rest = sum(count_tokens(m["content"]) for m in messages if m.get("role") != "system")
+        cached = system and self._last_system.get(model) == system
+        self._last_system[model] = system
+        return rest + (0 if cached else count_tokens(system))
+
+    # -------------------------------
+    # Chat
+    # -------------------------------
+    def _chunk(self, model, content, done, **extra):
+        return {
+            "model": model,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "message": {"role": "assistant", "content": content},
+            "done": done,
+            **extra
+        }
+
+    async def _chat(self, request, writer):
+        model = request.get("model", "")
+        messages = request.get("messages", [])
+        tokens = stub_answer(model, messages)
+        num_predict = (request.get("options") or {}).get("num_predict")
+        if num_predict is not None and num_predict >= 0:
+            tokens = tokens[:num_predict]
+        stream = request.get("stream", True)
+
+        self.requests += 1
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        t0 = time.perf_counter_ns()
+        try:
+            load = await self._ensure_loaded(model, request.get("keep_alive"))
+            timings = {
+                "load_duration": int(load * 1e9),
+                "prompt_eval_count": self._prompt_tokens(model, messages),
+                "eval_count": len(tokens),
+            }
+
+            if not stream:
+                await asyncio.sleep(self.token_delay * len(tokens))
+                final = self._chunk(model, "".join(tokens), True, done_reason="stop",
+                                    total_duration=time.perf_counter_ns() - t0, **timings)
+                await self._send(writer, 200, final)
+                return
+
+            writer.write(
+                b"HTTP/1.1 200 OK\r\n"
+                b"Content-Type: application/x-ndjson\r\n"
+                b"Transfer-Encoding: chunked\r\n"
+                b"Connection: close\r\n\r\n"
+            )
+            for token in tokens:
+                await asyncio.sleep(self.token_delay)
+                await self._write_chunk(writer, self._chunk(model, token, False))
+
+            await self._write_chunk(writer, self._chunk(
+                model, "", True, done_reason="stop",
+                total_duration=time.perf_counter_ns() - t0, **timings
+            ))
+            writer.write(b"0\r\n\r\n")
+            await writer.drain()
+        finally:
+            self.active -= 1
+
+    async def _write_chunk(self, writer, payload):
+        data = json.dumps(payload).encode("utf-8") + b"\n"
+        writer.write(f"{len(data):x}\r\n".encode("latin-1") + data + b"\r\n")
+        await writer.drain()
+
+    # -------------------------------
+    # Minimal HTTP/1.1 handling
+    # -------------------------------
+    async def _send(self, writer, status, payload):
+        data = json.dumps(payload).encode("utf-8")
+        writer.write(
+            f"HTTP/1.1 {status} {'OK' if status == 200 else 'ERROR'}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(data)}\r\n"
+            f"Connection: close\r\n\r\n".encode("latin-1") + data
+        )
+        await writer.drain()
+
+    async def _handle(self, reader, writer):
+        try:
+            request_line = (await reader.readline()).decode("latin-1").strip()
+            if not request_line:
+                return
+            method, path, _ = request_line.split(" ", 2)
+
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode("latin-1").strip()
+                if not line:
+                    break
+                name, _, value = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+
+            length = int(headers.get("content-length", 0))
+            body = await reader.readexactly(length) if length else b""
+
+            if method == "POST" and path == "/api/chat":
+                await self._chat(json.loads(body or b"{}"), writer)
+            elif method == "GET" and path == "/api/tags":
+                await self._send(writer, 200, {"models": []})
+            elif method == "GET" and path == "/api/version":
+                await self._send(writer, 200, {"version": "0.0.0-stub"})
+            else:
+                await self._send(writer, 404, {"error": f"{method} {path} not found"})
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host=STUB_HOST, port=STUB_PORT):
+        self.server = await asyncio.start_server(self._handle, host=host, port=port)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def serve(self, host=STUB_HOST, port=STUB_PORT):
+        port = await self.start(host, port)
+        print(f"[STEP 7] Ollama stub ready on http://{host}:{port}")
+        async with self.server:
+            await self.server.serve_forever()
+
+
+# -------------------------------
+# CLI
+# -------------------------------
+if __name__ == "__main__":
+    import sys
+
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else STUB_PORT
+    delay = float(sys.argv[2]) if len(sys.argv) > 2 else TOKEN_DELAY_MS
+    load = float(sys.argv[3]) if len(sys.argv) > 3 else LOAD_MS
+
+    asyncio.run(OllamaStub(token_delay_ms=delay, load_ms=load).serve(port=port))
@@ -0,0 +1,129 @@
+# =====================================================
+# STEP 7 — PERSISTENT LLM ANSWER CACHE (SQLITE)
+# =====================================================
+# Purpose:
+# - Never regenerate the same (question, candidate context) answer
+# - Key = model + prompt template version + question + sorted
+#   (page, block_id, text hash) of the blocks given to build_prompt
+#   → only candidates whose retrieved context changed are re-asked
+# - Eviction by TTL (age) and size (least recently used)
+# - Hit / miss counters
+# =====================================================
+# Location: STEP7_ANSWER_CACHE (default: $XDG_CACHE_HOME or ~/.cache,
+# ocr_pipeline/answer_cache.sqlite; never inside the source tree)
+# =====================================================
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+
+CACHE_DIR = Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / "ocr_pipeline"
+ANSWER_CACHE_PATH = os.environ.get("STEP7_ANSWER_CACHE", str(CACHE_DIR / "answer_cache.sqlite"))
+ANSWER_CACHE_TTL = 30 * 24 * 3600    # Tunable: seconds before an answer is regenerated
+ANSWER_CACHE_ENTRIES = 100000        # Tunable: max cached answers
+
+
+def text_hash(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def answer_key(model, prompt_version, question, cv_id, blocks):
+    """
+    blocks: the Step 6 blocks of one candidate ({"page", "block_id", "text"}).
+    """
+    fingerprint = sorted(
+        (b.get("page"), b.get("block_id"), text_hash(b["text"])) for b in blocks
+    )
+    payload = json.dumps(
+        [model, prompt_version, " ".join(question.split()), cv_id, fingerprint],
+        ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class AnswerCache:
+    def __init__(self, path=ANSWER_CACHE_PATH, ttl=ANSWER_CACHE_TTL, max_entries=ANSWER_CACHE_ENTRIES):
+        self.path = Path(path)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS answers ("
+                "key TEXT PRIMARY KEY, answer TEXT NOT NULL, "
+                "created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+        self._writes = 0
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT answer, created FROM answers WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                self.misses += 1
+                return None
+            with self._conn:
+                self._conn.execute("UPDATE answers SET accessed = ? WHERE key = ?", (now, key))
+            self.hits += 1
+        return row[0]
+
+    def put(self, key, answer):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO answers (key, answer, created, accessed) VALUES (?, ?, ?, ?)",
+                (key, answer, now, now)
+            )
+            self._writes += 1
+            if self._writes % 100 == 0:
+                self._evict(now)
+
+    def _evict(self, now):
+        self._conn.execute("DELETE FROM answers WHERE created < ?", (now - self.ttl,))
+        self._conn.execute(
+            "DELETE FROM answers WHERE key NOT IN "
+            "(SELECT key FROM answers ORDER BY accessed DESC LIMIT ?)",
+            (self.max_entries,)
+        )
+
+    def evict(self):
+        with self._lock, self._conn:
+            self._evict(time.time())
+
+    def stats(self):
+        total = self.hits + self.misses
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+        return {
+            "size": size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0
+        }
+
+
+# -------------------------------
+# Process-wide cache
+# -------------------------------
+_CACHE = {}
+_CACHE_LOCK = threading.Lock()
+
+
+def answer_cache(path=None):
+    path = str(path or ANSWER_CACHE_PATH)
+    with _CACHE_LOCK:
+        if path not in _CACHE:
+            _CACHE[path] = AnswerCache(path)
+        return _CACHE[path]
@@ -0,0 +1,171 @@
+# =====================================================
+# STEP 7 — CONTEXT PACKING (TOKEN BUDGET + DEDUPLICATION)
+# =====================================================
+# Purpose:
+# - Shorter prompts → less prefill time on CPU
+# - Drop exact duplicates (normalized text) and near-duplicates
+#   (word shingles + MinHash), e.g. headers/footers repeated
+#   across pages
+# - Order blocks by score (reranker, else retrieval), then page,
+#   then block
+# - Fit a per-candidate token budget: lowest-ranked blocks are
+#   cut first (the last one kept may be truncated)
+# - Log the tokens saved per call
+# =====================================================
+# Token counts are estimated (CHARS_PER_TOKEN) unless a real
+# tokenizer callable (text → int) is passed.
+# =====================================================
+
+import hashlib
+import math
+import random
+
+
+CONTEXT_TOKEN_BUDGET = 1200   # Tunable: context tokens per candidate prompt
+CHARS_PER_TOKEN = 3.5         # Tunable: estimate for Qwen 2.5 on French/English CVs
+MIN_PARTIAL_TOKENS = 40       # Tunable: below this, a truncated block is dropped instead
+
+SHINGLE_SIZE = 3              # Words per shingle
+MINHASH_PERMUTATIONS = 64     # Tunable: signature length (accuracy vs speed)
+NEAR_DUP_THRESHOLD = 0.8      # Tunable: estimated Jaccard above which blocks are duplicates
+
+_PRIME = (1 << 61) - 1
+_rng = random.Random(7)
+_PERMUTATIONS = [
+    (_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(MINHASH_PERMUTATIONS)
+]
+
+
+def estimate_tokens(text):
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+# -------------------------------
+# Deduplication
+# -------------------------------
+def _words(text):
+    return text.lower().split()
+
+
+def shingles(text, size=SHINGLE_SIZE):
+    words = _words(text)
+    if len(words) <= size:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def minhash(text):
+    hashes = [
+        int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "little")
+        for s in shingles(text)
+    ]
+    return [min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMUTATIONS]
+
+
+def similarity(sig_a, sig_b):
+    """
+    Estimated Jaccard similarity of two MinHash signatures.
+    """
+    return sum(a == b for a, b in zip(sig_a, sig_b)) / len(sig_a)
+
+
+def _block_score(block):
+    score = block.get("rerank_score", block.get("score"))
+    return -score if score is not None else math.inf
+
+
+def rank_blocks(blocks):
+    """
+    Reranker score, else retrieval score (best first), then page, then block.
+    Blocks without a score keep their retrieval order, after scored ones.
+    """
+    return sorted(blocks, key=lambda b: (_block_score(b), b.get("page", 0), b.get("block_id", 0)))
+
+
+def dedupe_blocks(blocks, threshold=NEAR_DUP_THRESHOLD):
+    """
+    Keeps the first (best-ranked) copy of each exact or near-duplicate.
+    Returns (kept, n_removed).
+    """
+    kept, seen_exact, signatures = [], set(), []
+
+    for block in blocks:
+        exact = " ".join(_words(block["text"]))
+        if not exact or exact in seen_exact:
+            continue
+
+        sig = minhash(block["text"])
+        if any(similarity(sig, other) >= threshold for other in signatures):
+            continue
+
+        seen_exact.add(exact)
+        signatures.append(sig)
+        kept.append(block)
+
+    return kept, len(blocks) - len(kept)
+
+
+# -------------------------------
+# Budget
+# -------------------------------
+def truncate_to_tokens(text, max_tokens, count_tokens=estimate_tokens):
+    """
+    Longest word prefix of `text` that fits in max_tokens.
+    """
+    words = text.split()
+    lo, hi = 0, len(words)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if count_tokens(" ".join(words[:mid])) <= max_tokens:
+            lo = mid
+        else:
+            hi = mid - 1
+    return " ".join(words[:lo])
+
+
+def pack_context(blocks, budget=CONTEXT_TOKEN_BUDGET, count_tokens=estimate_tokens):
+    """
+    Returns (packed blocks, stats). Packed blocks are new dicts, in
+    prompt order; a truncated block has "truncated": True.
+    """
+    tokens_in = sum(count_tokens(b["text"]) for b in blocks)
+    unique, duplicates = dedupe_blocks(rank_blocks(blocks))
+
+    packed, used, truncated = [], 0, 0
+    for block in unique:
+        tokens = count_tokens(block["text"])
+        if used + tokens <= budget:
+            packed.append(dict(block))
+            used += tokens
+            continue
+
+        # Over budget: keep a prefix of this block if it is worth it,
+        # every lower-ranked block is dropped
+        remaining = budget - used
+        if remaining >= MIN_PARTIAL_TOKENS:
+            text = truncate_to_tokens(block["text"], remaining, count_tokens)
+            if text:
+                packed.append({**block, "text": text, "truncated": True})
+                used += count_tokens(text)
+                truncated = 1
+        break
+
+    stats = {
+        "blocks_in": len(blocks),
+        "blocks_out": len(packed),
+        "duplicates": duplicates,
+        "truncated": truncated,
+        "tokens_in": tokens_in,
+        "tokens_out": used,
+        "tokens_saved": tokens_in - used,
+    }
+    return packed, stats
+
+
+def log_packing(cv_id, stats):
+    print(
+        f"[STEP 7] Context {cv_id}: {stats['tokens_in']} → {stats['tokens_out']} tokens "
+        f"(-{stats['tokens_saved']}, {stats['duplicates']} duplicates, "
+        f"{stats['blocks_in'] - stats['blocks_out'] - stats['duplicates']} dropped, "
+        f"{stats['truncated']} truncated)"
+    )
@@ -7,28 +7,50 @@
 # - Build one grounded prompt per candidate
 # - Call local Ollama LLM (Qwen 2.5)
 # - Return candidate-level answers
+# - Pack each candidate's context into a token budget, without
+#   duplicate blocks (step7_context_packer.py)
+# - Reuse cached answers when a candidate's context is unchanged
+#   (step7_answer_cache.py)
+# - Instructions sent as a fixed system message, model kept warm
+#   (step7_ollama_session.py)
+# - Optional reranker gating which candidates reach the LLM
+#   (step7_reranker.py)
 # =====================================================
 
+import inspect
+
 from step6_retrieval.step6_retrieval import main as retrieve_blocks
-import ollama
+from step7_llm.step7_answer_cache import answer_cache, answer_key
+from step7_llm.step7_context_packer import CONTEXT_TOKEN_BUDGET, log_packing, pack_context
+from step7_llm.step7_ollama_session import OllamaSession
+from step7_llm.step7_reranker import MAX_LLM_CANDIDATES, RERANKER, get_reranker, rerank_candidates
 
 # -----------------------------------------------------
 # LLM CONFIG
 # -----------------------------------------------------
 MODEL_NAME = "qwen2.5:7b-instruct"
+PROMPT_VERSION = "2"    # Bump when SYSTEM_PROMPT / build_prompt change (invalidates cached answers)
+
+# Fixed prefix, identical for every call (server-side KV cache reuse)
+SYSTEM_PROMPT = """
+You are an assistant answering questions ONLY using the provided context.
+If the answer is not present in the context, say exactly:
+"Not found in the CV".
+""".strip()
+
+_SESSION = None
 
 
 # -----------------------------------------------------
 # PROMPT BUILDER
 # -----------------------------------------------------
 def build_prompt(context_blocks, question):
+    """
+    User message only: the instructions live in SYSTEM_PROMPT.
+    """
     context_text = "\n\n".join(context_blocks)
 
     prompt = f"""
-You are an assistant answering questions ONLY using the provided context.
-If the answer is not present in the context, say exactly:
-"Not found in the CV".
-
 CONTEXT:
 {context_text}
 
@@ -43,43 +65,105 @@ ANSWER:
 # -----------------------------------------------------
 # LLM CALL
 # -----------------------------------------------------
+def get_session():
+    """
+    Process-wide session (keep_alive, system prefix, latency metrics).
+    """
+    global _SESSION
+    if _SESSION is None:
+        _SESSION = OllamaSession(MODEL_NAME, SYSTEM_PROMPT)
+    return _SESSION
+
+
 def call_llm(prompt):
-    response = ollama.chat(
-        model=MODEL_NAME,
-        messages=[
-            {"role": "user", "content": prompt}
-        ]
-    )
-    return response["message"]["content"]
+    return get_session().chat(prompt)
+
+
+# -----------------------------------------------------
+# RETRIEVAL (STEP 6)
+# -----------------------------------------------------
+def retrieve(chroma_dir, question, top_k, retriever=None, where=None):
+    """
+    Step 6 blocks per candidate, through `retriever` when given.
+    A where filter is passed on as retriever(question, top_k, where=...);
+    a retriever that cannot filter raises instead of ignoring it.
+    """
+    if retriever is None:
+        return retrieve_blocks(chroma_dir, question, top_k, where=where)
+    if where is None:
+        return retriever(question, top_k)
+
+    params = inspect.signature(retriever).parameters.values()
+    if not any(p.name == "where" or p.kind is p.VAR_KEYWORD for p in params):
+        raise ValueError("This retriever does not accept a where filter: filter in Step 6 or drop `where`")
+    return retriever(question, top_k, where=where)
 
 
 # -----------------------------------------------------
 # MAIN ENTRY POINT
 # -----------------------------------------------------
-def answer_question(chroma_dir, question, top_k=3):
+def answer_question(chroma_dir, question, top_k=3, retriever=None, use_cache=True,
+                    token_budget=CONTEXT_TOKEN_BUDGET, reranker=RERANKER,
+                    max_candidates=MAX_LLM_CANDIDATES, where=None):
+    """
+    retriever: optional callable (question, top_k) → {doc_id: [blocks]},
+    e.g. RetrievalClient(...).retrieve to use the warm Step 6 service
+    (must also accept where=... when a where filter is given).
+    use_cache: reuse answers whose (question, candidate blocks) were seen.
+    token_budget: max context tokens per candidate prompt.
+    reranker: None, "lexical" or "cross-encoder"; drops weak candidates
+    and keeps at most max_candidates before any LLM call.
+    where: Step 6 metadata filter (e.g. metadata_where(min_degree=5,
+    max_age=30)); only matching CVs reach the LLM.
+    """
     # -------------------------------
     # Step 6 — Retrieval (aggregated)
     # -------------------------------
-    results = retrieve_blocks(chroma_dir, question, top_k)
+    results = retrieve(chroma_dir, question, top_k, retriever, where)
+
+    # -------------------------------
+    # Rerank gate (fewer LLM generations)
+    # -------------------------------
+    if results and reranker:
+        results, _ = rerank_candidates(
+            question, results, get_reranker(reranker), max_candidates=max_candidates
+        )
 
     if not results:
         return "Not found in the CVs"
 
     answers = []
+    cache = answer_cache() if use_cache else None
+    generated = 0
 
     # -------------------------------
     # Reason per candidate
     # -------------------------------
     for cv_id, blocks in results.items():
-        context_blocks = [b["text"] for b in blocks]
+        blocks, packing = pack_context(blocks, budget=token_budget)
+        log_packing(cv_id, packing)
 
-        prompt = build_prompt(context_blocks, question)
-        answer = call_llm(prompt)
+        key = answer_key(MODEL_NAME, PROMPT_VERSION, question, cv_id, blocks)
+        answer = cache.get(key) if cache else None
+
+        if answer is None:
+            context_blocks = [b["text"] for b in blocks]
+
+            prompt = build_prompt(context_blocks, question)
+            answer = call_llm(prompt)
+            generated += 1
+            if cache:
+                cache.put(key, answer)
 
         answers.append(
             f"Candidate {cv_id}:\n{answer}"
         )
 
+    if cache:
+        stats = cache.stats()
+        print(f"[STEP 7] Generated {generated}/{len(results)} answers "
+              f"(cache: {stats['hits']} hits, {stats['misses']} misses)")
+
     # -------------------------------
     # Final multi-candidate answer
     # -------------------------------
@@ -108,3 +192,4 @@ if __name__ == "__main__":
 
     print("\n[STEP 7] Answer:\n")
     print(answer)
+    print(f"\n[STEP 7] LLM latency: {get_session().stats()}")
@@ -0,0 +1,183 @@
+# =====================================================
+# STEP 7 — CONCURRENT STREAMING LLM ANSWERING (ASYNCIO)
+# =====================================================
+# Purpose:
+# - One streamed Ollama chat per candidate, run concurrently
+# - Bounded concurrency per model (asyncio.Semaphore)
+# - Tokens forwarded to the caller as they arrive
+#   (on_token(cv_id, token))
+# - Per-call timeout; cancelling the question cancels every
+#   in-flight generation
+# - Same reranker gate, prompt, context packing, answer cache and
+#   output format as step7_llm_answering.py
+# =====================================================
+# Ollama endpoint: OLLAMA_HOST (default http://127.0.0.1:11434),
+# or the local stub for tests (ollama_stub.py). Calls go through
+# the shared OllamaSession (system prefix, keep_alive, TTFT).
+# =====================================================
+
+import asyncio
+import os
+import time
+import weakref
+
+from step7_llm.step7_answer_cache import answer_cache, answer_key
+from step7_llm.step7_context_packer import CONTEXT_TOKEN_BUDGET, log_packing, pack_context
+from step7_llm.step7_llm_answering import PROMPT_VERSION, build_prompt, get_session, retrieve
+from step7_llm.step7_reranker import MAX_LLM_CANDIDATES, RERANKER, get_reranker, rerank_candidates
+
+
+LLM_CONCURRENCY = int(os.environ.get("LLM_CONCURRENCY", "2"))   # Tunable: parallel generations per model
+LLM_TIMEOUT = 120.0                                            # Tunable: seconds per candidate generation
+
+_SEMAPHORES = weakref.WeakKeyDictionary()   # event loop → {model: semaphore}
+
+
+# -------------------------------
+# Concurrency limit (one semaphore per model, per event loop)
+# -------------------------------
+def model_semaphore(model, limit=LLM_CONCURRENCY):
+    per_model = _SEMAPHORES.setdefault(asyncio.get_running_loop(), {})
+    if model not in per_model:
+        per_model[model] = asyncio.Semaphore(limit)
+    return per_model[model]
+
+
+# -------------------------------
+# LLM CALL (streamed)
+# -------------------------------
+async def stream_llm(prompt, session=None, on_token=None, timeout=LLM_TIMEOUT):
+    """
+    Streams one chat completion. on_token(token) is called for each
+    chunk; the full answer is returned. Waiting for a free slot does
+    not count against `timeout`, the generation itself does.
+    """
+    session = session or get_session()
+
+    async with model_semaphore(session.model):
+        return await asyncio.wait_for(session.achat(prompt, on_token=on_token), timeout)
+
+
+# -------------------------------
+# MAIN ENTRY POINT
+# -------------------------------
+async def answer_question_async(chroma_dir, question, top_k=3, retriever=None, on_token=None,
+                                session=None, timeout=LLM_TIMEOUT, use_cache=True,
+                                token_budget=CONTEXT_TOKEN_BUDGET, reranker=RERANKER,
+                                max_candidates=MAX_LLM_CANDIDATES, where=None):
+    """
+    on_token: optional callable (cv_id, token), called as tokens arrive
+    (a cached answer arrives as one token).
+    Returns the same multi-candidate answer as answer_question().
+    A candidate that fails or times out gets an error line instead of
+    failing the whole question.
+    """
+    # -------------------------------
+    # Step 6 — Retrieval (sync, off the event loop)
+    # -------------------------------
+    results = await asyncio.to_thread(retrieve, chroma_dir, question, top_k, retriever, where)
+
+    # -------------------------------
+    # Rerank gate (CPU scoring, off the event loop)
+    # -------------------------------
+    if results and reranker:
+        results, _ = await asyncio.to_thread(
+            rerank_candidates, question, results, get_reranker(reranker), None, max_candidates
+        )
+
+    if not results:
+        return "Not found in the CVs"
+
+    session = session or get_session()
+    cache = answer_cache() if use_cache else None
+
+    async def answer_candidate(cv_id, blocks):
+        forward = (lambda token: on_token(cv_id, token)) if on_token is not None else None
+
+        blocks, packing = pack_context(blocks, budget=token_budget)
+        log_packing(cv_id, packing)
+
+        key = answer_key(session.model, PROMPT_VERSION, question, cv_id, blocks)
+        answer = cache.get(key) if cache else None
+        if answer is not None:
+            if forward is not None:
+                forward(answer)
+            return f"Candidate {cv_id}:\n{answer}"
+
+        prompt = build_prompt([b["text"] for b in blocks], question)
+        t0 = time.perf_counter()
+        try:
+            answer = await stream_llm(prompt, session=session, on_token=forward, timeout=timeout)
+        except asyncio.TimeoutError:
+            answer = f"[LLM timeout after {timeout:g}s]"
+        except Exception as e:
+            answer = f"[LLM error: {e}]"
+        else:
+            # Errors and timeouts are never cached
+            if cache:
+                cache.put(key, answer)
+        print(f"[STEP 7] {cv_id} answered in {time.perf_counter() - t0:.1f}s")
+        return f"Candidate {cv_id}:\n{answer}"
+
+    # -------------------------------
+    # Reason per candidate (concurrently, order kept)
+    # -------------------------------
+    answers = await asyncio.gather(*(
+        answer_candidate(cv_id, blocks) for cv_id, blocks in results.items()
+    ))
+
+    if cache:
+        stats = cache.stats()
+        print(f"[STEP 7] Answer cache: {stats['hits']} hits, {stats['misses']} misses")
+
+    return "\n\n".join(answers)
+
+
+def answer_question_concurrent(chroma_dir, question, top_k=3, **kwargs):
+    """
+    Sync wrapper for scripts (not callable from a running event loop).
+    """
+    return asyncio.run(answer_question_async(chroma_dir, question, top_k, **kwargs))
+
+
+# -------------------------------
+# CLI streaming (complete lines, prefixed by candidate)
+# -------------------------------
+class LinePrinter:
+    def __init__(self):
+        self.buffers = {}
+
+    def __call__(self, cv_id, token):
+        buffer = self.buffers.get(cv_id, "") + token
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            print(f"[{cv_id}] {line}", flush=True)
+        self.buffers[cv_id] = buffer
+
+    def flush(self):
+        for cv_id, buffer in self.buffers.items():
+            if buffer:
+                print(f"[{cv_id}] {buffer}", flush=True)
+        self.buffers.clear()
+
+
+# -----------------------------------------------------
+# CLI
+# -----------------------------------------------------
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) < 3:
+        print("Usage: python -m step7_llm.step7_llm_async <chroma_dir> <question> [top_k]")
+        sys.exit(1)
+
+    chroma_dir = sys.argv[1]
+    question = sys.argv[2]
+    top_k = int(sys.argv[3]) if len(sys.argv) > 3 else 3
+
+    printer = LinePrinter()
+    answer = answer_question_concurrent(chroma_dir, question, top_k, on_token=printer)
+    printer.flush()
+
+    print("\n[STEP 7] Answer:\n")
+    print(answer)
@@ -0,0 +1,197 @@
+# =====================================================
+# STEP 7 — OLLAMA SESSION (PREFIX REUSE + KEEP-WARM)
+# =====================================================
+# Purpose:
+# - Fixed instructions sent as one identical system message, so
+#   the server can reuse its KV cache for that prefix
+# - keep_alive on every call: the model stays loaded between
+#   questions (OLLAMA_KEEP_ALIVE, "-1" = never unload)
+# - warmup() for service startup: loads the model and evaluates
+#   the system prefix once
+# - Time-to-first-token and total latency recorded per call
+# - Sync (chat) and asyncio (achat) streaming, same metrics
+# =====================================================
+
+import asyncio
+import os
+import statistics
+import threading
+import time
+import weakref
+from collections import deque
+
+import ollama
+
+
+OLLAMA_HOST = os.environ.get("OLLAMA_HOST")   # None → ollama default (127.0.0.1:11434)
+CALL_HISTORY = 1000                           # Calls kept for stats()
+
+
+def parse_keep_alive(value):
+    """
+    "30m", "1h", "-1" (forever), "0" (unload now) → Ollama keep_alive.
+    """
+    value = str(value).strip()
+    return int(value) if value.lstrip("-").isdigit() else value
+
+
+OLLAMA_KEEP_ALIVE = parse_keep_alive(os.environ.get("OLLAMA_KEEP_ALIVE", "30m"))   # Tunable
+
+
+class OllamaSession:
+    def __init__(self, model, system_prompt, host=OLLAMA_HOST, keep_alive=OLLAMA_KEEP_ALIVE, options=None):
+        self.model = model
+        self.system_prompt = system_prompt
+        self.host = host
+        self.keep_alive = keep_alive
+        self.options = options
+        self.calls = deque(maxlen=CALL_HISTORY)
+
+        self._client = None
+        self._async_clients = weakref.WeakKeyDictionary()   # event loop → AsyncClient
+        self._lock = threading.Lock()
+
+    # -------------------------------
+    # Clients
+    # -------------------------------
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = ollama.Client(host=self.host)
+        return self._client
+
+    def async_client(self):
+        loop = asyncio.get_running_loop()
+        if loop not in self._async_clients:
+            self._async_clients[loop] = ollama.AsyncClient(host=self.host)
+        return self._async_clients[loop]
+
+    def messages(self, prompt):
+        return [
+            {"role": "system", "content": self.system_prompt},
+            {"role": "user", "content": prompt}
+        ]
+
+    def _request(self, messages, **options):
+        return {
+            "model": self.model,
+            "messages": messages,
+            "stream": True,
+            "keep_alive": self.keep_alive,
+            "options": {**(self.options or {}), **options} or None,
+        }
+
+    # -------------------------------
+    # Metrics
+    # -------------------------------
+    def _record(self, kind, t0, t_first, final):
+        total = time.perf_counter() - t0
+        call = {
+            "kind": kind,
+            "ttft": (t_first - t0) if t_first is not None else total,
+            "total": total,
+            "load": (final.get("load_duration") or 0) / 1e9,
+            "prompt_tokens": final.get("prompt_eval_count") or 0,
+            "output_tokens": final.get("eval_count") or 0,
+        }
+        with self._lock:
+            self.calls.append(call)
+
+        print(
+            f"[STEP 7] LLM {kind}: ttft {call['ttft']:.2f}s, total {call['total']:.2f}s "
+            f"(prompt {call['prompt_tokens']} tok, output {call['output_tokens']} tok, "
+            f"load {call['load']:.2f}s)"
+        )
+        return call
+
+    def stats(self):
+        with self._lock:
+            calls = [c for c in self.calls if c["kind"] == "chat"]
+        if not calls:
+            return {"calls": 0}
+        return {
+            "calls": len(calls),
+            "ttft_p50": statistics.median(c["ttft"] for c in calls),
+            "ttft_max": max(c["ttft"] for c in calls),
+            "total_p50": statistics.median(c["total"] for c in calls),
+            "total_max": max(c["total"] for c in calls),
+        }
+
+    # -------------------------------
+    # Sync
+    # -------------------------------
+    def _consume(self, stream, on_token):
+        parts, t_first, final = [], None, {}
+        for chunk in stream:
+            token = chunk["message"]["content"]
+            if token:
+                if t_first is None:
+                    t_first = time.perf_counter()
+                parts.append(token)
+                if on_token is not None:
+                    on_token(token)
+            if chunk.get("done"):
+                final = chunk
+        return "".join(parts), t_first, final
+
+    def chat(self, prompt, on_token=None):
+        t0 = time.perf_counter()
+        stream = self.client.chat(**self._request(self.messages(prompt)))
+        answer, t_first, final = self._consume(stream, on_token)
+        self._record("chat", t0, t_first, final)
+        return answer
+
+    def warmup(self):
+        """
+        Loads the model (pinned by keep_alive) and evaluates the system
+        prefix with a 1-token generation. Returns the call metrics.
+        """
+        t0 = time.perf_counter()
+        stream = self.client.chat(**self._request(
+            [{"role": "system", "content": self.system_prompt}], num_predict=1
+        ))
+        _, t_first, final = self._consume(stream, None)
+        return self._record("warmup", t0, t_first, final)
+
+    # -------------------------------
+    # Asyncio
+    # -------------------------------
+    async def _aconsume(self, stream, on_token):
+        parts, t_first, final = [], None, {}
+        async for chunk in stream:
+            token = chunk["message"]["content"]
+            if token:
+                if t_first is None:
+                    t_first = time.perf_counter()
+                parts.append(token)
+                if on_token is not None:
+                    on_token(token)
+            if chunk.get("done"):
+                final = chunk
+        return "".join(parts), t_first, final
+
+    async def achat(self, prompt, on_token=None):
+        t0 = time.perf_counter()
+        stream = await self.async_client().chat(**self._request(self.messages(prompt)))
+        answer, t_first, final = await self._aconsume(stream, on_token)
+        self._record("chat", t0, t_first, final)
+        return answer
+
+    async def awarmup(self):
+        t0 = time.perf_counter()
+        stream = await self.async_client().chat(**self._request(
+            [{"role": "system", "content": self.system_prompt}], num_predict=1
+        ))
+        _, t_first, final = await self._aconsume(stream, None)
+        return self._record("warmup", t0, t_first, final)
+
+
+# -------------------------------
+# CLI (service startup: load + pin the model)
+# -------------------------------
+if __name__ == "__main__":
+    from step7_llm.step7_llm_answering import get_session
+
+    session = get_session()
+    print(f"[STEP 7] Warming up {session.model} (keep_alive={session.keep_alive})")
+    session.warmup()
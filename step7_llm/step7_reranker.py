@@ -0,0 +1,125 @@
+# =====================================================
+# STEP 6 → 7 — CANDIDATE RERANKER (LLM GATE)
+# =====================================================
+# Purpose:
+# - Score every (question, block) pair of a Step 6 result in
+#   one batch, with a cheap CPU scorer:
+#   - "lexical"      : query-token coverage (no model)
+#   - "cross-encoder": small sentence-transformers CrossEncoder
+# - Candidate score = best block score
+# - Drop candidates below a threshold, cap how many reach the LLM
+# - Report how many LLM generations were saved
+# =====================================================
+
+import math
+import os
+import threading
+
+from step4_rag.step4_lexical_index import tokenize
+
+
+RERANKER = os.environ.get("RERANKER")   # None → no reranking; "lexical" | "cross-encoder"
+CROSS_ENCODER_MODEL = os.environ.get(
+    "RERANKER_MODEL", "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1"   # multilingual (FR/EN CVs)
+)
+RERANK_BATCH_SIZE = 32      # Tunable: pairs per cross-encoder forward pass
+MAX_LLM_CANDIDATES = 5      # Tunable: candidates that reach the LLM at most
+
+
+# -------------------------------
+# Scorers (pairs → scores in [0, 1])
+# -------------------------------
+class LexicalReranker:
+    name = "lexical"
+    threshold = 0.3   # Tunable: share of question tokens found in the block
+
+    def score(self, question, texts):
+        terms = set(tokenize(question))
+        if not terms:
+            return [0.0] * len(texts)
+        return [len(terms & set(tokenize(text))) / len(terms) for text in texts]
+
+
+class CrossEncoderReranker:
+    name = "cross-encoder"
+    threshold = 0.1   # Tunable: sigmoid relevance
+
+    def __init__(self, model_name=CROSS_ENCODER_MODEL, batch_size=RERANK_BATCH_SIZE):
+        from sentence_transformers import CrossEncoder
+
+        print(f"[RERANK] Loading {model_name} (cpu)")
+        self.model = CrossEncoder(model_name, device="cpu")
+        self.batch_size = batch_size
+
+    def score(self, question, texts):
+        if not texts:
+            return []
+        logits = self.model.predict(
+            [(question, text) for text in texts], batch_size=self.batch_size, show_progress_bar=False
+        )
+        return [1.0 / (1.0 + math.exp(-float(x))) for x in logits]
+
+
+RERANKERS = {
+    LexicalReranker.name: LexicalReranker,
+    CrossEncoderReranker.name: CrossEncoderReranker,
+}
+
+_INSTANCES = {}
+_LOCK = threading.Lock()
+
+
+def get_reranker(name):
+    """
+    Process-wide scorer (the cross-encoder is loaded once).
+    """
+    if name not in RERANKERS:
+        raise ValueError(f"Unknown reranker: {name} (available: {sorted(RERANKERS)})")
+    with _LOCK:
+        if name not in _INSTANCES:
+            _INSTANCES[name] = RERANKERS[name]()
+        return _INSTANCES[name]
+
+
+# -------------------------------
+# Gate
+# -------------------------------
+def rerank_candidates(question, results, reranker, threshold=None, max_candidates=MAX_LLM_CANDIDATES):
+    """
+    results: {doc_id: [blocks]} from Step 6.
+    Returns ({doc_id: [blocks]} best candidate first, report).
+    Blocks get a "rerank_score" and are reordered best first.
+    """
+    threshold = reranker.threshold if threshold is None else threshold
+
+    pairs = [(doc_id, block) for doc_id, blocks in results.items() for block in blocks]
+    scores = reranker.score(question, [block["text"] for _, block in pairs])
+
+    ranked = {}
+    for (doc_id, block), score in zip(pairs, scores):
+        ranked.setdefault(doc_id, []).append({**block, "rerank_score": float(score)})
+
+    candidates = []
+    for doc_id, blocks in ranked.items():
+        blocks.sort(key=lambda b: -b["rerank_score"])
+        best = blocks[0]["rerank_score"]
+        if best >= threshold:
+            candidates.append((best, doc_id, blocks))
+
+    candidates.sort(key=lambda c: -c[0])
+    kept = {doc_id: blocks for _, doc_id, blocks in candidates[:max_candidates]}
+
+    report = {
+        "reranker": reranker.name,
+        "candidates_in": len(results),
+        "below_threshold": len(ranked) - len(candidates),
+        "capped": max(0, len(candidates) - max_candidates),
+        "candidates_out": len(kept),
+        "llm_calls_saved": len(results) - len(kept),
+    }
+    print(
+        f"[STEP 7] Reranker ({reranker.name}): {report['candidates_in']} → {report['candidates_out']} "
+        f"candidates ({report['below_threshold']} below {threshold:g}, {report['capped']} over cap), "
+        f"{report['llm_calls_saved']} LLM calls saved"
+    )
+    return kept, report
@@ -0,0 +1,76 @@
+import pytest
+
+from step4_rag.step4_metadata import extract_from_lines
+
+
+REFERENCE_YEAR = 2026
+
+
+@pytest.mark.parametrize("lines", [
+    ["Jean Dupont", "Entreprise fondée il y a 25 ans, leader du secteur"],
+    ["Marie Martin", "Je ne travaille pas le week-end depuis 2015"],
+    ["Marie Martin", "Je ne le fais plus depuis 2015"],
+    ["Jean Dupont", "34 ans d'expérience en conseil"],
+])
+def test_no_birth_year_without_explicit_marker(lines):
+    meta = extract_from_lines(lines, REFERENCE_YEAR)
+    assert "birth_year" not in meta
+    assert "age" not in meta
+
+
+@pytest.mark.parametrize("lines, expected", [
+    (["Née le 12/03/1990 à Lyon"], 1990),
+    (["Né(e) en 1988"], 1988),
+    (["Date de naissance : 05/06/1985"], 1985),
+    (["Born 1979 in Boston"], 1979),
+])
+def test_birth_year(lines, expected):
+    assert extract_from_lines(lines, REFERENCE_YEAR)["birth_year"] == expected
+
+
+@pytest.mark.parametrize("lines, expected", [
+    (["Jean Dupont, 34 ans", "Paris"], 34),
+    (["Jean Dupont", "34 ans | Permis B"], 34),
+    (["Âge : 29 ans"], 29),
+    (["Age: 29"], 29),
+])
+def test_stated_age_is_kept_as_written(lines, expected):
+    meta = extract_from_lines(lines, REFERENCE_YEAR)
+    assert meta["age"] == expected
+    assert "birth_year" not in meta
+    assert extract_from_lines(lines, REFERENCE_YEAR + 1) == meta
+
+
+@pytest.mark.parametrize("lines", [
+    ["Scrum Master certifié", "Licence informatique 2015"],
+    ["Scrum Master in a banking team", "Licence informatique 2015"],
+    ["Consultant Master Data Management", "Licence informatique 2015"],
+    ["Webmaster 2016 - 2019", "Licence informatique 2015"],
+])
+def test_master_job_titles_are_not_degrees(lines):
+    meta = extract_from_lines(lines, REFERENCE_YEAR)
+    assert meta["degree"] == "bachelor"
+    assert meta["degree_level"] == 3
+
+
+@pytest.mark.parametrize("line", [
+    "Master en informatique, Université de Lyon",
+    "Master 2 Data Science",
+    "Master of Science in Computer Science",
+    "Master's degree in Finance",
+    "Diplôme de master en droit",
+    "MBA, HEC Paris",
+])
+def test_master_degree(line):
+    meta = extract_from_lines([line], REFERENCE_YEAR)
+    assert (meta["degree"], meta["degree_level"]) == ("master", 5)
+
+
+def test_graduation_year_comes_from_the_selected_degree():
+    meta = extract_from_lines(["Master en informatique 2012", "Licence informatique 2015"], REFERENCE_YEAR)
+    assert (meta["degree"], meta["graduation_year"]) == ("master", 2012)
+
+
+def test_job_ranges_of_a_master_title_count_as_experience():
+    meta = extract_from_lines(["Scrum Master 2015 - 2020"], REFERENCE_YEAR)
+    assert meta["years_experience"] == 5